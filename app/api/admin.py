@@ -1,14 +1,88 @@
 # app/api/admin.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header
+from typing import Optional
 # Используем относительный импорт
 from ..core.config import ADMIN_PASSWORD
+from ..database import (
+    get_outbox_stats, requeue_dead_notifications, update_dropdown_lists, rename_reference_item
+)
+from ..defects_archive import defect_archiver
+from ..leader import leader_election
+from ..telegram_notifier import outbox_dispatcher
 
 router = APIRouter()
 
+def verify_admin_token(authorization: Optional[str]) -> None:
+    """Проверка заголовка Authorization: Bearer <токен администратора>; иначе 401."""
+    if not authorization or authorization != "Bearer admin_secret_key":
+        raise HTTPException(status_code=401, detail="Требуется авторизация")
+
 @router.post("/login")
 def admin_login(login_data: dict): # Используем dict для совместимости
     # Используем login_data
     if login_data.get('password') == ADMIN_PASSWORD:
         return {"token": "admin_secret_key"}
     else:
-        raise HTTPException(status_code=401, detail="Неверный пароль")
\ No newline at end of file
+        raise HTTPException(status_code=401, detail="Неверный пароль")
+
+@router.post("/update-lists")
+def update_dropdown_lists_endpoint(lists: dict, authorization: Optional[str] = Header(None)):
+    verify_admin_token(authorization)
+    
+    try:
+        update_dropdown_lists(lists)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "updated"}
+
+@router.post("/rename-list-item")
+def rename_list_item_endpoint(rename_data: dict, authorization: Optional[str] = Header(None)):
+    """
+    Переименование элемента списка выбора ({"list", "old_name", "new_name"}).
+    Дефекты, в которых он указан, показываются под новым именем.
+    """
+    verify_admin_token(authorization)
+
+    try:
+        renamed = rename_reference_item(
+            rename_data.get('list', ''), rename_data.get('old_name', ''), rename_data.get('new_name', '')
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not renamed:
+        raise HTTPException(status_code=404, detail="Элемент списка не найден")
+    return {"status": "renamed"}
+
+@router.get("/notifications/stats")
+def notifications_stats_endpoint(authorization: Optional[str] = Header(None)):
+    """
+    Глубина очереди уведомлений и задержки отправки. При нескольких воркерах
+    отправляет только ведущий: у остальных dispatcher.running = false.
+    """
+    verify_admin_token(authorization)
+
+    return {"queue": get_outbox_stats(), "dispatcher": outbox_dispatcher.stats(), "leader": leader_election.stats()}
+
+@router.post("/notifications/requeue-dead")
+def requeue_dead_notifications_endpoint(authorization: Optional[str] = Header(None)):
+    """Повторная постановка в очередь уведомлений, которые не удалось доставить."""
+    verify_admin_token(authorization)
+
+    requeued = requeue_dead_notifications()
+    if requeued:
+        outbox_dispatcher.wake()
+    return {"status": "requeued", "count": requeued}
+
+@router.post("/archive-defects")
+async def archive_defects_endpoint(archive_data: Optional[dict] = None, authorization: Optional[str] = Header(None)):
+    """
+    Перенос в архив дефектов, завершённых больше {"after_days"} дней назад
+    (по умолчанию — ARCHIVE_AFTER_DAYS), не дожидаясь планового запуска.
+    """
+    verify_admin_token(authorization)
+
+    after_days = (archive_data or {}).get('after_days', defect_archiver.after_days)
+    if not isinstance(after_days, int) or after_days < 1:
+        raise HTTPException(status_code=400, detail="after_days должно быть целым числом не меньше 1")
+    archived = await defect_archiver.archive_now(after_days)
+    return {"status": "archived", "count": archived, "archiver": defect_archiver.stats()}
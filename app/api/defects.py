@@ -1,15 +1,151 @@
 # app/api/defects.py
-from fastapi import APIRouter, Form, File, UploadFile, HTTPException
-from typing import Optional
-import os
-import uuid
-from datetime import datetime
+from fastapi import APIRouter, Form, File, UploadFile, HTTPException, Query, Header
+from fastapi.responses import StreamingResponse, JSONResponse
+from typing import Optional, Iterator, Iterable, Dict, Any, List, Tuple
+from starlette.concurrency import run_in_threadpool
+import itertools
+import json
+import sqlite3
+import time
+
+try:
+    import orjson
+except ImportError:  # orjson не установлен — кодируем стандартным json
+    orjson = None
 # Используем относительные импорты
-from ..database import create_defect, get_all_defects, update_defect, get_defect_by_id
-from ..telegram_notifier import send_telegram_notification_async
+from ..database import (
+    create_defect_in_tx, iter_defects, iter_defect_rows, update_defect_item_in_tx, DEFECT_FIELDS,
+    encode_cursor, decode_cursor, get_defects_version, get_defect_changes, get_defect_item, get_defect_items,
+    search_defects, get_defect_stats, insert_import_references_in_tx, insert_defects_bulk_in_tx,
+    update_defects_batch_in_tx, VersionConflict, DEFECT_UPDATE_COLUMNS
+)
+from ..core.config import IMPORT_CHUNK_ROWS
+from ..db_async import db_executor
+from ..defects_io import iter_csv, iter_xlsx, iter_import_rows, validate_import, ImportFormatError
+from ..event_hub import event_hub
+from ..http_cache import (
+    etag_matches, not_modified, accepts_gzip, gzip_chunks, parse_if_match_version, VARY_ACCEPT_ENCODING
+)
+from ..photo_storage import save_upload, existing_thumbnail_url, thumbnail_worker, UploadTooLarge
+from ..telegram_notifier import notifications_enabled, outbox_dispatcher
+from .admin import verify_admin_token
 
 router = APIRouter()
 
+# Размер страницы списка дефектов: по умолчанию и наибольший
+DEFAULT_PAGE_LIMIT = 200
+MAX_PAGE_LIMIT = 1000
+# Сколько строк кодируется в JSON перед отправкой очередного фрагмента ответа
+STREAM_CHUNK_ROWS = 200
+# Пакетное изменение дефектов: наибольшее число элементов и изменяемые поля
+MAX_BATCH_ITEMS = 500
+BATCH_UPDATE_FIELDS = ("status", "assigned_to", "responsible")
+# Форматы выгрузки и импорта
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Столбцы списка, значения которых в компактном формате заменяются номерами
+# в словаре (исполнитель и ответственный — общий словарь people)
+COLUMNAR_DICTIONARIES = {
+    "equipment": "equipment",
+    "section": "section",
+    "danger_level": "danger_level",
+    "status": "status",
+    "assigned_to": "people",
+    "responsible": "people",
+}
+
+def json_encoder_name() -> str:
+    """Активный кодировщик JSON списка дефектов (для метрик)."""
+    return "orjson" if orjson is not None else "json"
+
+def _dump(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _dump_items(values: List[Any]) -> bytes:
+    """Элементы списка в JSON через запятую, без скобок массива (один вызов кодировщика)."""
+    return _dump(values)[1:-1]
+
+def _page_chunks(rows: Iterable[Any], limit: int, page: Dict[str, Any]) -> Iterator[List[Any]]:
+    """
+    Строки пачками по STREAM_CHUNK_ROWS. Строка сверх limit не отдаётся:
+    по последней отданной в page["next_after"] записывается курсор следующей страницы.
+    """
+    chunk: List[Any] = []
+    count = 0
+    last = None
+    for row in rows:
+        if count == limit:
+            # Пришла строка сверх limit — значит, есть следующая страница
+            page["next_after"] = encode_cursor(last["time_found"], last["id"])
+            continue
+        chunk.append(row)
+        count += 1
+        last = row
+        if len(chunk) >= STREAM_CHUNK_ROWS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _stream_defects_json(defects: Iterator[Dict[str, Any]], limit: int) -> Iterator[bytes]:
+    """
+    Кодирование страницы дефектов в JSON по мере чтения из курсора:
+    {"items": [...], "next_after": <курсор следующей страницы или null>}.
+    """
+    page: Dict[str, Any] = {"next_after": None}
+    yield b"{\"items\":["
+    separator = b""
+    for chunk in _page_chunks(defects, limit, page):
+        yield separator + _dump_items(chunk)
+        separator = b","
+    yield b"],\"next_after\":" + _dump(page["next_after"]) + b"}"
+
+def _stream_defects_columnar(rows: Iterator[sqlite3.Row], limit: int) -> Iterator[bytes]:
+    """
+    Компактный формат списка: имена столбцов один раз, строки — массивами.
+    Оборудование, участок, уровень опасности, статус и люди передаются
+    номерами в словарях "dictionaries" (null остаётся null). Словари
+    пополняются по мере чтения строк и отдаются после них:
+    {"columns": [...], "encoded": {столбец: словарь}, "rows": [[...], ...],
+     "dictionaries": {словарь: [значения]}, "next_after": <курсор или null>}.
+    """
+    dictionaries: Dict[str, Dict[Any, int]] = {name: {} for name in dict.fromkeys(COLUMNAR_DICTIONARIES.values())}
+    encoded: List[Tuple[int, Dict[Any, int]]] = [
+        (index, dictionaries[COLUMNAR_DICTIONARIES[field]])
+        for index, field in enumerate(DEFECT_FIELDS) if field in COLUMNAR_DICTIONARIES
+    ]
+    page: Dict[str, Any] = {"next_after": None}
+    yield (
+        b"{\"columns\":" + _dump(list(DEFECT_FIELDS))
+        + b",\"encoded\":" + _dump(COLUMNAR_DICTIONARIES)
+        + b",\"rows\":["
+    )
+    separator = b""
+    for chunk in _page_chunks(rows, limit, page):
+        values = []
+        for row in chunk:
+            row_values = list(row)
+            for index, dictionary in encoded:
+                value = row_values[index]
+                if value is not None:
+                    code = dictionary.get(value)
+                    if code is None:
+                        code = dictionary[value] = len(dictionary)
+                    row_values[index] = code
+            values.append(row_values)
+        yield separator + _dump_items(values)
+        separator = b","
+    # Словари в порядке номеров (dict сохраняет порядок добавления)
+    yield (
+        b"],\"dictionaries\":" + _dump({name: list(values) for name, values in dictionaries.items()})
+        + b",\"next_after\":" + _dump(page["next_after"]) + b"}"
+    )
+
 @router.post("/")
 async def create_defect_endpoint(
     equipment: str = Form(...),
@@ -19,22 +155,23 @@ async def create_defect_endpoint(
     responsible: str = Form(""),
     photo: Optional[UploadFile] = File(None)
 ):
-    """Создание нового дефекта."""
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    """
+    Создание нового дефекта.
+    Фото копируется на диск блоками в пуле потоков, запись в БД идёт через
+    поток-писатель, чтобы большие загрузки и fsync не блокировали event loop.
+    """
+    now = int(time.time())
     photo_url = None
+    photo_thumb_url = None
     if photo and photo.filename:
-        file_extension = os.path.splitext(photo.filename)[1]
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join("uploads", unique_filename)
-        # Читаем содержимое файла
-        photo_content = await photo.read()
-        # Проверяем тип для корректной записи
-        if isinstance(photo_content, bytes):
-            with open(file_path, "wb") as buffer:
-                buffer.write(photo_content)
-            photo_url = f"/uploads/{unique_filename}"
-        else:
-            print(f"[WARNING] UploadFile.read() вернул не bytes: {type(photo_content)}")
+        try:
+            photo_url = await run_in_threadpool(save_upload, photo.file, photo.filename)
+            # Для повторно загруженного фото миниатюра уже может быть готова
+            photo_thumb_url = existing_thumbnail_url(photo_url)
+        except UploadTooLarge:
+            raise HTTPException(status_code=413, detail="Слишком большой файл")
+        finally:
+            await photo.close()
 
     # Подготавливаем значение responsible для БД
     responsible_value = responsible if responsible.strip() else None
@@ -45,23 +182,23 @@ async def create_defect_endpoint(
         "time_found": now,
         "danger_level": danger_level,
         "responsible": responsible_value,
-        "photo_url": photo_url
+        "photo_url": photo_url,
+        "photo_thumb_url": photo_thumb_url
     }
-    defect_id = create_defect(defect_data)
-    
-    # Отправка уведомлений при создании
-    defect_info = {
-        "id": defect_id,
-        "equipment": equipment,
-        "section": section,
-        "description": description,
-        "danger_level": danger_level,
-        "responsible": responsible_value,
-        "photo_url": photo_url
-    }
-    # Отправляем уведомление ответственному
-    if responsible_value:
-        send_telegram_notification_async(defect_info, responsible_person=responsible_value, executor_person=None)
+    # Уведомление ответственному записывается в outbox вместе с дефектом
+    notifications = []
+    if responsible_value and notifications_enabled():
+        notifications.append({"recipient": responsible_value, "role": "responsible"})
+    defect_id = await db_executor.write(create_defect_in_tx, defect_data, notifications)
+    if notifications:
+        outbox_dispatcher.wake()
+    if photo_url and not photo_thumb_url:
+        thumbnail_worker.submit(photo_url)
+
+    # Событие для открытых страниц (SSE)
+    created_item = await db_executor.read(get_defect_item, defect_id)
+    if created_item:
+        event_hub.publish("created", created_item)
     
     return {"status": "created", "id": defect_id}
 
@@ -70,69 +207,307 @@ def get_defects_endpoint(
     section: Optional[str] = None,
     status: Optional[str] = None,
     danger_level: Optional[str] = None,
-    assigned_to: Optional[str] = None
+    assigned_to: Optional[str] = None,
+    time_found_from: Optional[int] = None,
+    time_found_to: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+    after: Optional[str] = None,
+    order: str = Query("asc", regex="^(asc|desc)$"),
+    include_archived: bool = False,
+    format: str = Query("objects", regex="^(objects|columnar)$"),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None)
 ):
-    """Получение списка дефектов с фильтрацией."""
-    return get_all_defects(section, status, danger_level, assigned_to)
+    """
+    Получение списка дефектов с фильтрацией.
+    time_found_from/time_found_to ограничивают время обнаружения
+    (секунды Unix, границы включаются).
+    Сортировка по (time_found, id). Ответ — страница из limit дефектов
+    (по умолчанию DEFAULT_PAGE_LIMIT): {"items": [...], "next_after": ...},
+    следующая страница запрашивается с after=<next_after>.
+    Давно завершённые дефекты, перенесённые в архив, возвращаются только
+    с include_archived=true (в том же порядке и с теми же курсорами).
+    format=columnar — компактный формат (столбцы и словари значений, см.
+    _stream_defects_columnar). Ответ сжимается gzip, если клиент его принимает.
+    ETag ответа — версия данных; при совпадении с If-None-Match отдаётся 304.
+    """
+    version = get_defects_version()
+    use_gzip = accepts_gzip(accept_encoding)
+    # У каждого представления (архив, формат, сжатие) свой ETag
+    etag = (
+        f'"v{version}{"-a" if include_archived else ""}{"-c" if format == "columnar" else ""}'
+        f'{"-gz" if use_gzip else ""}"'
+    )
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, vary=VARY_ACCEPT_ENCODING)
 
-@router.put("/{defect_id}")
-def update_defect_endpoint(defect_id: int, update_data: dict):
-    """Обновление дефекта."""
-    # Получаем текущие данные дефекта до обновления
-    defect_row = get_defect_by_id(defect_id)
-    if not defect_row:
-        raise HTTPException(status_code=404, detail="Дефект не найден")
-        
-    current_responsible = defect_row.get('responsible')
-    current_assigned_to = defect_row.get('assigned_to')
-    
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # Обновляем временные метки в зависимости от статуса
+    try:
+        after_key = decode_cursor(after) if after else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный курсор пагинации")
+
+    # Запрашиваем на одну строку больше, чтобы узнать, есть ли следующая страница
+    fetch_limit = limit + 1
+    filters = (section, status, danger_level, assigned_to, time_found_from, time_found_to)
+    if format == "columnar":
+        rows = iter_defect_rows(
+            *filters, after=after_key, order=order, limit=fetch_limit, include_archived=include_archived
+        )
+        body = _stream_defects_columnar(rows, limit)
+    else:
+        defects = iter_defects(
+            *filters, after=after_key, order=order, limit=fetch_limit, include_archived=include_archived
+        )
+        body = _stream_defects_json(defects, limit)
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Defects-Version": str(version), "Vary": VARY_ACCEPT_ENCODING}
+    if use_gzip:
+        body = gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type="application/json", headers=headers)
+
+@router.get("/search")
+def search_defects_endpoint(
+    q: str = Query(..., min_length=1, max_length=200),
+    section: Optional[str] = None,
+    status: Optional[str] = None,
+    danger_level: Optional[str] = None,
+    assigned_to: Optional[str] = None,
+    time_found_from: Optional[int] = None,
+    time_found_to: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_LIMIT),
+    offset: int = Query(0, ge=0),
+    include_archived: bool = False
+):
+    """
+    Полнотекстовый поиск по описанию и оборудованию (слова ищутся по началу).
+    Фильтры и include_archived те же, что у списка. Результаты упорядочены
+    по релевантности; в snippet — фрагмент описания с найденными словами в <mark>.
+    Следующая страница запрашивается с offset=<next_offset>.
+    """
+    return search_defects(
+        q, section, status, danger_level, assigned_to, time_found_from, time_found_to,
+        limit=limit, offset=offset, include_archived=include_archived
+    )
+
+@router.get("/stats")
+def get_defect_stats_endpoint(
+    group_by: Optional[str] = Query(None, regex="^(section|equipment|executor|week)$"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Статистика: количество дефектов по статусам и уровням опасности, открытые
+    дефекты, среднее время устранения (MTTR) и его 90-й перцентиль (секунды) —
+    в целом и по участкам, оборудованию, исполнителям и неделям обнаружения
+    (неделя начинается в понедельник 00:00 UTC). group_by оставляет один разрез.
+    Считается по сводным таблицам, без чтения всех дефектов.
+    """
+    version = get_defects_version()
+    etag = f'"s{version}-{group_by or "all"}"'
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    return JSONResponse(get_defect_stats(group_by), headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+@router.get("/export")
+def export_defects_endpoint(
+    format: str = Query("csv", regex="^(csv|xlsx)$"),
+    section: Optional[str] = None,
+    status: Optional[str] = None,
+    danger_level: Optional[str] = None,
+    assigned_to: Optional[str] = None,
+    time_found_from: Optional[int] = None,
+    time_found_to: Optional[int] = None,
+    order: str = Query("asc", regex="^(asc|desc)$"),
+    include_archived: bool = False
+):
+    """
+    Выгрузка дефектов в CSV (по умолчанию) или XLSX с теми же фильтрами,
+    что у списка. Файл формируется по мере чтения из курсора и сразу
+    отправляется клиенту, поэтому расход памяти не зависит от числа строк.
+    """
+    defects = iter_defects(
+        section, status, danger_level, assigned_to, time_found_from, time_found_to, order=order,
+        include_archived=include_archived
+    )
+    body = iter_csv(defects) if format == "csv" else iter_xlsx(defects)
+    filename = f"defects-{time.strftime('%Y%m%d-%H%M%S')}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+def _take_rows(rows: Iterator[Dict[str, Any]], count: int) -> List[Dict[str, Any]]:
+    """Следующие count строк импорта (чтение файла — в пуле потоков)."""
+    return list(itertools.islice(rows, count))
+
+@router.post("/import")
+async def import_defects_endpoint(file: UploadFile = File(...), authorization: Optional[str] = Header(None)):
+    """
+    Импорт дефектов из CSV (UTF-8, разделитель «;» или «,») или XLSX
+    (только для администратора). Первая строка — заголовки, как в выгрузке
+    (или ключи API). Сначала проверяются все строки: при ошибках ничего
+    не добавляется и возвращается 422 со списком ошибок по номерам строк
+    файла. Затем строки добавляются через поток-писатель частями по
+    IMPORT_CHUNK_ROWS: большой файл не держит блокировку записи БД, и
+    остальные изменения выполняются между частями. Уведомления не отправляются.
+    """
+    verify_admin_token(authorization)
+    filename = (file.filename or "").lower()
+    file_format = "xlsx" if filename.endswith(".xlsx") else "csv"
+    count = 0
+    try:
+        report = await run_in_threadpool(validate_import, file.file, file_format)
+        if report["error_count"]:
+            return JSONResponse(status_code=422, content={
+                "detail": "Файл содержит ошибки, дефекты не добавлены",
+                "rows": report["rows"],
+                "error_count": report["error_count"],
+                "errors": report["errors"]
+            })
+        if not report["rows"]:
+            raise HTTPException(status_code=400, detail="В файле нет строк с дефектами")
+        # Второй проход по файлу: строки читаются и записываются частями
+        file.file.seek(0)
+        rows = (row for _, row, _ in iter_import_rows(file.file, file_format))
+        ids = await db_executor.write(insert_import_references_in_tx, report["references"])
+        while True:
+            chunk = await run_in_threadpool(_take_rows, rows, IMPORT_CHUNK_ROWS)
+            if not chunk:
+                break
+            count += await db_executor.write(insert_defects_bulk_in_tx, ids, chunk)
+    except ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except sqlite3.Error as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Импорт прерван ошибкой БД ({e}): добавлено {count} из {report['rows']} строк"
+        )
+    finally:
+        file.file.close()
+        if count:
+            # Открытые страницы переподключаются и дочитывают добавленное из БД
+            event_hub.resync_all()
+    return {"status": "imported", "count": count}
+
+@router.get("/changes")
+def get_defect_changes_endpoint(
+    since: int = Query(0, ge=0),
+    limit: int = Query(MAX_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT)
+):
+    """
+    Дефекты, добавленные или изменённые после версии since.
+    Следующий запрос делается с since=<version> из ответа; при has_more=true
+    изменения ещё остались и их можно запросить сразу.
+    """
+    return get_defect_changes(since, limit)
+
+def _apply_status_timestamps(update_data: Dict[str, Any], now: int) -> None:
+    """Время начала и завершения работ по новому статусу."""
     if update_data.get('status') == "в работе":
         update_data['time_started'] = now
     elif update_data.get('status') == "завершён":
         update_data['time_completed'] = now
 
-    # Выполняем обновление в базе данных
-    success = update_defect(defect_id, update_data)
-    if not success:
-        raise HTTPException(status_code=404, detail="Дефект не найден или не обновлён")
-
-    # Отправка уведомлений после успешного обновления
-    updated_defect_row = get_defect_by_id(defect_id)
-    if updated_defect_row:
-        # Подготавливаем данные для уведомления
-        defect_info_after_update = {
-            "id": updated_defect_row['id'],
-            "equipment": updated_defect_row['equipment'],
-            "section": updated_defect_row['section'],
-            "description": updated_defect_row['description'],
-            "danger_level": updated_defect_row['danger_level'],
-            "responsible": updated_defect_row.get('responsible'),
-            "assigned_to": updated_defect_row.get('assigned_to'),
-            "photo_url": updated_defect_row.get('photo_url')
-        }
-
-        # Определяем, какие поля изменились
-        new_assigned_to = updated_defect_row.get('assigned_to')
-        new_responsible = updated_defect_row.get('responsible')
-
-        # Отправляем уведомление новому исполнителю, если он изменился
-        if new_assigned_to and new_assigned_to != current_assigned_to:
-            send_telegram_notification_async(
-                defect_info_after_update, 
-                responsible_person=None, 
-                executor_person=new_assigned_to
-            )
-
-        # Отправляем уведомление новому ответственному, если он изменился
-        # и если это не тот же человек, что и новый исполнитель
-        if new_responsible and new_responsible != current_responsible and new_responsible != new_assigned_to:
-            send_telegram_notification_async(
-                defect_info_after_update, 
-                responsible_person=new_responsible, 
-                executor_person=None
-            )
-        
-    return {"status": "updated"}
\ No newline at end of file
+@router.patch("/batch")
+async def update_defects_batch_endpoint(batch_data: dict):
+    """
+    Пакетное изменение статуса и назначений (например, при пересменке):
+    {"items": [{"id": 1, "status": "завершён"}, {"id": 2, "assigned_to": "Иванов"}, ...]}.
+    Элемент может содержать "version" — версию дефекта, которую видел клиент:
+    если дефект с тех пор изменили, элемент не применяется (conflict, в
+    ответе текущая версия). Все изменения выполняются одной транзакцией,
+    в ответе — результат по каждому элементу: updated (с новой версией),
+    conflict, not_found, invalid или error. Время начала и
+    завершения работ ставится так же, как в PUT /defects/{id}. Получатель
+    уведомлений о нескольких дефектах получает одно сообщение-сводку.
+    """
+    items = batch_data.get("items")
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=422, detail="Нужен непустой список изменений items")
+    if len(items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=422, detail=f"Не больше {MAX_BATCH_ITEMS} изменений за один запрос")
+
+    now = int(time.time())
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    changes: List[Tuple[int, Dict[str, Any], Optional[int]]] = []
+    positions: List[int] = []
+    for index, item in enumerate(items):
+        defect_id = item.get("id") if isinstance(item, dict) else None
+        if not isinstance(defect_id, int) or isinstance(defect_id, bool):
+            results[index] = {"id": defect_id, "result": "invalid", "detail": "Не указан id дефекта"}
+            continue
+        unknown = sorted(set(item) - set(BATCH_UPDATE_FIELDS) - {"id", "version"})
+        if unknown:
+            results[index] = {"id": defect_id, "result": "invalid", "detail": f"Поля нельзя изменить: {', '.join(unknown)}"}
+            continue
+        update_data = {key: item[key] for key in BATCH_UPDATE_FIELDS if key in item}
+        if not update_data:
+            results[index] = {"id": defect_id, "result": "invalid", "detail": "Нет изменений"}
+            continue
+        expected_version = item.get("version")
+        if expected_version is not None and (not isinstance(expected_version, int) or isinstance(expected_version, bool)):
+            results[index] = {"id": defect_id, "result": "invalid", "detail": "Версия должна быть целым числом"}
+            continue
+        _apply_status_timestamps(update_data, now)
+        changes.append((defect_id, update_data, expected_version))
+        positions.append(index)
+
+    if changes:
+        notify = notifications_enabled()
+        applied = await db_executor.write(update_defects_batch_in_tx, changes, notify)
+        for index, result in zip(positions, applied):
+            results[index] = result
+        if notify:
+            outbox_dispatcher.wake()
+
+    # События для открытых страниц (SSE): изменённые дефекты читаются одним запросом
+    updated_ids = sorted({result["id"] for result in results if result["result"] == "updated"})
+    for updated_item in await db_executor.read(get_defect_items, updated_ids):
+        event_hub.publish("updated", updated_item)
+
+    return {"updated": sum(1 for result in results if result["result"] == "updated"), "results": results}
+
+@router.put("/{defect_id}")
+async def update_defect_endpoint(defect_id: int, update_data: dict, if_match: Optional[str] = Header(None)):
+    """
+    Обновление дефекта. С заголовком If-Match: "<version>" изменение
+    применяется, только если дефект не менялся с тех пор, как клиент его
+    прочитал; иначе 409 с текущей версией в ETag. Изменение, уведомления
+    и чтение дефекта для SSE — одна операция записи.
+    """
+    try:
+        expected_version = parse_if_match_version(if_match)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Неверный заголовок If-Match: нужна версия дефекта")
+    # Пустое изменение — ошибка клиента, а не «дефект не найден»
+    if not any(key in DEFECT_UPDATE_COLUMNS for key in update_data):
+        raise HTTPException(
+            status_code=422, detail=f"Нет изменяемых полей (допустимы: {', '.join(DEFECT_UPDATE_COLUMNS)})"
+        )
+
+    # Обновляем временные метки в зависимости от статуса
+    _apply_status_timestamps(update_data, int(time.time()))
+
+    # Уведомления новому исполнителю и новому ответственному пишутся в outbox в той же транзакции
+    notify = notifications_enabled()
+    try:
+        updated_item = await db_executor.write(update_defect_item_in_tx, defect_id, update_data, expected_version, notify)
+    except VersionConflict as e:
+        raise HTTPException(
+            status_code=409,
+            detail="Дефект уже изменён другим пользователем, обновите данные",
+            headers={"ETag": f'"{e.current_version}"'}
+        )
+    if updated_item is None:
+        raise HTTPException(status_code=404, detail="Дефект не найден")
+    if notify:
+        outbox_dispatcher.wake()
+
+    # Событие для открытых страниц (SSE)
+    event_hub.publish("updated", updated_item)
+
+    return JSONResponse(
+        {"status": "updated", "version": updated_item["version"]},
+        headers={"ETag": f'"{updated_item["version"]}"'}
+    )
\ No newline at end of file
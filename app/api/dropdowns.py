@@ -1,22 +1,21 @@
 # app/api/dropdowns.py
-from fastapi import APIRouter, HTTPException, Header
+from fastapi import APIRouter, Header
+from fastapi.responses import JSONResponse
 from typing import Optional
 # Используем относительные импорты
-from ..database import get_dropdown_lists, update_dropdown_lists
+from ..database import get_dropdown_lists_versioned
+from ..http_cache import etag_matches, not_modified
 
 router = APIRouter()
 
-# ИЗМЕНЕНО: Путь с "/" на "/dropdown-lists/"
-@router.get("/dropdown-lists/") 
-def get_dropdown_lists_endpoint():
-    return get_dropdown_lists()
-
-# ИЗМЕНЕНО: Путь с "/admin/update-lists" на "/update-lists"
-# Потому что префикс "/admin" будет добавлен в main.py
-@router.post("/update-lists") 
-def update_dropdown_lists_endpoint(lists: dict, authorization: Optional[str] = Header(None)):
-    if not authorization or authorization != "Bearer admin_secret_key":
-        raise HTTPException(status_code=401, detail="Требуется авторизация")
-    
-    update_dropdown_lists(lists)
-    return {"status": "updated"}
\ No newline at end of file
+@router.get("/")
+def get_dropdown_lists_endpoint(if_none_match: Optional[str] = Header(None)):
+    """
+    Списки выбора. ETag — версия списков: браузер перепроверяет их
+    при каждом запросе и, пока списки не менялись, получает 304 без тела.
+    """
+    version, lists = get_dropdown_lists_versioned()
+    etag = f'"d{version}"'
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    return JSONResponse(lists, headers={"ETag": etag, "Cache-Control": "no-cache"})
@@ -0,0 +1,71 @@
+# app/api/events.py
+from fastapi import APIRouter, Request, Header, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional, AsyncIterator
+import asyncio
+# Используем относительные импорты
+from ..database import get_defect_changes
+from ..db_async import db_executor
+from ..event_hub import event_hub, format_sse_event
+
+router = APIRouter()
+
+# Интервал отправки комментария-пинга, чтобы прокси не закрывали соединение
+KEEPALIVE_SECONDS = 15
+# Сколько изменений дочитывается из БД за один запрос при переподключении
+REPLAY_BATCH_SIZE = 500
+
+async def _event_stream(request: Request, since: Optional[int]) -> AsyncIterator[str]:
+    """Поток SSE: сначала пропущенные изменения из БД, затем события хаба."""
+    # Подписываемся до чтения БД, чтобы не потерять события между ними
+    subscriber = event_hub.subscribe()
+    try:
+        # Подсказка клиенту: интервал переподключения
+        yield "retry: 3000\n\n"
+        last_version = since
+        if since is not None:
+            while True:
+                changes = await db_executor.read(get_defect_changes, last_version, REPLAY_BATCH_SIZE)
+                for defect in changes["items"]:
+                    yield format_sse_event("changed", defect)
+                last_version = changes["version"]
+                if not changes["has_more"]:
+                    break
+
+        while True:
+            if await request.is_disconnected():
+                break
+            try:
+                message = await asyncio.wait_for(subscriber.queue.get(), timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if message is None:
+                # Клиент отключён хабом как медленный
+                break
+            event_id, payload = message
+            if last_version is not None and event_id <= last_version:
+                # Уже отдано при дочитывании из БД
+                continue
+            yield payload
+    finally:
+        event_hub.unsubscribe(subscriber)
+
+@router.get("/defects")
+async def defect_events_endpoint(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0),
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    Server-Sent Events об изменении дефектов (события "defect", id = версия строки).
+    При переподключении браузер передаёт Last-Event-ID, и пропущенные
+    изменения дочитываются из БД; при первом подключении можно передать since.
+    """
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    return StreamingResponse(
+        _event_stream(request, since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,88 @@
+# app/api/metrics.py
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+# Используем относительные импорты
+from ..database import pool, get_outbox_stats
+from ..db_async import db_executor
+from ..defects_archive import defect_archiver
+from ..event_hub import event_hub
+from ..leader import leader_election
+from ..metrics import REGISTRY, CallbackMetric
+from ..page_cache import page_encodings
+from .defects import json_encoder_name
+from ..telegram_notifier import outbox_dispatcher
+
+router = APIRouter()
+
+# Формат текстовой выдачи Prometheus
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"  # starlette добавит charset
+
+# Состояние компонентов считывается в момент запроса /metrics
+
+def _pool_connections():
+    stats = pool.stats()
+    return [(("open",), stats["size"]), (("idle",), stats["idle"])]
+
+def _pool_checkouts():
+    stats = pool.stats()
+    return [
+        (("all",), stats["checkouts"]), (("waited",), stats["waited_checkouts"]), (("timed_out",), stats["timeouts"])
+    ]
+
+def _writes():
+    stats = db_executor.stats()
+    return [(("all",), stats["writes"]), (("failed",), stats["failed"])]
+
+def _outbox_notifications():
+    stats = get_outbox_stats()
+    return [((status,), stats[status]) for status in ("pending", "sent", "skipped", "dead")]
+
+CallbackMetric("db_pool_connections", "Соединения пула SQLite: открытые и свободные.", _pool_connections, ("state",))
+CallbackMetric(
+    "db_pool_checkouts", "Выдачи соединений из пула (waited — с ожиданием, timed_out — не дождались).",
+    _pool_checkouts, ("kind",), kind="counter"
+)
+CallbackMetric(
+    "db_write_queue", "Операции записи, ожидающие потока-писателя.",
+    lambda: [((), db_executor.stats()["queued"])]
+)
+CallbackMetric(
+    "db_write_batches", "Транзакции групповой записи.",
+    lambda: [((), db_executor.stats()["batches"])], kind="counter"
+)
+CallbackMetric("db_writes", "Операции групповой записи: все и завершившиеся ошибкой.", _writes, ("kind",), kind="counter")
+CallbackMetric(
+    "db_write_lock_retries", "Повторы начала записи: БД была занята другим процессом.",
+    lambda: [((), db_executor.stats()["lock_retries"])], kind="counter"
+)
+CallbackMetric(
+    "page_encodings", "Сжатия, в которых отдаются страницы (br — если установлен brotli).",
+    lambda: [((encoding,), 1) for encoding in page_encodings()], ("encoding",)
+)
+CallbackMetric(
+    "json_encoder", "Кодировщик JSON списка дефектов: orjson, если установлен, иначе json.",
+    lambda: [((json_encoder_name(),), 1)], ("encoder",)
+)
+CallbackMetric("sse_subscribers", "Открытые потоки событий (SSE).", lambda: [((), event_hub.subscriber_count)])
+CallbackMetric(
+    "notification_dispatcher_running", "Диспетчер уведомлений запущен (1) или нет (0).",
+    lambda: [((), 1 if outbox_dispatcher.stats()["running"] else 0)]
+)
+CallbackMetric(
+    "leader", "Процесс ведущий: выполняет уведомления и архивирование (1) или нет (0).",
+    lambda: [((), 1 if leader_election.is_leader else 0)]
+)
+CallbackMetric(
+    "defects_archived", "Дефекты, перенесённые в архив этим процессом.",
+    lambda: [((), defect_archiver.archived)], kind="counter"
+)
+CallbackMetric("outbox_notifications", "Уведомления в outbox по статусу.", _outbox_notifications, ("status",))
+CallbackMetric(
+    "outbox_oldest_pending_age_seconds", "Возраст самого старого неотправленного уведомления.",
+    lambda: [((), get_outbox_stats()["oldest_pending_age_seconds"])]
+)
+
+@router.get("", response_class=PlainTextResponse)
+def get_metrics():
+    """Метрики процесса в формате Prometheus."""
+    return PlainTextResponse(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
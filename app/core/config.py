@@ -10,5 +10,56 @@ TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 # Admin Password
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin123")
 
+# Режим разработки: изменённые страницы фронтенда перечитываются без перезапуска
+DEV_MODE = os.getenv("DEV_MODE", "").lower() in ("1", "true", "yes")
+
 # Database Path
-DATABASE_PATH = os.getenv("DATABASE_PATH", "defects.db")
\ No newline at end of file
+DATABASE_PATH = os.getenv("DATABASE_PATH", "defects.db")
+
+# Пул соединений SQLite
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "16"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_CACHED_STATEMENTS = int(os.getenv("DB_CACHED_STATEMENTS", "256"))
+# Наибольшее ожидание свободного соединения пула, секунд (дольше — ответ 503)
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+# Журнал медленных SQL-запросов: порог в миллисекундах (0 — выключен)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+
+# Потоки доступа к БД для асинхронного кода: чтение и групповая запись
+DB_READ_THREADS = int(os.getenv("DB_READ_THREADS", "8"))
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "64"))  # операций в одной транзакции
+# Повторы начала записи, если БД дольше DB_BUSY_TIMEOUT_MS занята другим процессом
+DB_LOCK_RETRIES = int(os.getenv("DB_LOCK_RETRIES", "3"))
+
+# Несколько процессов (uvicorn --workers N) с одной БД: миграции выполняет
+# один процесс, уведомления и архивирование — только ведущий (блокировки на файлах)
+MIGRATION_LOCK_PATH = os.getenv("MIGRATION_LOCK_PATH", DATABASE_PATH + ".migrate.lock")
+LEADER_LOCK_PATH = os.getenv("LEADER_LOCK_PATH", DATABASE_PATH + ".leader.lock")
+LEADER_RETRY_SECONDS = float(os.getenv("LEADER_RETRY_SECONDS", "5"))  # как часто остальные пробуют стать ведущим
+# Как часто процесс проверяет изменения дефектов, сделанные другими процессами (для SSE)
+EVENT_POLL_SECONDS = float(os.getenv("EVENT_POLL_SECONDS", "1"))
+
+# Отправка уведомлений из outbox
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "25"))  # сообщений в секунду всего
+TELEGRAM_PER_CHAT_RATE = float(os.getenv("TELEGRAM_PER_CHAT_RATE", "1"))  # сообщений в секунду в один чат
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "5"))
+OUTBOX_RETRY_MAX_SECONDS = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "3600"))
+# Проверка outbox без сигнала о новых записях (их могут добавить другие процессы)
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "2"))
+
+# Перенос завершённых дефектов в архив
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))  # через сколько дней после завершения; 0 — не переносить
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))  # дефектов в одной транзакции
+
+# Загрузка фотографий
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(15 * 1024 * 1024)))  # байт
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "320"))  # пикселей по большей стороне
+
+# Импорт дефектов из CSV/XLSX
+MAX_IMPORT_SIZE = int(os.getenv("MAX_IMPORT_SIZE", str(50 * 1024 * 1024)))  # байт
+# Строк импорта в одной операции записи: между частями успевают выполниться остальные записи
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "2000"))
@@ -0,0 +1,178 @@
+# app/core/db_pool.py
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional, Type
+
+logger = logging.getLogger(__name__)
+
+# Ожидание соединения дольше этого порога попадает в лог
+SLOW_CHECKOUT_SECONDS = 0.1
+
+class PoolTimeout(Exception):
+    """Все соединения пула заняты дольше допустимого ожидания."""
+
+class ConnectionPool:
+    """
+    Ограниченный пул соединений SQLite.
+
+    Соединения создаются лениво (не больше max_size), настраиваются один раз
+    (WAL, synchronous=NORMAL, busy_timeout, mmap, кэш подготовленных запросов)
+    и затем переиспользуются. Поток по возможности получает обратно «своё»
+    соединение, с уже прогретым кэшем запросов. Если все соединения заняты
+    дольше acquire_timeout секунд, acquire бросает PoolTimeout.
+    """
+
+    def __init__(
+        self,
+        database_path: str,
+        max_size: int,
+        busy_timeout_ms: int,
+        mmap_size: int,
+        cached_statements: int,
+        factory: Type[sqlite3.Connection] = sqlite3.Connection,
+        acquire_timeout: Optional[float] = None
+    ):
+        self.database_path = database_path
+        self.max_size = max_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.factory = factory
+        self.acquire_timeout = acquire_timeout
+
+        self._cond = threading.Condition()
+        self._idle: List[sqlite3.Connection] = []
+        self._size = 0
+        self._local = threading.local()
+
+        # Статистика ожидания соединений
+        self._checkouts = 0
+        self._waited_checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Создание и настройка нового соединения. Напрямую вызывается для
+        соединений вне пула (например, у потока-писателя).
+        """
+        conn = sqlite3.connect(
+            self.database_path,
+            timeout=self.busy_timeout_ms / 1000,
+            cached_statements=self.cached_statements,
+            factory=self.factory,
+            # Соединение может вернуться в пул из другого потока (потоковые ответы)
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row  # Позволяет обращаться к столбцам по имени
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Получение соединения из пула (с ожиданием, если все заняты)."""
+        started = time.perf_counter()
+        deadline = None if self.acquire_timeout is None else started + self.acquire_timeout
+        create = False
+        with self._cond:
+            while True:
+                preferred = getattr(self._local, "conn", None)
+                if preferred is not None and preferred in self._idle:
+                    self._idle.remove(preferred)
+                    conn = preferred
+                    break
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    create = True
+                    break
+                if deadline is None:
+                    self._cond.wait()
+                    continue
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    logger.error(f"[DB Pool] Нет свободного соединения за {self.acquire_timeout:.1f} с "
+                                 f"(размер пула {self.max_size})")
+                    raise PoolTimeout(f"Нет свободного соединения с БД за {self.acquire_timeout:.1f} с")
+                self._cond.wait(remaining)
+            waited = time.perf_counter() - started
+            self._record_wait(waited)
+
+        if create:
+            try:
+                conn = self.connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+
+        if waited >= SLOW_CHECKOUT_SECONDS:
+            logger.warning(f"[DB Pool] Ожидание соединения {waited * 1000:.1f} мс (размер пула {self.max_size})")
+        self._local.conn = conn
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Возврат соединения в пул. Незавершённая транзакция откатывается."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            logger.error(f"[DB Pool] Соединение повреждено и будет закрыто: {e}")
+            conn.close()
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Контекстный менеджер: соединение из пула на время блока."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def _record_wait(self, waited: float) -> None:
+        # Вызывается под self._cond
+        self._checkouts += 1
+        self._wait_total += waited
+        if waited > 0.001:
+            self._waited_checkouts += 1
+        if waited > self._wait_max:
+            self._wait_max = waited
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние пула и статистика ожидания соединений."""
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "waited_checkouts": self._waited_checkouts,
+                "wait_avg_ms": (self._wait_total / self._checkouts * 1000) if self._checkouts else 0.0,
+                "wait_max_ms": self._wait_max * 1000,
+                "timeouts": self._timeouts,
+            }
+
+    def close_all(self) -> None:
+        """Закрытие всех свободных соединений пула."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn in idle:
+            conn.close()
@@ -0,0 +1,76 @@
+# app/core/file_lock.py
+import os
+import time
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:  # Linux, macOS
+    msvcrt = None
+
+class FileLock:
+    """
+    Межпроцессная блокировка на файле (flock, в Windows — msvcrt.locking).
+
+    Блокировку держит открытый файл, поэтому она снимается и при аварийном
+    завершении процесса. Блокировки через разные объекты FileLock
+    исключают друг друга и внутри одного процесса.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def locked(self) -> bool:
+        return self._fd is not None
+
+    def _try_lock(self, fd: int) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self, blocking: bool = True, poll_interval: float = 0.1) -> bool:
+        """Захват блокировки. С blocking=False сразу возвращает False, если она занята."""
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        while not self._try_lock(fd):
+            if not blocking:
+                os.close(fd)
+                return False
+            time.sleep(poll_interval)
+        # Для диагностики: какой процесс держит блокировку
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        fd, self._fd = self._fd, None
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
@@ -1,16 +1,11 @@
 # app/core/init_db.py
 import sqlite3
 import os
-from .config import DATABASE_PATH
+from .config import DATABASE_PATH, DB_BUSY_TIMEOUT_MS, MIGRATION_LOCK_PATH
+from .file_lock import FileLock
 
-def init_db():
-    """Инициализация базы данных."""
-    # Создаем папку для загрузок если её нет
-    os.makedirs("uploads", exist_ok=True)
-    
-    conn = sqlite3.connect(DATABASE_PATH)
-    c = conn.cursor()
-    
+def _migration_1_base_schema(c):
+    """Базовая схема: defects, dropdown_lists, users."""
     # Проверим, существует ли таблица defects
     c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='defects'")
     table_exists = c.fetchone()
@@ -105,10 +100,671 @@ def init_db():
             telegram_id TEXT NOT NULL UNIQUE
         )
     ''')
-    
-    conn.commit()
-    conn.close()
+
+def _create_filter_indexes(c):
+    """Индексы defects под фильтры и сортировку списка."""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_defects_time_found ON defects (time_found)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_defects_section_status ON defects (section, status, time_found)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_defects_status ON defects (status, time_found)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_defects_assigned_status ON defects (assigned_to, status, time_found)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_defects_danger_status ON defects (danger_level, status, time_found)")
+
+def _migration_2_filter_indexes(c):
+    """Индексы под фильтры списка дефектов и поиск пользователя по имени."""
+    # Каждая комбинация фильтров get_all_defects начинается хотя бы с одного
+    # столбца-равенства, по которому есть индекс; time_found в конце индекса
+    # обслуживает сортировку и фильтр по диапазону времени.
+    _create_filter_indexes(c)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_users_name ON users (name)")
+
+def _create_row_version_triggers(c):
+    """Триггеры, присваивающие строкам defects следующую версию счётчика."""
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS defects_row_version_insert AFTER INSERT ON defects
+        BEGIN
+            UPDATE app_state SET value = value + 1 WHERE key = 'defects_version';
+            UPDATE defects SET row_version = (SELECT value FROM app_state WHERE key = 'defects_version')
+            WHERE id = NEW.id;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS defects_row_version_update AFTER UPDATE ON defects
+        WHEN NEW.row_version = OLD.row_version
+        BEGIN
+            UPDATE app_state SET value = value + 1 WHERE key = 'defects_version';
+            UPDATE defects SET row_version = (SELECT value FROM app_state WHERE key = 'defects_version')
+            WHERE id = NEW.id;
+        END
+    ''')
+
+def _migration_3_row_version(c):
+    """Монотонная версия строк defects для дельта-синхронизации."""
+    # Общий счётчик версий хранится отдельно, чтобы версии не повторялись,
+    # даже если строка с максимальной версией будет удалена из defects.
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS app_state (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    c.execute("ALTER TABLE defects ADD COLUMN row_version INTEGER NOT NULL DEFAULT 0")
+    c.execute("UPDATE defects SET row_version = id")
+    c.execute('''
+        INSERT OR REPLACE INTO app_state (key, value)
+        VALUES ('defects_version', (SELECT COALESCE(MAX(row_version), 0) FROM defects))
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_defects_row_version ON defects (row_version)")
+    _create_row_version_triggers(c)
+
+def _migration_4_integer_timestamps(c):
+    """Время в defects хранится целым числом секунд Unix вместо текста."""
+    # Столбцы с типом TEXT превращают числа в строки, поэтому таблица
+    # пересоздаётся с INTEGER-столбцами времени
+    c.execute('''
+        CREATE TABLE defects_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            equipment TEXT,
+            description TEXT,
+            section TEXT,
+            time_found INTEGER,
+            danger_level TEXT,
+            status TEXT DEFAULT 'новый',
+            assigned_to TEXT,
+            responsible TEXT,
+            time_started INTEGER,
+            time_completed INTEGER,
+            photo_url TEXT,
+            row_version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # Старые значения записаны в локальном времени сервера ("%Y-%m-%d %H:%M:%S"),
+    # модификатор 'utc' переводит их в UTC перед получением секунд
+    c.execute('''
+        INSERT INTO defects_new (id, equipment, description, section, time_found, danger_level, status,
+                                 assigned_to, responsible, time_started, time_completed, photo_url, row_version)
+        SELECT id, equipment, description, section,
+               CAST(strftime('%s', time_found, 'utc') AS INTEGER),
+               danger_level, status, assigned_to, responsible,
+               CAST(strftime('%s', time_started, 'utc') AS INTEGER),
+               CAST(strftime('%s', time_completed, 'utc') AS INTEGER),
+               photo_url, row_version
+        FROM defects
+    ''')
+    c.execute("DROP TABLE defects")
+    c.execute("ALTER TABLE defects_new RENAME TO defects")
+    _create_filter_indexes(c)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_defects_row_version ON defects (row_version)")
+    _create_row_version_triggers(c)
+
+def _migration_5_notification_outbox(c):
+    """Очередь уведомлений (outbox), записываемая в одной транзакции с дефектом."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            recipient TEXT NOT NULL,
+            role TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at INTEGER NOT NULL,
+            last_error TEXT,
+            created_at INTEGER NOT NULL,
+            sent_at INTEGER
+        )
+    ''')
+    # Диспетчер выбирает только ожидающие отправки записи, по времени попытки
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (next_attempt_at)
+        WHERE status = 'pending'
+    ''')
+
+def _migration_6_telegram_file_ids(c):
+    """Кэш file_id фотографий, уже загруженных в Telegram."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS telegram_files (
+            photo_url TEXT PRIMARY KEY,
+            file_id TEXT NOT NULL,
+            created_at INTEGER NOT NULL
+        )
+    ''')
+
+def _migration_7_photo_thumbnails(c):
+    """URL миниатюры фото дефекта."""
+    c.execute("ALTER TABLE defects ADD COLUMN photo_thumb_url TEXT")
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_defects_photo_url
+        ON defects(photo_url)
+        WHERE photo_url IS NOT NULL
+    ''')
+
+def _migration_8_dropdown_lists_version(c):
+    """Версия списков выбора для кэша в памяти процессов."""
+    c.execute("INSERT OR IGNORE INTO app_state (key, value) VALUES ('dropdown_lists_version', 1)")
+    # Любое изменение списков увеличивает версию — кэши всех процессов устаревают
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS dropdown_lists_version_{event.lower()}
+            AFTER {event} ON dropdown_lists
+            BEGIN
+                UPDATE app_state SET value = value + 1 WHERE key = 'dropdown_lists_version';
+            END
+        ''')
+
+def _create_reference_filter_indexes(c):
+    """Индексы defects под фильтры и сортировку списка (столбцы-ссылки на справочники)."""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_defects_time_found ON defects (time_found)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_defects_section_status ON defects (section_id, status, time_found)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_defects_status ON defects (status, time_found)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_defects_assigned_status ON defects (assigned_to_id, status, time_found)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_defects_danger_status ON defects (danger_level, status, time_found)")
+
+def _create_reference_version_triggers(c):
+    """Изменение справочников увеличивает версию списков выбора."""
+    for table in ("equipment", "sections", "people"):
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            c.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_lists_version_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE app_state SET value = value + 1 WHERE key = 'dropdown_lists_version';
+                END
+            ''')
+
+def _migration_9_reference_tables(c):
+    """Справочники equipment, sections, people; defects ссылается на них по id."""
+    for table in ("equipment", "sections"):
+        c.execute(f'''
+            CREATE TABLE {table} (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE,
+                active INTEGER NOT NULL DEFAULT 0,
+                position INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+    c.execute('''
+        CREATE TABLE people (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            is_executor INTEGER NOT NULL DEFAULT 0,
+            executor_position INTEGER NOT NULL DEFAULT 0,
+            is_responsible INTEGER NOT NULL DEFAULT 0,
+            responsible_position INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    # Список выбора -> таблица, признак «показывать в списке» и позиция в нём.
+    # Для людей списков два (исполнители и ответственные), у каждого свой признак.
+    reference_lists = {
+        "equipment": ("equipment", "active", "position"),
+        "sections": ("sections", "active", "position"),
+        "executors": ("people", "is_executor", "executor_position"),
+        "responsibles": ("people", "is_responsible", "responsible_position"),
+    }
+    # Текущее содержимое списков выбора — в том же порядке
+    c.execute("SELECT list_name, items FROM dropdown_lists")
+    for list_name, items in c.fetchall():
+        if list_name not in reference_lists:
+            continue
+        table, flag, position = reference_lists[list_name]
+        names = [item.strip() for item in (items or "").split("\n") if item.strip()]
+        for index, name in enumerate(dict.fromkeys(names)):
+            c.execute(f'''
+                INSERT INTO {table} (name, {flag}, {position}) VALUES (?, 1, ?)
+                ON CONFLICT(name) DO UPDATE SET {flag} = 1, {position} = excluded.{position}
+            ''', (name, index))
+
+    # Значения из истории дефектов, которых уже нет в списках, — скрытые записи
+    for table, column in (("equipment", "equipment"), ("sections", "section"),
+                          ("people", "assigned_to"), ("people", "responsible")):
+        c.execute(f'''
+            INSERT OR IGNORE INTO {table} (name)
+            SELECT DISTINCT {column} FROM defects WHERE {column} IS NOT NULL AND {column} != ''
+        ''')
+
+    c.execute('''
+        CREATE TABLE defects_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            equipment_id INTEGER REFERENCES equipment (id),
+            description TEXT,
+            section_id INTEGER REFERENCES sections (id),
+            time_found INTEGER,
+            danger_level TEXT,
+            status TEXT DEFAULT 'новый',
+            assigned_to_id INTEGER REFERENCES people (id),
+            responsible_id INTEGER REFERENCES people (id),
+            time_started INTEGER,
+            time_completed INTEGER,
+            photo_url TEXT,
+            photo_thumb_url TEXT,
+            row_version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    c.execute('''
+        INSERT INTO defects_new (id, equipment_id, description, section_id, time_found, danger_level, status,
+                                 assigned_to_id, responsible_id, time_started, time_completed,
+                                 photo_url, photo_thumb_url, row_version)
+        SELECT d.id, e.id, d.description, s.id, d.time_found, d.danger_level, d.status,
+               pa.id, pr.id, d.time_started, d.time_completed,
+               d.photo_url, d.photo_thumb_url, d.row_version
+        FROM defects d
+        LEFT JOIN equipment e ON e.name = d.equipment
+        LEFT JOIN sections s ON s.name = d.section
+        LEFT JOIN people pa ON pa.name = d.assigned_to
+        LEFT JOIN people pr ON pr.name = d.responsible
+    ''')
+    c.execute("DROP TABLE defects")
+    c.execute("ALTER TABLE defects_new RENAME TO defects")
+    _create_reference_filter_indexes(c)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_defects_row_version ON defects (row_version)")
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_defects_photo_url
+        ON defects(photo_url)
+        WHERE photo_url IS NOT NULL
+    ''')
+    _create_row_version_triggers(c)
+
+    # Списки выбора теперь строятся по справочникам
+    c.execute("DROP TABLE dropdown_lists")
+    _create_reference_version_triggers(c)
+    c.execute("UPDATE app_state SET value = value + 1 WHERE key = 'dropdown_lists_version'")
+
+def _fts_text(expression):
+    """SQL-выражение текста для полнотекстового индекса: «ё» приводится к «е»."""
+    return f"replace(replace({expression}, 'ё', 'е'), 'Ё', 'Е')"
+
+def _create_search_triggers(c):
+    """Триггеры, поддерживающие defects_fts в соответствии с defects и equipment."""
+    equipment_name = "(SELECT name FROM equipment WHERE id = NEW.equipment_id)"
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS defects_fts_insert
+        AFTER INSERT ON defects
+        BEGIN
+            INSERT INTO defects_fts (rowid, description, equipment)
+            VALUES (NEW.id, {_fts_text("NEW.description")}, {_fts_text(equipment_name)});
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS defects_fts_update
+        AFTER UPDATE OF description, equipment_id ON defects
+        BEGIN
+            DELETE FROM defects_fts WHERE rowid = OLD.id;
+            INSERT INTO defects_fts (rowid, description, equipment)
+            VALUES (NEW.id, {_fts_text("NEW.description")}, {_fts_text(equipment_name)});
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS defects_fts_delete
+        AFTER DELETE ON defects
+        BEGIN
+            DELETE FROM defects_fts WHERE rowid = OLD.id;
+        END
+    ''')
+    # Переименование оборудования переиндексирует его дефекты
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS equipment_fts_rename
+        AFTER UPDATE OF name ON equipment
+        BEGIN
+            DELETE FROM defects_fts WHERE rowid IN (SELECT id FROM defects WHERE equipment_id = NEW.id);
+            INSERT INTO defects_fts (rowid, description, equipment)
+            SELECT id, {_fts_text("description")}, {_fts_text("NEW.name")}
+            FROM defects WHERE equipment_id = NEW.id;
+        END
+    ''')
+
+def _migration_10_full_text_search(c):
+    """Полнотекстовый поиск (FTS5) по описанию и оборудованию дефектов."""
+    # unicode61 приводит кириллицу к нижнему регистру; префиксные индексы
+    # ускоряют поиск по началу слова («подшипн*» найдёт «подшипника»)
+    c.execute('''
+        CREATE VIRTUAL TABLE defects_fts USING fts5(
+            description,
+            equipment,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    ''')
+    c.execute(f'''
+        INSERT INTO defects_fts (rowid, description, equipment)
+        SELECT d.id, {_fts_text("d.description")}, {_fts_text("e.name")}
+        FROM defects d
+        LEFT JOIN equipment e ON e.id = d.equipment_id
+    ''')
+    _create_search_triggers(c)
+
+# Границы корзин гистограммы времени устранения (секунды): по ним считается p90.
+# Корзина i содержит значения до RESOLUTION_BUCKET_BOUNDS[i] включительно,
+# последняя (с номером len(...)) — всё, что дольше.
+RESOLUTION_BUCKET_BOUNDS = (
+    300, 600, 900, 1800, 2700, 3600, 5400, 7200, 10800, 14400, 21600, 28800, 43200, 57600,
+    86400, 129600, 172800, 259200, 345600, 432000, 604800, 864000, 1209600, 1814400,
+    2592000, 3888000, 5184000, 7776000
+)
+
+def _stats_dimensions(row):
+    """Разрезы статистики: (имя, выражение ключа группы) для строки defects row."""
+    # Неделя — по времени обнаружения, с понедельника 00:00 UTC
+    # (эпоха Unix началась в четверг, до понедельника 4 дня = 345600 с)
+    return (
+        ("all", "0"),
+        ("section", f"COALESCE({row}.section_id, 0)"),
+        ("equipment", f"COALESCE({row}.equipment_id, 0)"),
+        ("executor", f"COALESCE({row}.assigned_to_id, 0)"),
+        ("week", f"COALESCE({row}.time_found - ({row}.time_found - 345600) % 604800, 0)"),
+    )
+
+def _resolution_sql(row):
+    return f"({row}.time_completed - {row}.time_started)"
+
+def _resolution_bucket_sql(row):
+    resolution = _resolution_sql(row)
+    cases = " ".join(
+        f"WHEN {resolution} <= {bound} THEN {index}" for index, bound in enumerate(RESOLUTION_BUCKET_BOUNDS)
+    )
+    return f"CASE {cases} ELSE {len(RESOLUTION_BUCKET_BOUNDS)} END"
+
+def _stats_delta_statements(row, sign, resolution_range=True):
+    """
+    Операторы, добавляющие (sign=1) или убирающие (sign=-1) строку row из
+    сводных таблиц. resolution_range=False — без min_seconds/max_seconds
+    (схема до миграции 14).
+    """
+    statements = []
+    resolution = _resolution_sql(row)
+    # Наименьшее и наибольшее время в корзине: добавленное значение расширяет
+    # диапазон; после удаления он сохраняется (остаётся верной границей),
+    # пока корзина не опустеет
+    if sign > 0:
+        observed = resolution
+        min_seconds = "MIN(COALESCE(min_seconds, excluded.min_seconds), excluded.min_seconds)"
+        max_seconds = "MAX(COALESCE(max_seconds, excluded.max_seconds), excluded.max_seconds)"
+    else:
+        observed = "NULL"
+        min_seconds = "CASE WHEN resolved_count + excluded.resolved_count = 0 THEN NULL ELSE min_seconds END"
+        max_seconds = "CASE WHEN resolved_count + excluded.resolved_count = 0 THEN NULL ELSE max_seconds END"
+    for dimension, key in _stats_dimensions(row):
+        statements.append(f'''
+            INSERT INTO defect_stats (dimension, key, status, danger_level, defect_count)
+            VALUES ('{dimension}', {key}, COALESCE({row}.status, ''), COALESCE({row}.danger_level, ''), {sign})
+            ON CONFLICT (dimension, key, status, danger_level)
+            DO UPDATE SET defect_count = defect_count + excluded.defect_count;
+        ''')
+        if not resolution_range:
+            statements.append(f'''
+                INSERT INTO defect_resolution_stats (dimension, key, bucket, resolved_count, resolved_seconds)
+                SELECT '{dimension}', {key}, {_resolution_bucket_sql(row)}, {sign}, {sign} * {resolution}
+                WHERE {row}.time_started IS NOT NULL AND {row}.time_completed IS NOT NULL
+                ON CONFLICT (dimension, key, bucket)
+                DO UPDATE SET resolved_count = resolved_count + excluded.resolved_count,
+                              resolved_seconds = resolved_seconds + excluded.resolved_seconds;
+            ''')
+            continue
+        statements.append(f'''
+            INSERT INTO defect_resolution_stats (dimension, key, bucket, resolved_count, resolved_seconds,
+                                                 min_seconds, max_seconds)
+            SELECT '{dimension}', {key}, {_resolution_bucket_sql(row)}, {sign}, {sign} * {resolution},
+                   {observed}, {observed}
+            WHERE {row}.time_started IS NOT NULL AND {row}.time_completed IS NOT NULL
+            ON CONFLICT (dimension, key, bucket)
+            DO UPDATE SET resolved_count = resolved_count + excluded.resolved_count,
+                          resolved_seconds = resolved_seconds + excluded.resolved_seconds,
+                          min_seconds = {min_seconds},
+                          max_seconds = {max_seconds};
+        ''')
+    return "".join(statements)
+
+# Столбцы defects, от которых зависит статистика
+STATS_COLUMNS = (
+    "status", "danger_level", "section_id", "equipment_id", "assigned_to_id",
+    "time_found", "time_started", "time_completed"
+)
+
+def _create_stats_triggers(c, resolution_range=True):
+    """Триггеры, поддерживающие сводные таблицы статистики при изменении defects."""
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS defects_stats_insert
+        AFTER INSERT ON defects
+        BEGIN
+            {_stats_delta_statements("NEW", 1, resolution_range)}
+        END
+    ''')
+    changed = " OR ".join(f"OLD.{column} IS NOT NEW.{column}" for column in STATS_COLUMNS)
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS defects_stats_update
+        AFTER UPDATE OF {", ".join(STATS_COLUMNS)} ON defects
+        WHEN {changed}
+        BEGIN
+            {_stats_delta_statements("OLD", -1, resolution_range)}
+            {_stats_delta_statements("NEW", 1, resolution_range)}
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS defects_stats_delete
+        AFTER DELETE ON defects
+        BEGIN
+            {_stats_delta_statements("OLD", -1, resolution_range)}
+        END
+    ''')
+
+def _migration_11_defect_stats(c):
+    """Сводные таблицы статистики дефектов, обновляемые триггерами."""
+    # Количество дефектов по статусу и уровню опасности в каждой группе
+    c.execute('''
+        CREATE TABLE defect_stats (
+            dimension TEXT NOT NULL,
+            key INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            danger_level TEXT NOT NULL,
+            defect_count INTEGER NOT NULL,
+            PRIMARY KEY (dimension, key, status, danger_level)
+        ) WITHOUT ROWID
+    ''')
+    # Гистограмма времени устранения завершённых дефектов и его сумма (для MTTR)
+    c.execute('''
+        CREATE TABLE defect_resolution_stats (
+            dimension TEXT NOT NULL,
+            key INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            resolved_count INTEGER NOT NULL,
+            resolved_seconds INTEGER NOT NULL,
+            PRIMARY KEY (dimension, key, bucket)
+        ) WITHOUT ROWID
+    ''')
+    # Заполнение по уже существующим дефектам
+    for dimension, key in _stats_dimensions("d"):
+        c.execute(f'''
+            INSERT INTO defect_stats (dimension, key, status, danger_level, defect_count)
+            SELECT '{dimension}', {key}, COALESCE(d.status, ''), COALESCE(d.danger_level, ''), COUNT(*)
+            FROM defects d
+            GROUP BY 2, 3, 4
+        ''')
+        c.execute(f'''
+            INSERT INTO defect_resolution_stats (dimension, key, bucket, resolved_count, resolved_seconds)
+            SELECT '{dimension}', {key}, {_resolution_bucket_sql("d")}, COUNT(*), SUM({_resolution_sql("d")})
+            FROM defects d
+            WHERE d.time_started IS NOT NULL AND d.time_completed IS NOT NULL
+            GROUP BY 2, 3
+        ''')
+    _create_stats_triggers(c, resolution_range=False)
+
+def _create_archive_triggers(c, resolution_range=True):
+    """
+    Триггеры defects_archive: перенесённые дефекты остаются в статистике и
+    полнотекстовом индексе (удаление из defects их оттуда убирает).
+    Строки архива не изменяются, поэтому триггеров UPDATE нет.
+    """
+    equipment_name = "(SELECT name FROM equipment WHERE id = NEW.equipment_id)"
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS defects_archive_insert
+        AFTER INSERT ON defects_archive
+        BEGIN
+            INSERT INTO defects_fts (rowid, description, equipment)
+            VALUES (NEW.id, {_fts_text("NEW.description")}, {_fts_text(equipment_name)});
+            {_stats_delta_statements("NEW", 1, resolution_range)}
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS defects_archive_delete
+        AFTER DELETE ON defects_archive
+        BEGIN
+            DELETE FROM defects_fts WHERE rowid = OLD.id;
+            {_stats_delta_statements("OLD", -1, resolution_range)}
+        END
+    ''')
+    # Переименование оборудования переиндексирует и архивные дефекты
+    c.execute("DROP TRIGGER IF EXISTS equipment_fts_rename")
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS equipment_fts_rename
+        AFTER UPDATE OF name ON equipment
+        BEGIN
+            DELETE FROM defects_fts WHERE rowid IN (
+                SELECT id FROM defects WHERE equipment_id = NEW.id
+                UNION ALL
+                SELECT id FROM defects_archive WHERE equipment_id = NEW.id
+            );
+            INSERT INTO defects_fts (rowid, description, equipment)
+            SELECT id, {_fts_text("description")}, {_fts_text("NEW.name")}
+            FROM defects WHERE equipment_id = NEW.id
+            UNION ALL
+            SELECT id, {_fts_text("description")}, {_fts_text("NEW.name")}
+            FROM defects_archive WHERE equipment_id = NEW.id;
+        END
+    ''')
+
+def _migration_12_defects_archive(c):
+    """Архив давно завершённых дефектов (defects_archive)."""
+    # Те же столбцы, что у defects, и время переноса. id переносится как есть:
+    # AUTOINCREMENT в defects не выдаёт их повторно
+    c.execute('''
+        CREATE TABLE defects_archive (
+            id INTEGER PRIMARY KEY,
+            equipment_id INTEGER REFERENCES equipment (id),
+            description TEXT,
+            section_id INTEGER REFERENCES sections (id),
+            time_found INTEGER,
+            danger_level TEXT,
+            status TEXT,
+            assigned_to_id INTEGER REFERENCES people (id),
+            responsible_id INTEGER REFERENCES people (id),
+            time_started INTEGER,
+            time_completed INTEGER,
+            photo_url TEXT,
+            photo_thumb_url TEXT,
+            row_version INTEGER NOT NULL DEFAULT 0,
+            archived_at INTEGER NOT NULL
+        )
+    ''')
+    # В архиве только завершённые дефекты, поэтому индексов по статусу нет
+    c.execute("CREATE INDEX IF NOT EXISTS idx_defects_archive_time_found ON defects_archive (time_found)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_defects_archive_section ON defects_archive (section_id, time_found)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_defects_archive_assigned ON defects_archive (assigned_to_id, time_found)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_defects_archive_danger ON defects_archive (danger_level, time_found)")
+    # Отбор кандидатов на перенос
+    c.execute("CREATE INDEX IF NOT EXISTS idx_defects_status_completed ON defects (status, time_completed)")
+    _create_archive_triggers(c, resolution_range=False)
+
+def _migration_13_defect_versions(c):
+    """Версия дефекта для оптимистической блокировки."""
+    # version растёт при каждом изменении дефекта пользователем
+    # (If-Match, 409 при устаревшей версии). ADD COLUMN не перестраивает
+    # таблицу: индексы и триггеры остаются.
+    c.execute("ALTER TABLE defects ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    c.execute("ALTER TABLE defects_archive ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+def _migration_14_resolution_range(c):
+    """Наименьшее и наибольшее время устранения в корзинах статистики."""
+    # Перцентили интерполируются внутри наблюдавшегося диапазона корзины,
+    # а не между её границами
+    c.execute("ALTER TABLE defect_resolution_stats ADD COLUMN min_seconds INTEGER")
+    c.execute("ALTER TABLE defect_resolution_stats ADD COLUMN max_seconds INTEGER")
+    resolved = " UNION ALL ".join(
+        f"SELECT section_id, equipment_id, assigned_to_id, time_found, time_started, time_completed FROM {table} "
+        f"WHERE time_started IS NOT NULL AND time_completed IS NOT NULL"
+        for table in ("defects", "defects_archive")
+    )
+    for dimension, key in _stats_dimensions("d"):
+        c.execute(f'''
+            UPDATE defect_resolution_stats AS r
+            SET min_seconds = m.min_seconds, max_seconds = m.max_seconds
+            FROM (
+                SELECT {key} AS key, {_resolution_bucket_sql("d")} AS bucket,
+                       MIN({_resolution_sql("d")}) AS min_seconds, MAX({_resolution_sql("d")}) AS max_seconds
+                FROM ({resolved}) d
+                GROUP BY 1, 2
+            ) m
+            WHERE r.dimension = '{dimension}' AND r.key = m.key AND r.bucket = m.bucket
+        ''')
+    # Триггеры статистики пересоздаются с обновлением диапазона
+    for trigger in ("defects_stats_insert", "defects_stats_update", "defects_stats_delete",
+                    "defects_archive_insert", "defects_archive_delete"):
+        c.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    _create_stats_triggers(c)
+    _create_archive_triggers(c)
+
+# Миграции схемы по порядку: миграция с номером N (индекс + 1) применяется
+# один раз, после чего PRAGMA user_version становится равным N.
+MIGRATIONS = [
+    _migration_1_base_schema,
+    _migration_2_filter_indexes,
+    _migration_3_row_version,
+    _migration_4_integer_timestamps,
+    _migration_5_notification_outbox,
+    _migration_6_telegram_file_ids,
+    _migration_7_photo_thumbnails,
+    _migration_8_dropdown_lists_version,
+    _migration_9_reference_tables,
+    _migration_10_full_text_search,
+    _migration_11_defect_stats,
+    _migration_12_defects_archive,
+    _migration_13_defect_versions,
+    _migration_14_resolution_range,
+]
+
+def _schema_version(c) -> int:
+    c.execute("PRAGMA user_version")
+    return c.fetchone()[0]
+
+def init_db():
+    """
+    Инициализация базы данных: применение недостающих миграций.
+
+    Безопасна при одновременном запуске нескольких процессов (uvicorn
+    --workers): миграции выполняет тот, кто первым захватил блокировку
+    MIGRATION_LOCK_PATH, остальные ждут её и находят схему актуальной.
+    Каждая миграция идёт в транзакции BEGIN IMMEDIATE с повторной проверкой
+    версии, поэтому дважды она не применится и без файловой блокировки.
+    """
+    # Создаем папку для загрузок если её нет
+    os.makedirs("uploads", exist_ok=True)
+
+    # isolation_level=None: транзакциями миграций управляем сами
+    conn = sqlite3.connect(DATABASE_PATH, isolation_level=None, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+    try:
+        c = conn.cursor()
+        if _schema_version(c) >= len(MIGRATIONS):
+            # Схема актуальна: при обычном запуске больше ничего не читается
+            return
+        with FileLock(MIGRATION_LOCK_PATH):
+            # Режим WAL переключается до миграций, пока другие процессы ждут блокировку
+            c.execute("PRAGMA journal_mode = WAL")
+            for number, migration in enumerate(MIGRATIONS, start=1):
+                if number <= _schema_version(c):
+                    continue
+                c.execute("BEGIN IMMEDIATE")
+                try:
+                    # Версия могла измениться, пока ждали блокировку записи
+                    if number <= _schema_version(c):
+                        c.execute("ROLLBACK")
+                        continue
+                    print(f"Применение миграции {number}: {migration.__doc__}")
+                    migration(c)
+                    c.execute(f"PRAGMA user_version = {number}")
+                    c.execute("COMMIT")
+                except Exception:
+                    c.execute("ROLLBACK")
+                    raise
+    finally:
+        conn.close()
 
 if __name__ == "__main__":
     init_db()
-    print("База данных готова.")
\ No newline at end of file
+    print("База данных готова.")
@@ -1,224 +1,1208 @@
 # app/database.py
+import base64
+import html
+import json
+import re
 import sqlite3
-from typing import List, Dict, Any, Optional
-from .core.config import DATABASE_PATH
+import threading
+import time
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Set, Tuple
+from .core.config import (
+    DATABASE_PATH, DB_POOL_SIZE, DB_BUSY_TIMEOUT_MS, DB_MMAP_SIZE, DB_CACHED_STATEMENTS, DB_POOL_TIMEOUT_SECONDS
+)
+from .core.db_pool import ConnectionPool
+from .core.init_db import RESOLUTION_BUCKET_BOUNDS
+from .metrics import InstrumentedConnection
 
-def get_db_connection():
-    """Создание соединения с базой данных."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row  # Позволяет обращаться к столбцам по имени
-    return conn
+# Общий пул соединений процесса
+pool = ConnectionPool(
+    DATABASE_PATH,
+    max_size=DB_POOL_SIZE,
+    busy_timeout_ms=DB_BUSY_TIMEOUT_MS,
+    mmap_size=DB_MMAP_SIZE,
+    cached_statements=DB_CACHED_STATEMENTS,
+    # Время и число строк каждого запроса попадают в /metrics
+    factory=InstrumentedConnection,
+    acquire_timeout=DB_POOL_TIMEOUT_SECONDS
+)
 
-def get_all_defects(
+def db_connection():
+    """Соединение с базой данных из пула (используется в блоке with)."""
+    return pool.connection()
+
+# Размер страницы, которой читаются длинные списки дефектов
+FETCH_BATCH_SIZE = 500
+
+# Время хранится в секундах Unix. Длительность устранения считается в самом
+# запросе: от начала работ до завершения, для дефектов в работе — до текущего
+# момента; форматирование остаётся клиенту.
+RESOLUTION_SECONDS_SQL = (
+    "CASE WHEN time_started IS NULL THEN NULL "
+    "ELSE COALESCE(time_completed, CAST(strftime('%s', 'now') AS INTEGER)) - time_started END"
+)
+# Оборудование, участок и люди хранятся в справочниках; в ответах API — их имена
+DEFECT_COLUMNS = f'''
+    d.id AS id, e.name AS equipment, d.description, s.name AS section, d.time_found AS time_found,
+    d.danger_level, d.status, pa.name AS assigned_to, pr.name AS responsible,
+    d.time_started, d.time_completed, d.photo_url, d.photo_thumb_url, d.row_version,
+    {RESOLUTION_SECONDS_SQL} AS resolution_seconds, d.version
+'''
+# Имена столбцов DEFECT_COLUMNS по порядку
+DEFECT_FIELDS = (
+    "id", "equipment", "description", "section", "time_found", "danger_level", "status",
+    "assigned_to", "responsible", "time_started", "time_completed", "photo_url", "photo_thumb_url",
+    "row_version", "resolution_seconds", "version"
+)
+DEFECT_JOINS = '''
+    LEFT JOIN equipment e ON e.id = d.equipment_id
+    LEFT JOIN sections s ON s.id = d.section_id
+    LEFT JOIN people pa ON pa.id = d.assigned_to_id
+    LEFT JOIN people pr ON pr.id = d.responsible_id
+'''
+DEFECT_SELECT = f"SELECT {DEFECT_COLUMNS} FROM defects d {DEFECT_JOINS}"
+# Давно завершённые дефекты переносятся в архив с теми же столбцами
+ARCHIVE_SELECT = f"SELECT {DEFECT_COLUMNS} FROM defects_archive d {DEFECT_JOINS}"
+COMPLETED_STATUS = "завершён"
+# Столбцы, копируемые при переносе в архив
+ARCHIVE_COLUMNS = (
+    "id, equipment_id, description, section_id, time_found, danger_level, status, assigned_to_id, "
+    "responsible_id, time_started, time_completed, photo_url, photo_thumb_url, row_version, version"
+)
+
+# Маркеры подсветки в сниппетах поиска (заменяются на <mark> после экранирования HTML)
+_MARK_START = "\x02"
+_MARK_END = "\x03"
+# Слова поискового запроса
+_SEARCH_TOKEN_RE = re.compile(r"\w+")
+
+# Списки выбора: имя списка -> (таблица справочника, признак «в списке», позиция)
+REFERENCE_LISTS = {
+    "equipment": ("equipment", "active", "position"),
+    "sections": ("sections", "active", "position"),
+    "executors": ("people", "is_executor", "executor_position"),
+    "responsibles": ("people", "is_responsible", "responsible_position"),
+}
+
+def encode_cursor(time_found: Any, defect_id: int) -> str:
+    """Кодирование ключа (time_found, id) в непрозрачный курсор пагинации."""
+    raw = json.dumps([time_found, defect_id], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """Разбор курсора пагинации. При некорректном значении бросает ValueError."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        time_found, defect_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception as e:
+        raise ValueError(f"Некорректный курсор: {cursor}") from e
+    if not isinstance(defect_id, int):
+        raise ValueError(f"Некорректный курсор: {cursor}")
+    return time_found, defect_id
+
+def _defect_filters_sql(
     section: Optional[str] = None,
     status: Optional[str] = None,
     danger_level: Optional[str] = None,
-    assigned_to: Optional[str] = None
-) -> List[Dict[str, Any]]:
-    """Получение списка всех дефектов с фильтрацией."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    query = "SELECT * FROM defects WHERE 1=1"
-    params: List[str] = []
-    
+    assigned_to: Optional[str] = None,
+    time_found_from: Optional[int] = None,
+    time_found_to: Optional[int] = None
+) -> Tuple[str, List[Any]]:
+    """Условия фильтров списка дефектов (" AND ..." для таблицы defects d) и их параметры."""
+    query = ""
+    params: List[Any] = []
+
+    # Имена переводятся в id подзапросом (выполняется один раз), сами строки
+    # defects фильтруются сравнением целых чисел по индексу
     if section:
-        query += " AND section = ?"
+        query += " AND d.section_id = (SELECT id FROM sections WHERE name = ?)"
         params.append(section)
     if status:
-        query += " AND status = ?"
+        query += " AND d.status = ?"
         params.append(status)
     if danger_level:
-        query += " AND danger_level = ?"
+        query += " AND d.danger_level = ?"
         params.append(danger_level)
     if assigned_to:
-        query += " AND assigned_to = ?"
+        query += " AND d.assigned_to_id = (SELECT id FROM people WHERE name = ?)"
         params.append(assigned_to)
-    
-    c.execute(query, params)
-    rows = c.fetchall()
-    conn.close()
-    
-    defects = []
-    for row in rows:
-        resolution_time = ""
-        if row['time_started'] and row['time_completed']:
-            try:
-                from datetime import datetime
-                start_time = datetime.strptime(row['time_started'], "%Y-%m-%d %H:%M:%S")
-                end_time = datetime.strptime(row['time_completed'], "%Y-%m-%d %H:%M:%S")
-                diff = end_time - start_time
-                hours = diff.total_seconds() / 3600
-                resolution_time = f"{hours:.1f} ч"
-            except Exception as e:
-                print(f"Ошибка вычисления времени: {e}")
-                resolution_time = "Ошибка"
-        elif row['time_started']:
-            try:
-                from datetime import datetime
-                start_time = datetime.strptime(row['time_started'], "%Y-%m-%d %H:%M:%S")
-                now = datetime.now()
-                diff = now - start_time
-                hours = diff.total_seconds() / 3600
-                resolution_time = f"{hours:.1f} ч (в работе)"
-            except Exception as e:
-                print(f"Ошибка вычисления времени: {e}")
-                resolution_time = "Ошибка"
-        
-        defects.append({
-            "id": row['id'],
-            "equipment": row['equipment'],
-            "description": row['description'],
-            "section": row['section'],
-            "time_found": row['time_found'],
-            "danger_level": row['danger_level'],
-            "status": row['status'],
-            "assigned_to": row['assigned_to'],
-            "responsible": row['responsible'],
-            "time_started": row['time_started'],
-            "time_completed": row['time_completed'],
-            "resolution_time": resolution_time,
-            "photo_url": row['photo_url'] if 'photo_url' in row.keys() else None
-        })
-    
-    return defects
-
-def create_defect(defect_data: Dict[str, Any]) -> int:
-    """Создание нового дефекта."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    
+    if time_found_from is not None:
+        query += " AND d.time_found >= ?"
+        params.append(time_found_from)
+    if time_found_to is not None:
+        query += " AND d.time_found <= ?"
+        params.append(time_found_to)
+
+    return query, params
+
+def _build_defects_query(
+    section: Optional[str] = None,
+    status: Optional[str] = None,
+    danger_level: Optional[str] = None,
+    assigned_to: Optional[str] = None,
+    time_found_from: Optional[int] = None,
+    time_found_to: Optional[int] = None,
+    after: Optional[Tuple[Any, int]] = None,
+    order: str = "asc",
+    limit: Optional[int] = None,
+    include_archived: bool = False
+) -> Tuple[str, List[Any]]:
+    """
+    Формирование запроса списка дефектов с фильтрами и keyset-пагинацией.
+    С include_archived к defects добавляется defects_archive: обе части
+    упорядочены по индексам и сливаются в общий порядок (time_found, id),
+    поэтому курсоры пагинации одинаковы для обоих режимов.
+    """
+    if order not in ("asc", "desc"):
+        raise ValueError(f"Неизвестный порядок сортировки: {order}")
+
+    filters_sql, filter_params = _defect_filters_sql(
+        section, status, danger_level, assigned_to, time_found_from, time_found_to
+    )
+    where = f"WHERE 1=1{filters_sql}"
+
+    # Keyset-пагинация: продолжаем строго после последней отданной строки
+    if after is not None:
+        where += " AND (d.time_found, d.id) > (?, ?)" if order == "asc" else " AND (d.time_found, d.id) < (?, ?)"
+        filter_params = filter_params + list(after)
+
+    direction = "ASC" if order == "asc" else "DESC"
+    # В архиве только завершённые дефекты
+    if include_archived and (not status or status == COMPLETED_STATUS):
+        query = (
+            f"{DEFECT_SELECT} {where} UNION ALL {ARCHIVE_SELECT} {where} "
+            f"ORDER BY time_found {direction}, id {direction}"
+        )
+        params = filter_params * 2
+    else:
+        query = f"{DEFECT_SELECT} {where} ORDER BY d.time_found {direction}, d.id {direction}"
+        params = list(filter_params)
+
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    return query, params
+
+def _row_to_defect(row: sqlite3.Row) -> Dict[str, Any]:
+    """Преобразование строки запроса DEFECT_SELECT в словарь для API."""
+    return {
+        "id": row['id'],
+        "equipment": row['equipment'],
+        "description": row['description'],
+        "section": row['section'],
+        "time_found": row['time_found'],
+        "danger_level": row['danger_level'],
+        "status": row['status'],
+        "assigned_to": row['assigned_to'],
+        "responsible": row['responsible'],
+        "time_started": row['time_started'],
+        "time_completed": row['time_completed'],
+        "resolution_seconds": row['resolution_seconds'],
+        "photo_url": row['photo_url'],
+        "photo_thumb_url": row['photo_thumb_url'],
+        "row_version": row['row_version'],
+        "version": row['version']
+    }
+
+def _fetch_defect_rows(
+    filters: Tuple[Any, ...],
+    after: Optional[Tuple[Any, int]],
+    order: str,
+    limit: int,
+    include_archived: bool
+) -> List[sqlite3.Row]:
+    """Одна страница строк списка дефектов; соединение возвращается в пул сразу после чтения."""
+    query, params = _build_defects_query(*filters, after, order, limit, include_archived)
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute(query, params)
+        return c.fetchall()
+
+def iter_defect_rows(
+    section: Optional[str] = None,
+    status: Optional[str] = None,
+    danger_level: Optional[str] = None,
+    assigned_to: Optional[str] = None,
+    time_found_from: Optional[int] = None,
+    time_found_to: Optional[int] = None,
+    after: Optional[Tuple[Any, int]] = None,
+    order: str = "asc",
+    limit: Optional[int] = None,
+    include_archived: bool = False
+) -> Iterator[sqlite3.Row]:
+    """
+    Чтение строк списка дефектов (столбцы DEFECT_FIELDS) с фильтрацией,
+    сортировкой по (time_found, id) и keyset-пагинацией. Строки читаются
+    страницами по FETCH_BATCH_SIZE, каждая — своим коротким запросом:
+    пока клиент скачивает ответ, соединение не занято и снимок чтения
+    не держит контрольную точку WAL, а расход памяти не зависит от
+    размера таблицы. Первая страница читается сразу при вызове, поэтому
+    ошибка БД (в том числе PoolTimeout) возникает до начала ответа.
+    Архивные дефекты читаются только с include_archived.
+    """
+    filters = (section, status, danger_level, assigned_to, time_found_from, time_found_to)
+    page_size = FETCH_BATCH_SIZE if limit is None else min(limit, FETCH_BATCH_SIZE)
+    rows = _fetch_defect_rows(filters, after, order, page_size, include_archived)
+    return _iter_defect_pages(rows, page_size, filters, order, limit, include_archived)
+
+def _iter_defect_pages(
+    rows: List[sqlite3.Row],
+    page_size: int,
+    filters: Tuple[Any, ...],
+    order: str,
+    limit: Optional[int],
+    include_archived: bool
+) -> Iterator[sqlite3.Row]:
+    """Строки первой страницы, затем следующих — после ключа последней отданной строки."""
+    remaining = limit
+    while True:
+        yield from rows
+        if remaining is not None:
+            remaining -= len(rows)
+        if len(rows) < page_size or remaining == 0:
+            return
+        page_size = FETCH_BATCH_SIZE if remaining is None else min(remaining, FETCH_BATCH_SIZE)
+        last = rows[-1]
+        rows = _fetch_defect_rows(filters, (last['time_found'], last['id']), order, page_size, include_archived)
+
+def iter_defects(
+    section: Optional[str] = None,
+    status: Optional[str] = None,
+    danger_level: Optional[str] = None,
+    assigned_to: Optional[str] = None,
+    time_found_from: Optional[int] = None,
+    time_found_to: Optional[int] = None,
+    after: Optional[Tuple[Any, int]] = None,
+    order: str = "asc",
+    limit: Optional[int] = None,
+    include_archived: bool = False
+) -> Iterator[Dict[str, Any]]:
+    """Потоковое чтение дефектов в виде словарей для API (см. iter_defect_rows)."""
+    rows = iter_defect_rows(
+        section, status, danger_level, assigned_to, time_found_from, time_found_to, after, order, limit,
+        include_archived
+    )
+    return (_row_to_defect(row) for row in rows)
+
+def get_all_defects(
+    section: Optional[str] = None,
+    status: Optional[str] = None,
+    danger_level: Optional[str] = None,
+    assigned_to: Optional[str] = None,
+    time_found_from: Optional[int] = None,
+    time_found_to: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Получение списка всех дефектов с фильтрацией."""
+    return list(iter_defects(section, status, danger_level, assigned_to, time_found_from, time_found_to))
+
+def build_search_query(text: str) -> Optional[str]:
+    """
+    Запрос FTS5 из введённого текста: каждое слово ищется по началу
+    (все слова должны встретиться). None, если слов нет.
+    «ё» приводится к «е», как и в индексе.
+    """
+    text = text.replace("ё", "е").replace("Ё", "Е")
+    tokens = _SEARCH_TOKEN_RE.findall(text)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+def _render_snippet(snippet: Optional[str]) -> Optional[str]:
+    """Сниппет в виде безопасного HTML с найденными словами в <mark>."""
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+def search_defects(
+    text: str,
+    section: Optional[str] = None,
+    status: Optional[str] = None,
+    danger_level: Optional[str] = None,
+    assigned_to: Optional[str] = None,
+    time_found_from: Optional[int] = None,
+    time_found_to: Optional[int] = None,
+    limit: int = 50,
+    offset: int = 0,
+    include_archived: bool = False
+) -> Dict[str, Any]:
+    """
+    Полнотекстовый поиск по описанию и оборудованию с теми же фильтрами,
+    что и у списка. Результаты упорядочены по релевантности (bm25; совпадение
+    в оборудовании весит больше), у каждого — сниппет описания с подсветкой.
+    Архивные дефекты находятся только с include_archived.
+    """
+    match = build_search_query(text)
+    if match is None:
+        return {"items": [], "next_offset": None}
+
+    filters_sql, filter_params = _defect_filters_sql(
+        section, status, danger_level, assigned_to, time_found_from, time_found_to
+    )
+
+    def branch(table: str) -> str:
+        return f'''
+            SELECT {DEFECT_COLUMNS},
+                   snippet(defects_fts, 0, '{_MARK_START}', '{_MARK_END}', '…', 16) AS snippet,
+                   bm25(defects_fts, 1.0, 2.0) AS rank
+            FROM defects_fts
+            JOIN {table} d ON d.id = defects_fts.rowid
+            {DEFECT_JOINS}
+            WHERE defects_fts MATCH ?{filters_sql}
+        '''
+
+    if include_archived and (not status or status == COMPLETED_STATUS):
+        # Каждая часть соединяется со своей таблицей по rowid
+        query = f"{branch('defects')} UNION ALL {branch('defects_archive')} ORDER BY rank, id DESC"
+        params = ([match] + filter_params) * 2
+    else:
+        query = f"{branch('defects')} ORDER BY rank, d.id DESC"
+        params = [match] + filter_params
+    # Запрашиваем на одну строку больше, чтобы узнать, есть ли следующая страница
+    query += " LIMIT ? OFFSET ?"
+    params += [limit + 1, offset]
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute(query, params)
+        rows = c.fetchall()
+
+    items = []
+    for row in rows[:limit]:
+        item = _row_to_defect(row)
+        item["snippet"] = _render_snippet(row["snippet"])
+        items.append(item)
+    return {
+        "items": items,
+        "next_offset": offset + limit if len(rows) > limit else None
+    }
+
+def get_defect_item(defect_id: int) -> Optional[Dict[str, Any]]:
+    """Получение дефекта по ID в том же виде, что и в списке дефектов."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"{DEFECT_SELECT} WHERE d.id = ?", (defect_id,))
+        row = c.fetchone()
+    return _row_to_defect(row) if row else None
+
+def get_defects_version() -> int:
+    """Текущая версия данных defects (растёт при каждой вставке и изменении)."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT value FROM app_state WHERE key = 'defects_version'")
+        row = c.fetchone()
+    return row['value'] if row else 0
+
+def get_defect_changes(since: int, limit: int) -> Dict[str, Any]:
+    """
+    Дефекты, добавленные или изменённые после версии since, по возрастанию версии.
+    version в ответе — версия, с которой нужно запрашивать следующие изменения.
+    """
+    current_version = get_defects_version()
+    with db_connection() as conn:
+        c = conn.cursor()
+        # Строки с версией не больше current_version уже зафиксированы,
+        # поэтому между запросами ничего не теряется
+        c.execute(f'''
+            {DEFECT_SELECT}
+            WHERE d.row_version > ? AND d.row_version <= ?
+            ORDER BY d.row_version
+            LIMIT ?
+        ''', (since, current_version, limit))
+        rows = c.fetchall()
+
+    items = [_row_to_defect(row) for row in rows]
+    has_more = len(items) == limit
+    return {
+        "version": items[-1]["row_version"] if has_more else max(since, current_version),
+        "has_more": has_more,
+        "items": items
+    }
+
+# Разрезы статистики и справочники, из которых берутся имена групп
+STATS_GROUPS = {"section": "sections", "equipment": "equipment", "executor": "people", "week": None}
+
+def _histogram_percentile(buckets: Dict[int, sqlite3.Row], total: int, fraction: float) -> Optional[float]:
+    """
+    Перцентиль по гистограмме с фиксированными корзинами (строки
+    defect_resolution_stats по номеру корзины). Интерполяция линейная, но
+    не между границами корзины, а в пределах, где могут лежать её значения:
+    внутри наблюдавшегося диапазона min_seconds..max_seconds с учётом суммы.
+    Единственное значение корзины получается точно.
+    """
+    if total <= 0:
+        return None
+    rank = fraction * total
+    seen = 0
+    for bucket in sorted(buckets):
+        row = buckets[bucket]
+        count, seconds = row['resolved_count'], row['resolved_seconds']
+        if count > 0 and seen + count >= rank:
+            lower = RESOLUTION_BUCKET_BOUNDS[bucket - 1] if bucket > 0 else 0
+            # Последняя корзина сверху не ограничена
+            upper = RESOLUTION_BUCKET_BOUNDS[bucket] if bucket < len(RESOLUTION_BUCKET_BOUNDS) else None
+            if row['min_seconds'] is not None:
+                lower = max(lower, row['min_seconds'])
+            if row['max_seconds'] is not None:
+                upper = row['max_seconds'] if upper is None else min(upper, row['max_seconds'])
+            # Наибольшее значение — если остальные у нижней границы, наименьшее — если у верхней
+            highest = seconds - (count - 1) * lower
+            lowest = lower
+            if upper is not None:
+                highest = min(highest, upper)
+                lowest = max(lowest, seconds - (count - 1) * upper)
+            highest = max(highest, lowest)
+            return lowest + (highest - lowest) * (rank - seen) / count
+        seen += count
+    return None
+
+def _new_stats_group() -> Dict[str, Any]:
+    return {
+        "total": 0, "open": 0, "by_status": {}, "by_danger_level": {},
+        "resolved": 0, "mttr_seconds": None, "p90_seconds": None,
+        "_seconds": 0, "_buckets": {}
+    }
+
+def _finish_stats_group(group: Dict[str, Any]) -> Dict[str, Any]:
+    resolved_seconds = group.pop("_seconds")
+    buckets = group.pop("_buckets")
+    if group["resolved"] > 0:
+        group["mttr_seconds"] = resolved_seconds / group["resolved"]
+        group["p90_seconds"] = _histogram_percentile(buckets, group["resolved"], 0.9)
+    return group
+
+def get_defect_stats(group_by: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Статистика дефектов из сводных таблиц (их поддерживают триггеры на defects):
+    количество по статусам и уровням опасности, открытые дефекты, MTTR и p90
+    времени устранения — в целом и по участкам, оборудованию, исполнителям и
+    неделям обнаружения (либо только по разрезу group_by).
+    """
+    if group_by is not None and group_by not in STATS_GROUPS:
+        raise ValueError(f"Неизвестный разрез статистики: {group_by}")
+    dimensions = ["all"] + ([group_by] if group_by else list(STATS_GROUPS))
+    placeholders = ",".join("?" * len(dimensions))
+
+    with db_connection() as conn:
+        c = conn.cursor()
+        # Все запросы читают один снимок БД
+        c.execute("BEGIN")
+        try:
+            c.execute(f'''
+                SELECT dimension, key, status, danger_level, defect_count FROM defect_stats
+                WHERE dimension IN ({placeholders}) AND defect_count != 0
+            ''', dimensions)
+            count_rows = c.fetchall()
+            c.execute(f'''
+                SELECT dimension, key, bucket, resolved_count, resolved_seconds, min_seconds, max_seconds
+                FROM defect_resolution_stats
+                WHERE dimension IN ({placeholders}) AND resolved_count != 0
+            ''', dimensions)
+            resolution_rows = c.fetchall()
+            names: Dict[str, Dict[int, str]] = {}
+            for dimension in dimensions:
+                table = STATS_GROUPS.get(dimension)
+                if table:
+                    c.execute(f"SELECT id, name FROM {table}")
+                    names[dimension] = {row['id']: row['name'] for row in c.fetchall()}
+        finally:
+            conn.rollback()
+
+    groups: Dict[str, Dict[int, Dict[str, Any]]] = {dimension: {} for dimension in dimensions}
+    for row in count_rows:
+        group = groups[row['dimension']].setdefault(row['key'], _new_stats_group())
+        count = row['defect_count']
+        group["total"] += count
+        if row['status'] != COMPLETED_STATUS:
+            group["open"] += count
+        group["by_status"][row['status']] = group["by_status"].get(row['status'], 0) + count
+        group["by_danger_level"][row['danger_level']] = group["by_danger_level"].get(row['danger_level'], 0) + count
+    for row in resolution_rows:
+        group = groups[row['dimension']].setdefault(row['key'], _new_stats_group())
+        group["resolved"] += row['resolved_count']
+        group["_seconds"] += row['resolved_seconds']
+        group["_buckets"][row['bucket']] = row
+
+    result: Dict[str, Any] = {
+        "total": _finish_stats_group(groups["all"].get(0, _new_stats_group())),
+        "groups": {}
+    }
+    for dimension in dimensions[1:]:
+        items = []
+        for key, group in groups[dimension].items():
+            group = _finish_stats_group(group)
+            if dimension == "week":
+                items.append({"week_start": key, **group})
+            else:
+                # Ключ 0 — дефекты без участка (оборудования, исполнителя)
+                items.append({"id": key or None, "name": names[dimension].get(key), **group})
+        if dimension == "week":
+            items.sort(key=lambda item: item["week_start"])
+        else:
+            items.sort(key=lambda item: (-item["total"], item["name"] or ""))
+        result["groups"][dimension] = items
+    return result
+
+def find_unindexed_filter_plans() -> List[str]:
+    """
+    Проверка EXPLAIN QUERY PLAN для всех поддерживаемых комбинаций фильтров.
+    Возвращает описания запросов, которые читают defects полным сканированием
+    (без фильтров допускается только обход индекса в порядке сортировки).
+    """
+    filter_names = ["section", "status", "danger_level", "assigned_to", "time_found_from", "time_found_to"]
+    problems = []
+    with db_connection() as conn:
+        c = conn.cursor()
+        for mask in range(1 << len(filter_names)):
+            filters = {name: 0 if name.startswith("time_found") else "x" for i, name in enumerate(filter_names) if mask & (1 << i)}
+            for order in ("asc", "desc"):
+                query, params = _build_defects_query(order=order, **filters)
+                c.execute("EXPLAIN QUERY PLAN " + query, params)
+                for row in c.fetchall():
+                    detail = row[-1]
+                    if not detail.startswith("SCAN d ") and detail != "SCAN d":
+                        continue
+                    if filters or "USING" not in detail:
+                        problems.append(f"{sorted(filters)} order={order}: {detail}")
+    return problems
+
+# Поля дефекта, которые попадают в текст уведомления
+NOTIFICATION_FIELDS = ("id", "equipment", "section", "description", "danger_level", "responsible", "assigned_to", "photo_url")
+# Уведомления одному получателю из пакетного изменения собираются в сводку
+# (одно сообщение); в сводке не больше DIGEST_MAX_ITEMS дефектов — предел
+# длины сообщения Telegram
+DIGEST_ROLE = "digest"
+DIGEST_MAX_ITEMS = 20
+
+def _reference_id(c: sqlite3.Cursor, table: str, name: Optional[str]) -> Optional[int]:
+    """
+    id записи справочника по имени. Неизвестное имя добавляется скрытой
+    записью (не попадает в списки выбора), пустое значение — NULL.
+    Вставка выполняется первой, чтобы транзакция сразу стала пишущей:
+    при проверке SELECT-ом одновременные запросы с одним новым именем
+    падали на UNIQUE.
+    """
+    if name is None or not str(name).strip():
+        return None
+    name = str(name).strip()
+    c.execute(f"INSERT INTO {table} (name) VALUES (?) ON CONFLICT (name) DO NOTHING", (name,))
+    c.execute(f"SELECT id FROM {table} WHERE name = ?", (name,))
+    return c.fetchone()[0]
+
+class VersionConflict(Exception):
+    """Дефект изменён после того, как клиент его прочитал (устаревший If-Match)."""
+
+    def __init__(self, defect_id: int, current_version: int):
+        super().__init__(f"Дефект {defect_id} изменён: текущая версия {current_version}")
+        self.defect_id = defect_id
+        self.current_version = current_version
+
+def _assignment_notifications(
+    before: sqlite3.Row,
+    after: sqlite3.Row,
+    names: Dict[str, Optional[str]]
+) -> List[Dict[str, str]]:
+    """
+    Кому сообщить об изменении дефекта: новому исполнителю и новому
+    ответственному (если это не тот же человек, что и новый исполнитель).
+    before и after — назначения (id) до и после изменения, names — имена
+    из изменения, как их ввёл пользователь.
+    """
+    notifications = []
+    if names.get('assigned_to') and after['assigned_to_id'] != before['assigned_to_id']:
+        notifications.append({"recipient": names['assigned_to'], "role": "executor"})
+    if (names.get('responsible') and after['responsible_id'] != before['responsible_id']
+            and after['responsible_id'] != after['assigned_to_id']):
+        notifications.append({"recipient": names['responsible'], "role": "responsible"})
+    return notifications
+
+def _notification_payloads(c: sqlite3.Cursor, defect_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Состояние дефектов для текста уведомлений ({id: поля NOTIFICATION_FIELDS})."""
+    placeholders = ",".join("?" * len(defect_ids))
+    c.execute(f"{DEFECT_SELECT} WHERE d.id IN ({placeholders})", defect_ids)
+    return {row['id']: {key: row[key] for key in NOTIFICATION_FIELDS} for row in c.fetchall()}
+
+def _insert_outbox(c: sqlite3.Cursor, entries: List[Tuple[str, str, Dict[str, Any]]]) -> None:
+    """Запись уведомлений (получатель, роль, payload) в outbox."""
+    now = int(time.time())
+    c.executemany('''
+        INSERT INTO outbox (recipient, role, payload, next_attempt_at, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(recipient, role, json.dumps(payload, ensure_ascii=False), now, now) for recipient, role, payload in entries])
+
+def _enqueue_notifications(c: sqlite3.Cursor, defect_id: int, notifications: List[Dict[str, str]]) -> None:
+    """
+    Запись уведомлений о дефекте в outbox в текущей транзакции.
+    notifications — список {"recipient": имя, "role": "responsible" | "executor"};
+    в payload попадает состояние дефекта после изменения.
+    """
+    payload = _notification_payloads(c, [defect_id]).get(defect_id)
+    if payload is None:
+        return
+    _insert_outbox(c, [(n['recipient'], n['role'], payload) for n in notifications])
+
+def _enqueue_digests(c: sqlite3.Cursor, by_recipient: Dict[str, Dict[int, str]]) -> None:
+    """
+    Уведомления пакетного изменения: by_recipient — {получатель: {id дефекта: роль}}.
+    Получатель одного дефекта получает обычное уведомление, нескольких —
+    сводку с payload {"items": [{"role": роль, "defect": поля дефекта}, ...]}.
+    """
+    defect_ids = sorted({defect_id for roles in by_recipient.values() for defect_id in roles})
+    if not defect_ids:
+        return
+    payloads: Dict[int, Dict[str, Any]] = {}
+    for start in range(0, len(defect_ids), 500):
+        payloads.update(_notification_payloads(c, defect_ids[start:start + 500]))
+
+    entries = []
+    for recipient, roles in by_recipient.items():
+        items = [{"role": role, "defect": payloads[defect_id]} for defect_id, role in roles.items() if defect_id in payloads]
+        if len(items) == 1:
+            entries.append((recipient, items[0]["role"], items[0]["defect"]))
+            continue
+        for start in range(0, len(items), DIGEST_MAX_ITEMS):
+            entries.append((recipient, DIGEST_ROLE, {"items": items[start:start + DIGEST_MAX_ITEMS]}))
+    _insert_outbox(c, entries)
+
+def create_defect_in_tx(
+    c: sqlite3.Cursor,
+    defect_data: Dict[str, Any],
+    notifications: Optional[List[Dict[str, str]]] = None
+) -> int:
+    """Добавление дефекта (и уведомлений о нём) в уже открытой транзакции."""
     c.execute('''
-        INSERT INTO defects (equipment, description, section, time_found, danger_level, responsible, photo_url)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
+        INSERT INTO defects (equipment_id, description, section_id, time_found, danger_level,
+                             responsible_id, photo_url, photo_thumb_url)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
     ''', (
-        defect_data['equipment'],
+        _reference_id(c, "equipment", defect_data['equipment']),
         defect_data['description'],
-        defect_data['section'],
+        _reference_id(c, "sections", defect_data['section']),
         defect_data['time_found'],
         defect_data['danger_level'],
-        defect_data['responsible'],
-        defect_data['photo_url']
+        _reference_id(c, "people", defect_data['responsible']),
+        defect_data['photo_url'],
+        defect_data.get('photo_thumb_url')
     ))
-    
     defect_id = c.lastrowid
-    conn.commit()
-    conn.close()
-    
+    if notifications and defect_id is not None:
+        _enqueue_notifications(c, defect_id, notifications)
+
     # Явная проверка и приведение типа для удовлетворения Pyright
     if defect_id is None:
         raise RuntimeError("Failed to get the ID of the newly created defect.")
     return int(defect_id)
 
-def update_defect(defect_id: int, update_data: Dict[str, Any]) -> bool:
-    """Обновление дефекта."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    # Формируем запрос на обновление
-    query_parts = []
-    params = []
-    
+def create_defect(defect_data: Dict[str, Any], notifications: Optional[List[Dict[str, str]]] = None) -> int:
+    """Создание нового дефекта (и уведомлений о нём в той же транзакции)."""
+    with db_connection() as conn:
+        defect_id = create_defect_in_tx(conn.cursor(), defect_data, notifications)
+        conn.commit()
+    return defect_id
+
+def insert_import_references_in_tx(c: sqlite3.Cursor, references: Dict[str, Set[str]]) -> Dict[str, Dict[str, int]]:
+    """
+    Справочники для импорта в уже открытой транзакции: references — имена
+    ({таблица: имена}), недостающие добавляются скрытыми записями.
+    Возвращает {таблица: {имя: id}} для insert_defects_bulk_in_tx.
+    """
+    ids: Dict[str, Dict[str, int]] = {}
+    for table, names in references.items():
+        c.executemany(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", ((name,) for name in names))
+        ids[table] = {}
+        for name in names:
+            c.execute(f"SELECT id FROM {table} WHERE name = ?", (name,))
+            ids[table][name] = c.fetchone()[0]
+    return ids
+
+def insert_defects_bulk_in_tx(c: sqlite3.Cursor, ids: Dict[str, Dict[str, int]], rows: Iterable[Dict[str, Any]]) -> int:
+    """
+    Массовое добавление проверенных строк импорта в уже открытой транзакции
+    (ids — из insert_import_references_in_tx). rows может быть генератором:
+    строки передаются в executemany без накопления в памяти.
+    Уведомления при импорте не создаются. Возвращает число добавленных строк.
+    """
+    def reference(table: str, name: Optional[str]) -> Optional[int]:
+        return ids[table][name] if name else None
+
+    c.executemany('''
+        INSERT INTO defects (equipment_id, description, section_id, time_found, danger_level,
+                             status, assigned_to_id, responsible_id, time_started, time_completed)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', ((
+        reference("equipment", row['equipment']),
+        row['description'],
+        reference("sections", row['section']),
+        row['time_found'],
+        row['danger_level'],
+        row['status'],
+        reference("people", row['assigned_to']),
+        reference("people", row['responsible']),
+        row['time_started'],
+        row['time_completed']
+    ) for row in rows))
+    return c.rowcount
+
+def insert_defects_bulk(references: Dict[str, Set[str]], rows: Iterable[Dict[str, Any]]) -> int:
+    """
+    Массовое добавление дефектов одной транзакцией: либо все строки, либо
+    ни одной (для скриптов; API импортирует частями через поток-писатель).
+    """
+    with db_connection() as conn:
+        c = conn.cursor()
+        ids = insert_import_references_in_tx(c, references)
+        inserted = insert_defects_bulk_in_tx(c, ids, rows)
+        conn.commit()
+    return inserted
+
+# Поля, которые можно изменить через update_defect, и их столбцы в defects
+DEFECT_UPDATE_COLUMNS = {
+    'status': 'status',
+    'assigned_to': 'assigned_to_id',
+    'responsible': 'responsible_id',
+    'time_started': 'time_started',
+    'time_completed': 'time_completed',
+}
+
+def update_defect_in_tx(
+    c: sqlite3.Cursor,
+    defect_id: int,
+    update_data: Dict[str, Any],
+    expected_version: Optional[int] = None,
+    notify: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    Обновление дефекта в уже открытой транзакции (в потоке-писателе —
+    под BEGIN IMMEDIATE): назначения до изменения читаются в той же
+    транзакции, UPDATE ... RETURNING увеличивает version и возвращает
+    назначения после него. С expected_version изменение применяется, только
+    если дефект с тех пор не менялся, иначе VersionConflict. Возвращает
+    {"version": новая версия, "notifications": кому сообщить} или None,
+    если дефекта нет или менять нечего. С notify уведомления сразу
+    записываются в outbox.
+    """
+    if not any(key in DEFECT_UPDATE_COLUMNS for key in update_data):
+        return None
+    c.execute("SELECT version, assigned_to_id, responsible_id FROM defects WHERE id = ?", (defect_id,))
+    before = c.fetchone()
+    if before is None:
+        return None
+    if expected_version is not None and before['version'] != expected_version:
+        raise VersionConflict(defect_id, before['version'])
+
+    # Имена людей переводятся в id справочника
+    assignments = ["version = version + 1"]
+    params: List[Any] = []
+    names: Dict[str, Optional[str]] = {}
     for key, value in update_data.items():
-        if key in ['status', 'assigned_to', 'responsible', 'time_started', 'time_completed']:
-            query_parts.append(f"{key} = ?")
-            params.append(value)
-    
-    if query_parts:
-        query = f"UPDATE defects SET {', '.join(query_parts)} WHERE id = ?"
-        params.append(defect_id)
-        c.execute(query, params)
+        if key not in DEFECT_UPDATE_COLUMNS:
+            continue
+        if key in ('assigned_to', 'responsible'):
+            names[key] = str(value).strip() if value is not None else None
+            value = _reference_id(c, "people", value)
+        assignments.append(f"{DEFECT_UPDATE_COLUMNS[key]} = ?")
+        params.append(value)
+
+    # Условие по прочитанной версии защищает и вне BEGIN IMMEDIATE
+    # (update_defect): если дефект изменили между SELECT и UPDATE,
+    # это VersionConflict, а не перезапись чужого изменения
+    c.execute(f'''
+        UPDATE defects SET {', '.join(assignments)} WHERE id = ? AND version = ?
+        RETURNING version, assigned_to_id, responsible_id
+    ''', params + [defect_id, before['version']])
+    rows = c.fetchall()
+    if not rows:
+        c.execute("SELECT version FROM defects WHERE id = ?", (defect_id,))
+        current = c.fetchone()
+        if current is None:
+            return None
+        raise VersionConflict(defect_id, current[0])
+
+    notifications = _assignment_notifications(before, rows[0], names)
+    if notify and notifications:
+        _enqueue_notifications(c, defect_id, notifications)
+    return {"version": rows[0]['version'], "notifications": notifications}
+
+def update_defect_item_in_tx(
+    c: sqlite3.Cursor,
+    defect_id: int,
+    update_data: Dict[str, Any],
+    expected_version: Optional[int] = None,
+    notify: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    update_defect_in_tx и дефект после изменения в том же виде, что и в
+    списке (для ответа и события SSE), в одной операции записи.
+    """
+    if update_defect_in_tx(c, defect_id, update_data, expected_version, notify) is None:
+        return None
+    c.execute(f"{DEFECT_SELECT} WHERE d.id = ?", (defect_id,))
+    return _row_to_defect(c.fetchone())
+
+def update_defect(
+    defect_id: int,
+    update_data: Dict[str, Any],
+    expected_version: Optional[int] = None,
+    notify: bool = False
+) -> Optional[Dict[str, Any]]:
+    """Обновление дефекта (и запись уведомлений в той же транзакции)."""
+    if not any(key in DEFECT_UPDATE_COLUMNS for key in update_data):
+        return None
+
+    with db_connection() as conn:
+        updated = update_defect_in_tx(conn.cursor(), defect_id, update_data, expected_version, notify)
         conn.commit()
-        updated_rows = c.rowcount
-        conn.close()
-        return updated_rows > 0
-    
-    conn.close()
-    return False
+        return updated
+
+def update_defects_batch_in_tx(
+    c: sqlite3.Cursor,
+    changes: List[Tuple[int, Dict[str, Any], Optional[int]]],
+    notify: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Пакетное обновление дефектов в уже открытой транзакции: changes —
+    список (id дефекта, изменения, ожидаемая версия или None) как для
+    update_defect_in_tx. Каждое изменение выполняется под своей точкой
+    сохранения, ошибка одного не отменяет остальные. Возвращает результат
+    по каждому элементу в том же порядке: {"id", "result": "updated" |
+    "conflict" | "not_found" | "error"[, "version"][, "detail"]}.
+    С notify уведомления собираются по получателям (см. _enqueue_digests).
+    """
+    results: List[Dict[str, Any]] = []
+    by_recipient: Dict[str, Dict[int, str]] = {}
+    for defect_id, update_data, expected_version in changes:
+        c.execute("SAVEPOINT batch_item")
+        try:
+            updated = update_defect_in_tx(c, defect_id, update_data, expected_version)
+        except VersionConflict as e:
+            # Откат добавленных в справочник имён
+            c.execute("ROLLBACK TO batch_item")
+            c.execute("RELEASE batch_item")
+            results.append({"id": defect_id, "result": "conflict", "version": e.current_version})
+            continue
+        except sqlite3.Error as e:
+            c.execute("ROLLBACK TO batch_item")
+            c.execute("RELEASE batch_item")
+            results.append({"id": defect_id, "result": "error", "detail": str(e)})
+            continue
+        c.execute("RELEASE batch_item")
+        if updated is None:
+            results.append({"id": defect_id, "result": "not_found"})
+            continue
+        results.append({"id": defect_id, "result": "updated", "version": updated['version']})
+        if notify:
+            for notification in updated['notifications']:
+                by_recipient.setdefault(notification['recipient'], {})[defect_id] = notification['role']
+    _enqueue_digests(c, by_recipient)
+    return results
+
+def get_defect_items(defect_ids: List[int]) -> List[Dict[str, Any]]:
+    """Дефекты по списку ID в том же виде, что и в списке дефектов (одним запросом)."""
+    if not defect_ids:
+        return []
+    placeholders = ",".join("?" * len(defect_ids))
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"{DEFECT_SELECT} WHERE d.id IN ({placeholders}) ORDER BY d.row_version", defect_ids)
+        return [_row_to_defect(row) for row in c.fetchall()]
+
+def archive_completed_defects_in_tx(c: sqlite3.Cursor, completed_before: int, limit: int) -> int:
+    """
+    Перенос в defects_archive не больше limit дефектов, завершённых раньше
+    completed_before. Статистика и поиск их сохраняют (триггеры архива).
+    Версия данных увеличивается, чтобы ETag списка изменился.
+    Возвращает число перенесённых дефектов.
+    """
+    # Сначала удаление: триггер defects убирает строку из индекса поиска,
+    # триггер архива добавляет её обратно с тем же rowid
+    c.execute(f'''
+        DELETE FROM defects
+        WHERE id IN (
+            SELECT id FROM defects
+            WHERE status = ? AND time_completed < ?
+            ORDER BY time_completed, id
+            LIMIT ?
+        )
+        RETURNING {ARCHIVE_COLUMNS}
+    ''', (COMPLETED_STATUS, completed_before, limit))
+    archived_at = int(time.time())
+    rows = [tuple(row) + (archived_at,) for row in c.fetchall()]
+    if not rows:
+        return 0
+    placeholders = ", ".join("?" * len(rows[0]))
+    c.executemany(f"INSERT INTO defects_archive ({ARCHIVE_COLUMNS}, archived_at) VALUES ({placeholders})", rows)
+    c.execute("UPDATE app_state SET value = value + 1 WHERE key = 'defects_version'")
+    return len(rows)
+
+class _DropdownListsCache:
+    """
+    Разобранные списки выбора в памяти процесса вместе с их версией.
+    Актуальность проверяется по версии в app_state (одно чтение по ключу),
+    поэтому изменение списков в любом процессе сразу видно во всех остальных.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version: Optional[int] = None
+        self.lists: Dict[str, List[str]] = {}
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.version = None
+
+_dropdown_lists_cache = _DropdownListsCache()
+
+def _parse_dropdown_items(items: Optional[str]) -> List[str]:
+    if not items:
+        return []
+    # Порядок сохраняется, повторы убираются
+    return list(dict.fromkeys(item.strip() for item in items.split('\n') if item.strip()))
+
+def get_dropdown_lists_versioned() -> Tuple[int, Dict[str, List[str]]]:
+    """Версия и содержимое списков выбора (из кэша, если версия не изменилась)."""
+    cache = _dropdown_lists_cache
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT value FROM app_state WHERE key = 'dropdown_lists_version'")
+        version = c.fetchone()['value']
+        with cache.lock:
+            if cache.version == version:
+                return version, cache.lists
+
+        # Списки и версия читаются одним запросом — из одного снимка БД
+        selects = " UNION ALL ".join(
+            f"SELECT '{list_name}' AS list_name, name, {position} AS position FROM {table} WHERE {flag} = 1"
+            for list_name, (table, flag, position) in REFERENCE_LISTS.items()
+        )
+        c.execute(f'''
+            SELECT list_name, name,
+                   (SELECT value FROM app_state WHERE key = 'dropdown_lists_version') AS version
+            FROM ({selects})
+            ORDER BY list_name, position
+        ''')
+        rows = c.fetchall()
+
+    lists: Dict[str, List[str]] = {list_name: [] for list_name in REFERENCE_LISTS}
+    for row in rows:
+        lists[row['list_name']].append(row['name'])
+    if rows:
+        version = rows[0]['version']
+    with cache.lock:
+        cache.version = version
+        cache.lists = lists
+    return version, lists
 
 def get_dropdown_lists() -> Dict[str, List[str]]:
     """Получение всех списков выбора."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    c.execute("SELECT list_name, items FROM dropdown_lists")
-    rows = c.fetchall()
-    conn.close()
-    
-    result = {}
-    for row in rows:
-        items = []
-        if row['items']:
-            items_list = [item.strip() for item in row['items'].split('\n') if item.strip()]
-            items = items_list
-        result[row['list_name']] = items
-    
-    return result
+    return get_dropdown_lists_versioned()[1]
 
 def update_dropdown_lists(lists: Dict[str, str]) -> None:
-    """Обновление списков выбора."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    for list_name, items in lists.items():
-        c.execute('''
-            INSERT OR REPLACE INTO dropdown_lists (list_name, items)
-            VALUES (?, ?)
-        ''', (list_name, items))
-    
-    conn.commit()
-    conn.close()
+    """
+    Обновление списков выбора (значения — элементы через перевод строки).
+    Меняются только отличающиеся записи справочников: новые имена добавляются,
+    убранные из списка скрываются, но остаются в истории дефектов.
+    Неизвестное имя списка — ValueError.
+    """
+    unknown = set(lists) - set(REFERENCE_LISTS)
+    if unknown:
+        raise ValueError(f"Неизвестные списки: {', '.join(sorted(unknown))}")
+
+    with db_connection() as conn:
+        c = conn.cursor()
+        for list_name, items in lists.items():
+            table, flag, position = REFERENCE_LISTS[list_name]
+            names = _parse_dropdown_items(items)
+            # Запись меняется, только если её признак или позиция действительно другие
+            c.executemany(f'''
+                INSERT INTO {table} (name, {flag}, {position}) VALUES (?, 1, ?)
+                ON CONFLICT(name) DO UPDATE SET {flag} = 1, {position} = excluded.{position}
+                WHERE {flag} != 1 OR {position} != excluded.{position}
+            ''', [(name, index) for index, name in enumerate(names)])
+            c.execute(f'''
+                UPDATE {table} SET {flag} = 0
+                WHERE {flag} = 1 AND name NOT IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(names, ensure_ascii=False),))
+        conn.commit()
+    _dropdown_lists_cache.invalidate()
+
+def rename_reference_item(list_name: str, old_name: str, new_name: str) -> bool:
+    """
+    Переименование записи справочника. Дефекты ссылаются на неё по id,
+    поэтому история сохраняется и показывается под новым именем.
+    Возвращает False, если записи нет; ValueError — если новое имя уже занято.
+    """
+    if list_name not in REFERENCE_LISTS:
+        raise ValueError(f"Неизвестный список: {list_name}")
+    new_name = new_name.strip()
+    if not new_name:
+        raise ValueError("Пустое имя")
+    table = REFERENCE_LISTS[list_name][0]
+    columns = {
+        "equipment": ("equipment_id",),
+        "sections": ("section_id",),
+        "people": ("assigned_to_id", "responsible_id"),
+    }[table]
+
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute(f"UPDATE {table} SET name = ? WHERE name = ? RETURNING id", (new_name, old_name))
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            raise ValueError(f"Имя «{new_name}» уже есть в справочнике")
+        row = c.fetchone()
+        if row is None:
+            conn.rollback()
+            return False
+        # Новая версия затронутых дефектов — клиенты получат их с новым именем
+        where = " OR ".join(f"{column} = ?" for column in columns)
+        c.execute(f"UPDATE defects SET row_version = row_version WHERE {where}", (row['id'],) * len(columns))
+        if table == "people":
+            # Подписка на уведомления привязана к имени
+            c.execute("UPDATE users SET name = ? WHERE name = ?", (new_name, old_name))
+        conn.commit()
+    _dropdown_lists_cache.invalidate()
+    return True
 
 def subscribe_user(name: str, telegram_id: str) -> bool:
     """Подписка пользователя на уведомления."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    try:
-        c.execute('''
-            INSERT INTO users (name, telegram_id)
-            VALUES (?, ?)
-        ''', (name, telegram_id))
-        conn.commit()
-        conn.close()
-        return True
-    except sqlite3.IntegrityError:
-        conn.rollback()
-        conn.close()
-        return False
-    except Exception as e:
-        conn.rollback()
-        conn.close()
-        raise e
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute('''
+                INSERT INTO users (name, telegram_id)
+                VALUES (?, ?)
+            ''', (name, telegram_id))
+            conn.commit()
+            return True
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return False
 
 def get_user_by_name(name: str) -> Optional[Dict[str, str]]:
     """Получение пользователя по имени."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    c.execute("SELECT * FROM users WHERE name = ?", (name,))
-    row = c.fetchone()
-    conn.close()
-    
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT * FROM users WHERE name = ?", (name,))
+        row = c.fetchone()
+
     if row:
         return {
             "id": row['id'],
             "name": row['name'],
             "telegram_id": row['telegram_id']
         }
-    
+
     return None
 
 def get_defect_by_id(defect_id: int) -> Optional[Dict[str, Any]]:
     """Получение дефекта по ID."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    
-    c.execute("SELECT * FROM defects WHERE id = ?", (defect_id,))
-    row = c.fetchone()
-    conn.close()
-    
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"{DEFECT_SELECT} WHERE d.id = ?", (defect_id,))
+        row = c.fetchone()
+
     if row:
         return dict(row)
-    
-    return None
\ No newline at end of file
+
+    return None
+
+def fetch_due_notifications(limit: int) -> List[Dict[str, Any]]:
+    """Уведомления из outbox, которые пора отправить (по времени попытки)."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute('''
+            SELECT * FROM outbox
+            WHERE status = 'pending' AND next_attempt_at <= ?
+            ORDER BY next_attempt_at, id
+            LIMIT ?
+        ''', (int(time.time()), limit))
+        rows = c.fetchall()
+    return [dict(row) for row in rows]
+
+def get_next_notification_time() -> Optional[int]:
+    """Время ближайшей запланированной попытки отправки или None, если очередь пуста."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT MIN(next_attempt_at) AS next_at FROM outbox WHERE status = 'pending'")
+        row = c.fetchone()
+    return row['next_at'] if row else None
+
+def complete_notification_in_tx(
+    c: sqlite3.Cursor, notification_id: int, status: str, error: Optional[str] = None
+) -> None:
+    """Завершение обработки уведомления: sent, skipped (нет подписки) или dead."""
+    c.execute('''
+        UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = ?, sent_at = ?
+        WHERE id = ?
+    ''', (status, error, int(time.time()), notification_id))
+
+def retry_notification_in_tx(c: sqlite3.Cursor, notification_id: int, next_attempt_at: int, error: str) -> None:
+    """Перенос уведомления на повторную попытку."""
+    c.execute('''
+        UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+        WHERE id = ?
+    ''', (next_attempt_at, error, notification_id))
+
+def requeue_dead_notifications() -> int:
+    """Возврат недоставленных (dead) уведомлений в очередь. Возвращает их число."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute('''
+            UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ?
+            WHERE status = 'dead'
+        ''', (int(time.time()),))
+        conn.commit()
+        return c.rowcount
+
+def get_outbox_stats() -> Dict[str, Any]:
+    """Глубина очереди уведомлений по статусам и возраст самого старого ожидающего."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT status, COUNT(*) AS count FROM outbox GROUP BY status")
+        counts = {row['status']: row['count'] for row in c.fetchall()}
+        c.execute("SELECT MIN(created_at) AS oldest FROM outbox WHERE status = 'pending'")
+        oldest = c.fetchone()['oldest']
+    return {
+        "pending": counts.get('pending', 0),
+        "sent": counts.get('sent', 0),
+        "skipped": counts.get('skipped', 0),
+        "dead": counts.get('dead', 0),
+        "oldest_pending_age_seconds": int(time.time()) - oldest if oldest else 0
+    }
+
+def get_telegram_file_id(photo_url: str) -> Optional[str]:
+    """file_id фотографии, уже загруженной в Telegram, или None."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT file_id FROM telegram_files WHERE photo_url = ?", (photo_url,))
+        row = c.fetchone()
+    return row['file_id'] if row else None
+
+def save_telegram_file_id_in_tx(c: sqlite3.Cursor, photo_url: str, file_id: Optional[str]) -> None:
+    """Сохранение (или удаление при file_id=None) file_id фотографии."""
+    if file_id is None:
+        c.execute("DELETE FROM telegram_files WHERE photo_url = ?", (photo_url,))
+    else:
+        c.execute('''
+            INSERT OR REPLACE INTO telegram_files (photo_url, file_id, created_at)
+            VALUES (?, ?, ?)
+        ''', (photo_url, file_id, int(time.time())))
+
+def set_photo_thumbnail(photo_url: str, thumb_url: str) -> List[Dict[str, Any]]:
+    """
+    Запись URL миниатюры во все дефекты с этим фото, у которых её ещё нет.
+    Возвращает изменённые дефекты (для рассылки событий).
+    """
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute('''
+            UPDATE defects SET photo_thumb_url = ?
+            WHERE photo_url = ? AND photo_thumb_url IS NULL
+            RETURNING id
+        ''', (thumb_url, photo_url))
+        ids = [row['id'] for row in c.fetchall()]
+        conn.commit()
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        c.execute(f"{DEFECT_SELECT} WHERE d.id IN ({placeholders})", ids)
+        return [_row_to_defect(row) for row in c.fetchall()]
@@ -0,0 +1,226 @@
+# app/db_async.py
+import asyncio
+import contextvars
+import functools
+import logging
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .core.config import DB_READ_THREADS, DB_WRITE_BATCH_SIZE, DB_LOCK_RETRIES
+from .database import pool
+
+logger = logging.getLogger(__name__)
+
+# Операция записи: функция (cursor, *args), аргументы, контекст вызывающего и будущий результат
+_WriteJob = Tuple[Callable[..., Any], tuple, contextvars.Context, Future]
+
+def is_lock_error(error: sqlite3.OperationalError) -> bool:
+    """Ошибка из-за блокировки БД другим соединением ("database is locked" / "busy")."""
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+class DatabaseExecutor:
+    """
+    Доступ к SQLite из асинхронного кода без блокировки event loop.
+
+    Чтение выполняется в отдельном пуле потоков (не в общем пуле
+    обработчиков starlette). Запись идёт через один поток-писатель:
+    операции, накопившиеся в очереди, выполняются в одной транзакции
+    (group commit) — каждая под своим SAVEPOINT, поэтому ошибка одной
+    операции откатывает только её. Результат операции становится
+    доступен после COMMIT всей пачки.
+
+    Функции записи принимают курсор первым аргументом и не делают
+    commit сами (см. *_in_tx в database.py). У потока-писателя своё
+    соединение вне пула: запись не ждёт, пока читатели (в том числе
+    потоковые ответы медленным клиентам) вернут соединения в пул.
+
+    Функции выполняются в контексте вызывающего (contextvars), поэтому
+    время их запросов учитывается в метриках исходного HTTP-запроса.
+
+    Если БД занята записью другого процесса дольше busy_timeout, начало
+    транзакции повторяется до lock_retries раз с растущей паузой.
+    """
+
+    def __init__(
+        self,
+        read_threads: int = DB_READ_THREADS,
+        max_batch: int = DB_WRITE_BATCH_SIZE,
+        lock_retries: int = DB_LOCK_RETRIES
+    ):
+        self.read_threads = read_threads
+        self.max_batch = max_batch
+        self.lock_retries = lock_retries
+        self._readers: Optional[ThreadPoolExecutor] = None
+        self._queue: "queue.Queue[Optional[_WriteJob]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        # Соединение потока-писателя (создаётся и используется только в нём)
+        self._write_conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+        # Статистика групповой записи
+        self._batches = 0
+        self._writes = 0
+        self._failed = 0
+        self._max_batch_seen = 0
+        self._commit_total = 0.0
+        self._lock_retries = 0
+
+    async def read(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Выполнение читающей функции database.py в пуле читателей."""
+        with self._lock:
+            if self._readers is None:
+                self._readers = ThreadPoolExecutor(max_workers=self.read_threads, thread_name_prefix="db-read")
+            readers = self._readers
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(readers, functools.partial(ctx.run, fn, *args))
+
+    async def write(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Выполнение fn(cursor, *args) в потоке-писателе; ожидание COMMIT."""
+        return await asyncio.wrap_future(self.submit_write(fn, *args))
+
+    def submit_write(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Постановка записи в очередь из любого потока."""
+        future: Future = Future()
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="db-writer", daemon=True)
+                self._writer.start()
+            self._queue.put((fn, args, contextvars.copy_context(), future))
+        return future
+
+    def _take_batch(self) -> Tuple[List[_WriteJob], bool]:
+        """Первая операция очереди (с ожиданием) и все уже накопившиеся следом."""
+        job = self._queue.get()
+        if job is None:
+            return [], True
+        batch = [job]
+        while len(batch) < self.max_batch:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                return batch, True
+            batch.append(job)
+        return batch, False
+
+    def _write_loop(self) -> None:
+        try:
+            while True:
+                batch, stop = self._take_batch()
+                if batch:
+                    self._run_batch(batch)
+                if stop:
+                    return
+        finally:
+            if self._write_conn is not None:
+                self._write_conn.close()
+                self._write_conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """Соединение потока-писателя; транзакцией и точками сохранения управляем явно."""
+        if self._write_conn is None:
+            conn = pool.connect()
+            conn.isolation_level = None
+            self._write_conn = conn
+        return self._write_conn
+
+    def _begin_immediate(self, conn: sqlite3.Connection) -> None:
+        """BEGIN IMMEDIATE с повторами, пока БД занята другим процессом."""
+        attempt = 0
+        while True:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                if not is_lock_error(e) or attempt >= self.lock_retries:
+                    raise
+                attempt += 1
+                with self._lock:
+                    self._lock_retries += 1
+                delay = min(1.0, 0.05 * 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning(f"[DB Writer] БД занята другим процессом ({e}), повтор {attempt} через {delay * 1000:.0f} мс")
+                time.sleep(delay)
+
+    def _run_batch(self, batch: List[_WriteJob]) -> None:
+        started = time.perf_counter()
+        results: List[Tuple[Future, Any, Optional[BaseException]]] = []
+        try:
+            conn = self._connection()
+            try:
+                self._begin_immediate(conn)
+                for fn, args, ctx, future in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    conn.execute("SAVEPOINT write_job")
+                    try:
+                        result = ctx.run(fn, conn.cursor(), *args)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO write_job")
+                        conn.execute("RELEASE write_job")
+                        results.append((future, None, e))
+                    else:
+                        conn.execute("RELEASE write_job")
+                        results.append((future, result, None))
+                conn.execute("COMMIT")
+            finally:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+        except Exception as e:
+            # Не удалось начать или зафиксировать транзакцию: не записано ничего
+            logger.error(f"[DB Writer] Транзакция из {len(batch)} операций не выполнена: {e}")
+            for _, _, _, future in batch:
+                if future.running() or future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+            with self._lock:
+                self._failed += len(batch)
+            return
+
+        with self._lock:
+            self._batches += 1
+            self._writes += len(batch)
+            self._failed += sum(1 for _, _, error in results if error is not None)
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+            self._commit_total += time.perf_counter() - started
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика групповой записи (для логов и мониторинга)."""
+        with self._lock:
+            return {
+                "batches": self._batches,
+                "writes": self._writes,
+                "failed": self._failed,
+                "avg_batch": self._writes / self._batches if self._batches else 0.0,
+                "max_batch": self._max_batch_seen,
+                "avg_batch_ms": self._commit_total / self._batches * 1000 if self._batches else 0.0,
+                "queued": self._queue.qsize(),
+                "lock_retries": self._lock_retries,
+            }
+
+    def shutdown(self) -> None:
+        """Завершение записи накопленных операций и остановка потоков."""
+        with self._lock:
+            writer = self._writer
+            self._writer = None
+            readers = self._readers
+            self._readers = None
+        if writer is not None and writer.is_alive():
+            self._queue.put(None)
+            writer.join()
+        if readers is not None:
+            readers.shutdown(wait=True)
+
+# Исполнитель процесса
+db_executor = DatabaseExecutor()
@@ -0,0 +1,90 @@
+# app/defects_archive.py
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from .core.config import ARCHIVE_AFTER_DAYS, ARCHIVE_INTERVAL_SECONDS, ARCHIVE_BATCH_SIZE
+from .database import archive_completed_defects_in_tx
+from .db_async import db_executor
+
+logger = logging.getLogger(__name__)
+
+class DefectArchiver:
+    """
+    Периодический перенос дефектов, завершённых больше after_days дней
+    назад, из defects в defects_archive.
+
+    Основная таблица (и обычный список дефектов) остаётся небольшой:
+    в ней новые, незавершённые и недавно завершённые дефекты. Перенос идёт
+    пачками по batch_size через поток-писатель, не задерживая надолго
+    остальные записи. Дефекты в архиве не меняются, поэтому событий об
+    их переносе нет: открытые страницы показывают их до перезагрузки списка.
+    """
+
+    def __init__(
+        self,
+        after_days: int = ARCHIVE_AFTER_DAYS,
+        interval: float = ARCHIVE_INTERVAL_SECONDS,
+        batch_size: int = ARCHIVE_BATCH_SIZE
+    ):
+        self.after_days = after_days
+        self.interval = interval
+        self.batch_size = batch_size
+
+        # Статистика переноса
+        self.runs = 0
+        self.archived = 0
+        self.last_run_at: Optional[float] = None
+        self.last_run_ms = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.after_days > 0
+
+    async def archive_now(self, after_days: Optional[int] = None) -> int:
+        """Перенос всех подходящих дефектов. Возвращает их число."""
+        days = self.after_days if after_days is None else after_days
+        completed_before = int(time.time()) - days * 86400
+        started = time.perf_counter()
+        moved = 0
+        while True:
+            count = await db_executor.write(archive_completed_defects_in_tx, completed_before, self.batch_size)
+            moved += count
+            if count < self.batch_size:
+                break
+
+        self.runs += 1
+        self.archived += moved
+        self.last_run_at = time.time()
+        self.last_run_ms = (time.perf_counter() - started) * 1000
+        if moved:
+            logger.info(f"[Archive] В архив перенесено дефектов: {moved} за {self.last_run_ms:.0f} мс")
+        return moved
+
+    async def run(self) -> None:
+        """Основной цикл (запускается из lifespan, если архивирование включено)."""
+        logger.info(f"[Archive] Перенос дефектов, завершённых более {self.after_days} дн. назад, "
+                    f"каждые {self.interval:.0f} с.")
+        while True:
+            try:
+                await self.archive_now()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[Archive] Ошибка переноса дефектов в архив: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        """Параметры и итоги переноса."""
+        return {
+            "enabled": self.enabled,
+            "after_days": self.after_days,
+            "runs": self.runs,
+            "archived": self.archived,
+            "last_run_at": self.last_run_at,
+            "last_run_ms": self.last_run_ms,
+        }
+
+# Архиватор процесса
+defect_archiver = DefectArchiver()
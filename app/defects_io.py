@@ -0,0 +1,404 @@
+# app/defects_io.py
+import csv
+import io
+import re
+import time
+import zipfile
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import escape
+
+# Столбцы экспорта: ключ дефекта и заголовок. Импорт принимает те же заголовки
+# (или ключи API); ID и время устранения при импорте не используются.
+EXPORT_COLUMNS = (
+    ("id", "ID"),
+    ("equipment", "Оборудование"),
+    ("description", "Описание"),
+    ("section", "Участок"),
+    ("time_found", "Время обнаружения"),
+    ("danger_level", "Опасность"),
+    ("status", "Статус"),
+    ("assigned_to", "Исполнитель"),
+    ("responsible", "Ответственный"),
+    ("time_started", "Начало работ"),
+    ("time_completed", "Завершение работ"),
+    ("resolution_seconds", "Время устранения, ч"),
+)
+TIME_COLUMNS = ("time_found", "time_started", "time_completed")
+
+DEFECT_STATUSES = ("новый", "в работе", "завершён")
+DANGER_LEVELS = ("низкий", "средний", "высокий")
+REQUIRED_IMPORT_FIELDS = ("equipment", "description", "section", "danger_level")
+IMPORT_FIELDS = (
+    "equipment", "description", "section", "time_found", "danger_level", "status",
+    "assigned_to", "responsible", "time_started", "time_completed"
+)
+# Справочник, в котором ищется значение поля
+IMPORT_REFERENCES = {
+    "equipment": "equipment",
+    "section": "sections",
+    "assigned_to": "people",
+    "responsible": "people",
+}
+# Сколько ошибок импорта возвращается клиенту (считаются все)
+MAX_REPORTED_IMPORT_ERRORS = 200
+
+# Сколько строк экспорта накапливается перед отправкой фрагмента ответа
+EXPORT_CHUNK_ROWS = 500
+# Время в файлах — локальное время сервера, как в прежнем текстовом формате
+EXPORT_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+IMPORT_TIME_FORMATS = (
+    "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d",
+    "%d.%m.%Y %H:%M:%S", "%d.%m.%Y %H:%M", "%d.%m.%Y",
+)
+
+class ImportFormatError(ValueError):
+    """Файл импорта не удалось прочитать (формат, заголовки)."""
+
+# --- ЭКСПОРТ ---
+
+def _export_value(key: str, value: Any) -> Any:
+    if value is None:
+        return ""
+    if key in TIME_COLUMNS:
+        return time.strftime(EXPORT_TIME_FORMAT, time.localtime(value))
+    if key == "resolution_seconds":
+        return round(value / 3600, 1)
+    return value
+
+def iter_csv(defects: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """
+    CSV по мере чтения дефектов из курсора. Разделитель «;» и BOM —
+    чтобы файл сразу открывался в Excel с русской локалью.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";")
+    buffer.write("﻿")
+    writer.writerow([header for _, header in EXPORT_COLUMNS])
+    rows = 0
+    for defect in defects:
+        writer.writerow([_export_value(key, defect[key]) for key, _ in EXPORT_COLUMNS])
+        rows += 1
+        if rows % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+class _ChunkSink:
+    """Приёмник для zipfile без seek: записанные байты забираются порциями."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def _xlsx_column(index: int) -> str:
+    name = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        name = chr(ord("A") + remainder) + name
+    return name
+
+# Стиль 1 — дата и время (встроенный формат 22)
+_XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+    '<borders count="1"><border/></borders>'
+    '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+    '<cellXfs count="3"><xf/><xf numFmtId="22" applyNumberFormat="1"/><xf fontId="1" applyFont="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+_XLSX_STATIC_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Дефекты" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/styles.xml": _XLSX_STYLES,
+}
+
+def _xlsx_cell(ref: str, key: str, value: Any) -> str:
+    if value is None:
+        return ""
+    if key in TIME_COLUMNS:
+        # Дата Excel — дни от 1899-12-30 в локальном времени
+        local_seconds = value + time.localtime(value).tm_gmtoff
+        return f'<c r="{ref}" s="1"><v>{local_seconds / 86400 + 25569}</v></c>'
+    if key == "resolution_seconds":
+        return f'<c r="{ref}"><v>{round(value / 3600, 1)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    # Строки пишутся прямо в ячейки (inlineStr), без общей таблицы строк в памяти
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{escape(str(value))}</t></is></c>'
+
+def iter_xlsx(defects: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """
+    XLSX по мере чтения дефектов: лист пишется в zip-поток порциями,
+    поэтому расход памяти не зависит от числа строк.
+    """
+    sink = _ChunkSink()
+    columns = [_xlsx_column(index) for index in range(len(EXPORT_COLUMNS))]
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_STATIC_PARTS.items():
+            archive.writestr(name, content)
+        yield sink.take()
+
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            header = "".join(
+                f'<c r="{columns[index]}1" t="inlineStr" s="2"><is><t>{escape(title)}</t></is></c>'
+                for index, (_, title) in enumerate(EXPORT_COLUMNS)
+            )
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                f'<sheetData><row r="1">{header}</row>'
+            ).encode("utf-8"))
+            rows = []
+            for row_number, defect in enumerate(defects, start=2):
+                cells = "".join(
+                    _xlsx_cell(f"{columns[index]}{row_number}", key, defect[key])
+                    for index, (key, _) in enumerate(EXPORT_COLUMNS)
+                )
+                rows.append(f'<row r="{row_number}">{cells}</row>')
+                if len(rows) >= EXPORT_CHUNK_ROWS:
+                    sheet.write("".join(rows).encode("utf-8"))
+                    rows = []
+                    chunk = sink.take()
+                    if chunk:
+                        yield chunk
+            sheet.write(("".join(rows) + "</sheetData></worksheet>").encode("utf-8"))
+    yield sink.take()
+
+# --- ИМПОРТ ---
+
+def _normalize_header(value: Any) -> str:
+    return str(value or "").strip().lstrip("﻿").lower()
+
+_HEADER_FIELDS = {}
+for _key, _title in EXPORT_COLUMNS:
+    _HEADER_FIELDS[_normalize_header(_title)] = _key
+    _HEADER_FIELDS[_key] = _key
+
+def _iter_csv_rows(source: BinaryIO) -> Iterator[List[str]]:
+    text = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+    try:
+        sample = text.read(4096)
+        text.seek(0)
+        delimiter = ";" if sample.count(";") >= sample.count(",") else ","
+        yield from csv.reader(text, delimiter=delimiter)
+    finally:
+        # Исходный файл закрывает вызывающий
+        text.detach()
+
+_XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_CELL_REF_RE = re.compile(r"([A-Z]+)(\d+)")
+
+def _xlsx_column_index(ref: str) -> int:
+    letters = _CELL_REF_RE.match(ref).group(1)
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
+
+def _iter_xlsx_rows(source: BinaryIO) -> Iterator[List[Any]]:
+    """Строки первого листа XLSX (потоковый разбор XML, без сторонних библиотек)."""
+    try:
+        archive = zipfile.ZipFile(source)
+    except zipfile.BadZipFile as e:
+        raise ImportFormatError("Файл не является XLSX") from e
+    with archive:
+        shared: List[str] = []
+        if "xl/sharedStrings.xml" in archive.namelist():
+            with archive.open("xl/sharedStrings.xml") as f:
+                for _, element in iterparse(f):
+                    if element.tag == f"{_XLSX_NS}si":
+                        shared.append("".join(t.text or "" for t in element.iter(f"{_XLSX_NS}t")))
+                        element.clear()
+        sheets = sorted(name for name in archive.namelist() if name.startswith("xl/worksheets/sheet"))
+        if not sheets:
+            raise ImportFormatError("В файле XLSX нет листов")
+        with archive.open(sheets[0]) as f:
+            for _, element in iterparse(f):
+                if element.tag != f"{_XLSX_NS}row":
+                    continue
+                values: List[Any] = []
+                for cell in element.iter(f"{_XLSX_NS}c"):
+                    index = _xlsx_column_index(cell.get("r")) if cell.get("r") else len(values)
+                    cell_type = cell.get("t")
+                    if cell_type == "inlineStr":
+                        value: Any = "".join(t.text or "" for t in cell.iter(f"{_XLSX_NS}t"))
+                    else:
+                        raw = cell.findtext(f"{_XLSX_NS}v")
+                        if raw is None:
+                            value = ""
+                        elif cell_type == "s":
+                            value = shared[int(raw)]
+                        elif cell_type in ("str", "b", "e"):
+                            value = raw
+                        else:
+                            value = float(raw)
+                    values.extend([""] * (index - len(values)))
+                    values.append(value)
+                element.clear()
+                yield values
+
+def _parse_time(value: Any) -> Optional[int]:
+    """Время из файла: дата Excel (число), секунды Unix или строка в локальном времени."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, float):
+        if value < 100000:
+            # Дата Excel в локальном времени
+            local_seconds = round((value - 25569) * 86400)
+            return int(time.mktime(time.gmtime(local_seconds)))
+        return int(value)
+    text = str(value).strip()
+    if text.isdigit():
+        return int(text)
+    for time_format in IMPORT_TIME_FORMATS:
+        try:
+            return int(datetime.strptime(text, time_format).timestamp())
+        except ValueError:
+            continue
+    raise ValueError(f"нераспознанное время «{text}»")
+
+def _validate_row(values: Dict[str, Any], now: int) -> Tuple[Dict[str, Any], List[str]]:
+    errors = []
+    row: Dict[str, Any] = {}
+    for field in IMPORT_FIELDS:
+        value = values.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        if field in TIME_COLUMNS:
+            try:
+                value = _parse_time(value)
+            except ValueError as e:
+                errors.append(f"{field}: {e}")
+                value = None
+        elif isinstance(value, float) and value.is_integer():
+            value = str(int(value))
+        elif value is not None:
+            value = str(value)
+        row[field] = value or None
+
+    for field in REQUIRED_IMPORT_FIELDS:
+        if not row[field]:
+            errors.append(f"{field}: обязательное поле")
+    if row["danger_level"] and row["danger_level"].lower() not in DANGER_LEVELS:
+        errors.append(f"danger_level: допустимо {', '.join(DANGER_LEVELS)}")
+    elif row["danger_level"]:
+        row["danger_level"] = row["danger_level"].lower()
+    if row["status"] is None:
+        row["status"] = DEFECT_STATUSES[0]
+    elif row["status"].lower() not in DEFECT_STATUSES:
+        errors.append(f"status: допустимо {', '.join(DEFECT_STATUSES)}")
+    else:
+        row["status"] = row["status"].lower()
+    if row["time_found"] is None:
+        row["time_found"] = now
+    if row["time_started"] and row["time_completed"] and row["time_completed"] < row["time_started"]:
+        errors.append("time_completed: раньше начала работ")
+    return row, errors
+
+def iter_import_rows(source: BinaryIO, file_format: str) -> Iterator[Tuple[int, Dict[str, Any], List[str]]]:
+    """
+    Строки файла импорта: (номер строки в файле, проверенные значения, ошибки).
+    Первая строка — заголовки. Неизвестные столбцы и ID игнорируются.
+    """
+    rows = _iter_csv_rows(source) if file_format == "csv" else _iter_xlsx_rows(source)
+    try:
+        header = next(rows)
+    except StopIteration:
+        raise ImportFormatError("Файл пуст")
+    except UnicodeDecodeError as e:
+        raise ImportFormatError("CSV должен быть в кодировке UTF-8") from e
+    fields = [_HEADER_FIELDS.get(_normalize_header(title)) for title in header]
+    missing = [field for field in REQUIRED_IMPORT_FIELDS if field not in fields]
+    if missing:
+        rows.close()
+        raise ImportFormatError(f"Нет обязательных столбцов: {', '.join(missing)}")
+
+    now = int(time.time())
+    try:
+        for line_number, values in enumerate(rows, start=2):
+            if not any(str(value).strip() for value in values):
+                continue
+            named = {field: value for field, value in zip(fields, values) if field in IMPORT_FIELDS}
+            row, errors = _validate_row(named, now)
+            yield line_number, row, errors
+    except UnicodeDecodeError as e:
+        raise ImportFormatError("CSV должен быть в кодировке UTF-8") from e
+    finally:
+        rows.close()
+
+def validate_import(source: BinaryIO, file_format: str) -> Dict[str, Any]:
+    """
+    Первый проход импорта: проверка всех строк и сбор имён для справочников.
+    Возвращает {"rows", "error_count", "errors", "references"}.
+    """
+    references: Dict[str, Set[str]] = {"equipment": set(), "sections": set(), "people": set()}
+    errors = []
+    error_count = 0
+    rows = 0
+    for line_number, row, row_errors in iter_import_rows(source, file_format):
+        rows += 1
+        if row_errors:
+            error_count += 1
+            if len(errors) < MAX_REPORTED_IMPORT_ERRORS:
+                errors.append({"row": line_number, "errors": row_errors})
+            continue
+        for field, table in IMPORT_REFERENCES.items():
+            if row[field]:
+                references[table].add(row[field])
+    return {"rows": rows, "error_count": error_count, "errors": errors, "references": references}
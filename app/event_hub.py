@@ -0,0 +1,177 @@
+# app/event_hub.py
+import asyncio
+import json
+import logging
+import threading
+from collections import deque
+from typing import Deque, Dict, Any, Optional, Set
+
+from .core.config import EVENT_POLL_SECONDS
+from .database import get_defect_changes, get_defects_version
+from .db_async import db_executor
+
+logger = logging.getLogger(__name__)
+
+# Максимальное число неотправленных событий в очереди одного клиента
+SUBSCRIBER_QUEUE_SIZE = 256
+# Сколько изменений других процессов читается за одну проверку; если их
+# больше (импорт), подписчики переподключаются и дочитывают их сами
+POLL_BATCH_SIZE = 200
+# Сколько последних версий помнит хаб, чтобы не отдавать событие дважды
+RECENT_VERSIONS = 4096
+
+def format_sse_event(event_type: str, defect: Dict[str, Any]) -> str:
+    """Кодирование события об изменении дефекта в формат SSE (id = версия строки)."""
+    data = json.dumps({"type": event_type, "defect": defect}, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {defect['row_version']}\nevent: defect\ndata: {data}\n\n"
+
+class Subscriber:
+    """Подписчик на события: ограниченная очередь готовых SSE-сообщений."""
+
+    def __init__(self, queue_size: int):
+        self.queue: "asyncio.Queue[Optional[tuple]]" = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+class EventHub:
+    """
+    Внутрипроцессная рассылка событий об изменении дефектов.
+
+    Событие кодируется один раз и раскладывается по очередям подписчиков.
+    Если клиент не успевает забирать события и его очередь переполнена,
+    он отключается; при переподключении он дочитывает пропущенное из БД
+    по Last-Event-ID (версия строки defects).
+
+    Изменения, сделанные другими процессами (uvicorn --workers N), хаб
+    находит сам, проверяя БД раз в EVENT_POLL_SECONDS (run_poller). Событие
+    с уже отданной версией строки повторно не рассылается.
+    """
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        # Версии последних разосланных событий (только из event loop)
+        self._recent: Deque[int] = deque()
+        self._recent_set: Set[int] = set()
+
+    def subscribe(self) -> Subscriber:
+        """Регистрация подписчика (вызывается из event loop)."""
+        subscriber = Subscriber(self.queue_size)
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event_type: str, defect: Dict[str, Any]) -> None:
+        """
+        Публикация события об изменении дефекта.
+        Можно вызывать из любого потока, в том числе из синхронных эндпоинтов.
+        """
+        with self._lock:
+            loop = self._loop
+            if loop is None or not self._subscribers:
+                return
+        message = (defect["row_version"], format_sse_event(event_type, defect))
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is loop:
+            self._deliver(message)
+        else:
+            try:
+                loop.call_soon_threadsafe(self._deliver, message)
+            except RuntimeError:
+                # Event loop уже остановлен (завершение приложения)
+                pass
+
+    def _deliver(self, message: tuple) -> None:
+        version = message[0]
+        if version in self._recent_set:
+            # Уже разослано (событие этого процесса и то же изменение из БД)
+            return
+        self._recent.append(version)
+        self._recent_set.add(version)
+        if len(self._recent) > RECENT_VERSIONS:
+            self._recent_set.discard(self._recent.popleft())
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if subscriber.dropped:
+                continue
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Медленный клиент: освобождаем очередь и закрываем поток,
+                # пропущенное он получит из БД после переподключения
+                logger.warning("[Event Hub] Клиент не успевает получать события и будет отключён.")
+                self._drop(subscriber)
+
+    def _drop(self, subscriber: Subscriber) -> None:
+        subscriber.dropped = True
+        self.unsubscribe(subscriber)
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+    def resync_all(self) -> None:
+        """
+        Отключение всех подписчиков после массового изменения (например, импорта):
+        вместо тысяч отдельных событий клиенты переподключаются и дочитывают
+        изменения из БД по Last-Event-ID. Можно вызывать из любого потока.
+        """
+        with self._lock:
+            loop = self._loop
+            if loop is None or not self._subscribers:
+                return
+        try:
+            loop.call_soon_threadsafe(self._drop_all)
+        except RuntimeError:
+            pass
+
+    def _drop_all(self) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if not subscriber.dropped:
+                self._drop(subscriber)
+
+    async def run_poller(self, interval: float = EVENT_POLL_SECONDS) -> None:
+        """
+        Рассылка изменений, сделанных другими процессами (запускается из lifespan).
+        Пока подписчиков нет, запоминается только текущая версия данных.
+        """
+        since: Optional[int] = None
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if since is None or not self.subscriber_count:
+                    since = await db_executor.read(get_defects_version)
+                    continue
+                changes = await db_executor.read(get_defect_changes, since, POLL_BATCH_SIZE)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[Event Hub] Ошибка чтения изменений дефектов: {e}")
+                continue
+            if changes["has_more"]:
+                # Массовое изменение: клиенты дочитают его из БД после переподключения
+                since = None
+                self._drop_all()
+                continue
+            since = changes["version"]
+            for defect in changes["items"]:
+                self._deliver((defect["row_version"], format_sse_event("changed", defect)))
+
+# Общий хаб процесса
+event_hub = EventHub()
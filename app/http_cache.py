@@ -0,0 +1,100 @@
+# app/http_cache.py
+import zlib
+from typing import Dict, Iterable, Iterator, Optional
+from fastapi import Response
+from fastapi.staticfiles import StaticFiles
+
+# Кэширование неизменяемых файлов на год
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Кодировки из Accept-Encoding с их весами q."""
+    accepted: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """Клиент принимает ответ в gzip."""
+    accepted = parse_accept_encoding(accept_encoding)
+    return accepted.get("gzip", accepted.get("*", 0.0)) > 0
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 5) -> Iterator[bytes]:
+    """
+    Сжатие потокового ответа в gzip по мере формирования. Каждый фрагмент
+    сбрасывается (Z_SYNC_FLUSH), чтобы клиент получал данные без задержки.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        # Источник (например, курсор БД) освобождается и при обрыве соединения
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверка заголовка If-None-Match на совпадение с ETag (слабое сравнение)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+def parse_if_match_version(if_match: Optional[str]) -> Optional[int]:
+    """
+    Версия из заголовка If-Match ("3", W/"3" или 3); None — заголовка нет
+    или "*" (подойдёт любая версия). ValueError, если версия не число.
+    """
+    if not if_match or if_match.strip() == "*":
+        return None
+    value = if_match.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    return int(value.strip('"'))
+
+# Заголовок Vary для ответов, тело и ETag которых зависят от сжатия:
+# общий кэш не отдаст сжатый вариант клиенту, который его не просил
+VARY_ACCEPT_ENCODING = "Accept-Encoding"
+
+def not_modified(etag: str, cache_control: str = "no-cache", vary: Optional[str] = None) -> Response:
+    """Ответ 304 Not Modified с тем же ETag (и тем же Vary, что у полного ответа)."""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if vary:
+        headers["Vary"] = vary
+    return Response(status_code=304, headers=headers)
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    Раздача файлов, которые никогда не меняются под тем же именем
+    (загруженные фото хранятся по хэшу содержимого): браузер кэширует их
+    надолго и не перепроверяет.
+    """
+
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
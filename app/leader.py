@@ -0,0 +1,55 @@
+# app/leader.py
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from .core.config import LEADER_LOCK_PATH, LEADER_RETRY_SECONDS
+from .core.file_lock import FileLock
+
+logger = logging.getLogger(__name__)
+
+class LeaderElection:
+    """
+    Выбор ведущего процесса при запуске нескольких воркеров (uvicorn --workers N).
+
+    Фоновые задачи, которые должны выполняться в одном экземпляре
+    (отправка уведомлений из outbox, архивирование), запускает только
+    процесс, захвативший блокировку файла lock_path. Остальные раз в
+    retry_interval пробуют её захватить: если ведущий процесс завершился
+    (в том числе аварийно), блокировка освобождается и задачи переходят
+    к другому воркеру. С одним воркером он сразу становится ведущим.
+    """
+
+    def __init__(self, lock_path: str = LEADER_LOCK_PATH, retry_interval: float = LEADER_RETRY_SECONDS):
+        self.lock_path = lock_path
+        self.retry_interval = retry_interval
+        self._lock = FileLock(lock_path)
+        self.leader_since: Optional[float] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock.locked
+
+    async def run(self, jobs: Sequence[Callable[[], Awaitable[Any]]]) -> None:
+        """Ожидание лидерства и выполнение задач jobs (запускается из lifespan)."""
+        while not self._lock.acquire(blocking=False):
+            await asyncio.sleep(self.retry_interval)
+        self.leader_since = time.time()
+        logger.info(f"[Leader] Процесс {os.getpid()} стал ведущим: фоновые задачи выполняются в нём.")
+        tasks: List[asyncio.Task] = [asyncio.create_task(job()) for job in jobs]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._lock.release()
+            self.leader_since = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pid": os.getpid(), "leader": self.is_leader, "leader_since": self.leader_since}
+
+# Выбор ведущего для процесса
+leader_election = LeaderElection()
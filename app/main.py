@@ -1,28 +1,56 @@
 # app/main.py
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 import os
 # Импортируем lifespan из telegram_notifier
 from .telegram_notifier import lifespan
+from .photo_storage import UploadSizeLimitMiddleware
+from .core.config import MAX_UPLOAD_SIZE, MAX_IMPORT_SIZE, DEV_MODE
+from .core.db_pool import PoolTimeout
+from .http_cache import ImmutableStaticFiles
+from .page_cache import PageCache
+from .metrics import MetricsMiddleware
 
 # Импортируем роутеры
 from .api.defects import router as defects_router
 from .api.dropdowns import router as dropdowns_router
 from .api.admin import router as admin_router
 from .api.users import router as users_router
+from .api.events import router as events_router
+from .api.metrics import router as metrics_router
 
-# Импортируем инициализацию БД
-from .core import init_db
-
-# Создаем приложение FastAPI с lifespan
+# Создаем приложение FastAPI с lifespan (схема БД проверяется в нём, а не при импорте)
 app = FastAPI(lifespan=lifespan)
 
+# Отказ для слишком больших загрузок до чтения тела (запас на остальные поля формы)
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_body_size=MAX_UPLOAD_SIZE + 64 * 1024,
+    path_limits={"/defects/import": MAX_IMPORT_SIZE + 64 * 1024}
+)
+# Время и коды ответов всех запросов (добавлен последним — внешний слой)
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    """Все соединения с БД заняты (DB_POOL_TIMEOUT_SECONDS): 503, клиент может повторить запрос."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Сервер перегружен, повторите запрос позже"},
+        headers={"Retry-After": "1"}
+    )
+
 # Создаем папку для загрузок, если её нет
 if not os.path.exists("uploads"):
     os.makedirs("uploads")
 
 # Подключаем статические файлы
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Имена загруженных фото не переиспользуются, поэтому кэшируются браузером надолго
+app.mount("/uploads", ImmutableStaticFiles(directory="uploads"), name="uploads")
 app.mount("/static", StaticFiles(directory="frontend/static"), name="static")
 
 # Подключаем роутеры
@@ -30,31 +58,34 @@ app.include_router(defects_router, prefix="/defects")
 app.include_router(dropdowns_router, prefix="/dropdown-lists")
 app.include_router(admin_router, prefix="/admin")
 app.include_router(users_router, prefix="/users")
+app.include_router(events_router, prefix="/events")
+app.include_router(metrics_router, prefix="/metrics")
 
-# Инициализируем базу данных при запуске
-init_db.init_db()
-print("База данных инициализирована")
+# Страницы фронтенда загружаются и сжимаются один раз при запуске
+pages = PageCache("frontend", {
+    "index": "index.html",
+    "admin": "admin.html",
+    "subscribe": "subscribe.html",
+}, dev_mode=DEV_MODE)
+pages.load()
 
 # Основной маршрут для index.html
 @app.get("/")
-def read_root():
+def read_root(request: Request):
     """Главная страница."""
-    with open("frontend/index.html", "r", encoding="utf-8") as f:
-        html_content = f.read()
-    return html_content
+    return pages.response("index", request)
 
 # Маршрут для admin.html
 @app.get("/admin")
-def read_admin():
+def read_admin(request: Request):
     """Страница администрирования."""
-    with open("frontend/admin.html", "r", encoding="utf-8") as f:
-        html_content = f.read()
-    return html_content
+    return pages.response("admin", request)
 
 # Маршрут для subscribe.html
 @app.get("/subscribe")
-def read_subscribe():
+def read_subscribe(request: Request):
     """Страница подписки на уведомления."""
-    with open("frontend/subscribe.html", "r", encoding="utf-8") as f:
-        html_content = f.read()
-    return html_content
\ No newline at end of file
+    return pages.response("subscribe", request)
+
+# Время импорта приложения — для отчёта о запуске в lifespan
+app.state.import_seconds = time.perf_counter() - _import_started
@@ -0,0 +1,356 @@
+# app/metrics.py
+import bisect
+import contextvars
+import logging
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .core.config import SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+
+# Границы гистограмм (секунды)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+SEND_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DELAY_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Registry:
+    """Набор метрик процесса в текстовом формате Prometheus."""
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Any) -> Any:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines: List[str] = []
+        for metric in metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                # Ошибка одной метрики не должна ломать весь ответ
+                logger.error(f"[Metrics] Не удалось получить {metric.name}: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+class Counter:
+    """Монотонный счётчик с метками."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}_total", _format_labels(self.labelnames, labels), value
+
+class Histogram:
+    """Гистограмма с накопительными корзинами, суммой и числом наблюдений."""
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = HTTP_BUCKETS,
+        registry: Registry = REGISTRY
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Для каждого набора меток: счётчики корзин (последняя — +Inf) и сумма
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = ([0] * (len(self.buckets) + 1), [0.0])
+                self._values[labels] = entry
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        with self._lock:
+            values = sorted((labels, (list(counts), total[0])) for labels, (counts, total) in self._values.items())
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                yield f"{self.name}_bucket", _format_labels(self.labelnames, labels, le), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labelnames, labels), total
+            yield f"{self.name}_count", _format_labels(self.labelnames, labels), cumulative
+
+class CallbackMetric:
+    """
+    Значения, считываемые в момент запроса /metrics (состояние пула, очереди).
+    callback возвращает пары (значения меток, значение).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], Iterable[Tuple[Sequence[str], float]]],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge",
+        registry: Registry = REGISTRY
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+        registry.register(self)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        name = f"{self.name}_total" if self.kind == "counter" else self.name
+        for labels, value in self.callback():
+            yield name, _format_labels(self.labelnames, labels), value
+
+# --- HTTP ---
+
+HTTP_REQUESTS = Counter("http_requests", "HTTP-запросы по маршруту и коду ответа.", ("method", "route", "status"))
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Время обработки запроса до отправки последнего байта ответа.",
+    ("method", "route")
+)
+HTTP_REQUEST_SQL_SECONDS = Histogram(
+    "http_request_sql_seconds", "Время SQL-запросов внутри одного HTTP-запроса; остаток — Python (JSON и т. п.).",
+    ("method", "route"), buckets=SQL_BUCKETS
+)
+
+class RequestDbStats:
+    """Накопитель времени SQL текущего HTTP-запроса (общий для его потоков)."""
+    __slots__ = ("seconds", "queries")
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.queries = 0
+
+# Копии контекста в пулах потоков ссылаются на тот же объект накопителя
+request_db_stats: contextvars.ContextVar[Optional[RequestDbStats]] = contextvars.ContextVar(
+    "request_db_stats", default=None
+)
+
+def _route_label(scope: Dict[str, Any]) -> str:
+    """Шаблон маршрута (/defects/{defect_id}) вместо пути — число меток ограничено."""
+    from starlette.routing import Match
+    app = scope.get("app")
+    partial = None
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "") or "/"
+        if match == Match.PARTIAL and partial is None:
+            # Путь совпал, метод нет (ответ 405)
+            partial = getattr(route, "path", "") or "/"
+    return partial or "<unmatched>"
+
+class MetricsMiddleware:
+    """
+    Время и коды ответов всех HTTP-запросов и доля времени SQL в каждом.
+    Для потоков событий (SSE) считается только число запросов.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = _route_label(scope)
+        method = scope["method"]
+        started = time.perf_counter()
+        stats = RequestDbStats()
+        token = request_db_stats.set(stats)
+        status = 500
+        streaming_events = False
+
+        async def send_with_status(message):
+            nonlocal status, streaming_events
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for name, value in message.get("headers", ()):
+                    if name == b"content-type" and value.startswith(b"text/event-stream"):
+                        streaming_events = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_db_stats.reset(token)
+            HTTP_REQUESTS.inc(1, method, route, str(status))
+            if not streaming_events:
+                HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method, route)
+                HTTP_REQUEST_SQL_SECONDS.observe(stats.seconds, method, route)
+
+# --- SQL ---
+
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Время выполнения SQL (execute, без чтения строк).",
+    ("statement",), buckets=SQL_BUCKETS
+)
+DB_FETCH_SECONDS = Counter("db_fetch_seconds", "Время чтения строк результата (fetch*).", ("statement",))
+DB_ROWS = Counter("db_rows", "Строки: прочитанные (fetch*) и изменённые (rowcount).", ("statement", "kind"))
+DB_SLOW_QUERIES = Counter("db_slow_queries", "SQL-запросы дольше SLOW_QUERY_MS.", ("statement",))
+
+_STATEMENT_RE = re.compile(r"^\s*(?:WITH\b.*?\)\s*)?(\w+)", re.S)
+_TABLE_RE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+(\w+)", re.I)
+_statement_labels: Dict[str, str] = {}
+# Запросы собираются из ограниченного набора фрагментов; кэш ограничен на всякий случай
+MAX_STATEMENT_LABELS = 2048
+
+def statement_label(sql: str) -> str:
+    """Короткая метка запроса: операция и основная таблица («SELECT defects»)."""
+    label = _statement_labels.get(sql)
+    if label is not None:
+        return label
+    match = _STATEMENT_RE.match(sql)
+    operation = match.group(1).upper() if match else "?"
+    table = _TABLE_RE.search(sql)
+    label = f"{operation} {table.group(1)}" if table and operation in ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE") else operation
+    if len(_statement_labels) < MAX_STATEMENT_LABELS:
+        _statement_labels[sql] = label
+    return label
+
+def _compact_sql(sql: str, limit: int = 300) -> str:
+    text = " ".join(sql.split())
+    return text if len(text) <= limit else text[:limit] + "…"
+
+def _account(seconds: float) -> None:
+    stats = request_db_stats.get()
+    if stats is not None:
+        stats.seconds += seconds
+        stats.queries += 1
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Курсор, измеряющий время запросов и число строк."""
+
+    _label = "?"
+    _sql = ""
+
+    def _finish(self, sql: str, elapsed: float) -> None:
+        label = statement_label(sql)
+        self._label = label
+        self._sql = sql
+        DB_QUERY_SECONDS.observe(elapsed, label)
+        _account(elapsed)
+        if self.rowcount > 0:
+            DB_ROWS.inc(self.rowcount, label, "changed")
+        if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+            DB_SLOW_QUERIES.inc(1, label)
+            logger.warning(f"[SQL] Медленный запрос {elapsed * 1000:.1f} мс: {_compact_sql(sql)}")
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._finish(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._finish(sql, time.perf_counter() - started)
+
+    def _fetched(self, rows: int, elapsed: float) -> None:
+        DB_FETCH_SECONDS.inc(elapsed, self._label)
+        DB_ROWS.inc(rows, self._label, "read")
+        _account(elapsed)
+        if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+            DB_SLOW_QUERIES.inc(1, self._label)
+            logger.warning(f"[SQL] Медленное чтение {rows} строк {elapsed * 1000:.1f} мс: {_compact_sql(self._sql)}")
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(0 if row is None else 1, time.perf_counter() - started)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(len(rows), time.perf_counter() - started)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(len(rows), time.perf_counter() - started)
+        return rows
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Соединение, курсоры которого измеряют запросы (в том числе conn.execute)."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+# --- УВЕДОМЛЕНИЯ ---
+
+NOTIFICATIONS = Counter(
+    "notifications", "Обработанные уведомления outbox: sent, skipped, retried, dead.", ("result",)
+)
+TELEGRAM_SEND_SECONDS = Histogram(
+    "telegram_send_duration_seconds", "Время вызова Telegram API при отправке уведомления.",
+    ("method",), buckets=SEND_BUCKETS
+)
+TELEGRAM_ERRORS = Counter("telegram_errors", "Ошибки отправки в Telegram по типу.", ("error",))
+NOTIFICATION_THROTTLE_SECONDS = Histogram(
+    "notification_throttle_seconds", "Ожидание лимитов частоты Telegram перед отправкой.",
+    buckets=DELAY_BUCKETS
+)
+NOTIFICATION_DELIVERY_SECONDS = Histogram(
+    "notification_delivery_delay_seconds", "Время от записи уведомления в outbox до отправки.",
+    buckets=DELAY_BUCKETS
+)
@@ -0,0 +1,109 @@
+# app/page_cache.py
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # brotli не установлен — отдаём только gzip
+    brotli = None
+
+from .http_cache import etag_matches, not_modified, parse_accept_encoding, VARY_ACCEPT_ENCODING
+
+logger = logging.getLogger(__name__)
+
+# Как часто в режиме разработки проверяется изменение файлов страниц
+DEV_RELOAD_CHECK_SECONDS = 1.0
+
+def page_encodings() -> List[str]:
+    """Сжатия, в которых отдаются страницы (для метрик)."""
+    return ["identity", "gzip"] + (["br"] if brotli is not None else [])
+
+class CachedPage:
+    """HTML-страница в памяти: исходный текст и заранее сжатые варианты."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            body = f.read()
+        self.mtime = os.path.getmtime(path)
+        digest = hashlib.sha256(body).hexdigest()[:20]
+        # У каждого варианта свой сильный ETag: это разные представления
+        self.variants = {"identity": (body, f'"{digest}"')}
+        self.variants["gzip"] = (gzip.compress(body, 9, mtime=0), f'"{digest}-gz"')
+        if brotli is not None:
+            self.variants["br"] = (brotli.compress(body, quality=11), f'"{digest}-br"')
+
+    def choose_encoding(self, accept_encoding: Optional[str]) -> str:
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in ("br", "gzip"):
+            quality = accepted.get(encoding, accepted.get("*", 0.0))
+            if encoding in self.variants and quality > 0:
+                return encoding
+        return "identity"
+
+class PageCache:
+    """
+    Страницы фронтенда, загруженные один раз при запуске.
+
+    Ответ берётся из памяти в варианте, выбранном по Accept-Encoding
+    (brotli, если установлен, затем gzip). По ETag браузер перепроверяет
+    страницу и получает 304 без тела. В режиме разработки изменённые
+    файлы перечитываются.
+    """
+
+    def __init__(self, directory: str, pages: Dict[str, str], dev_mode: bool = False):
+        self.directory = directory
+        self.filenames = pages
+        self.dev_mode = dev_mode
+        self._pages: Dict[str, CachedPage] = {}
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+
+    def load(self) -> None:
+        """Чтение и сжатие всех страниц."""
+        pages = {
+            name: CachedPage(os.path.join(self.directory, filename))
+            for name, filename in self.filenames.items()
+        }
+        with self._lock:
+            self._pages = pages
+
+    def _reload_changed(self) -> None:
+        """Перечитывание страниц, файлы которых изменились (режим разработки)."""
+        now = time.monotonic()
+        if now - self._last_check < DEV_RELOAD_CHECK_SECONDS:
+            return
+        self._last_check = now
+        for name, page in list(self._pages.items()):
+            try:
+                changed = os.path.getmtime(page.path) != page.mtime
+            except OSError:
+                continue
+            if changed:
+                logger.info(f"[Pages] Файл {page.path} изменён, страница перечитана")
+                reloaded = CachedPage(page.path)
+                with self._lock:
+                    self._pages[name] = reloaded
+
+    def response(self, name: str, request: Request) -> Response:
+        if self.dev_mode:
+            self._reload_changed()
+        page = self._pages[name]
+        encoding = page.choose_encoding(request.headers.get("accept-encoding"))
+        body, etag = page.variants[encoding]
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return not_modified(etag, vary=VARY_ACCEPT_ENCODING)
+        response = Response(content=body, media_type="text/html")
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["Vary"] = VARY_ACCEPT_ENCODING
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+        return response
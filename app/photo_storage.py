@@ -0,0 +1,200 @@
+# app/photo_storage.py
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Optional
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow не установлен — миниатюры не создаются
+    Image = None
+    ImageOps = None
+
+from .core.config import MAX_UPLOAD_SIZE, THUMBNAIL_SIZE
+from .database import set_photo_thumbnail
+from .event_hub import event_hub
+
+logger = logging.getLogger(__name__)
+
+# Папка для загруженных фотографий
+UPLOAD_DIR = "uploads"
+# Размер блока при копировании загрузки на диск
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Допустимое расширение файла фото (иначе файл сохраняется без расширения)
+_EXTENSION_RE = re.compile(r"\.[a-z0-9]{1,8}")
+# Суффикс файла миниатюры рядом с оригиналом
+THUMBNAIL_SUFFIX = ".thumb.jpg"
+
+class UploadTooLarge(ValueError):
+    """Загружаемый файл больше MAX_UPLOAD_SIZE."""
+
+def _url_to_path(url: str) -> str:
+    return url.lstrip("/")
+
+def thumbnail_url_for(photo_url: str) -> str:
+    """URL миниатюры фото (файл может ещё не существовать)."""
+    return os.path.splitext(photo_url)[0] + THUMBNAIL_SUFFIX
+
+def existing_thumbnail_url(photo_url: str) -> Optional[str]:
+    """URL миниатюры, если она уже создана (например, для повторно загруженного фото)."""
+    thumb_url = thumbnail_url_for(photo_url)
+    return thumb_url if os.path.exists(_url_to_path(thumb_url)) else None
+
+def save_upload(source: BinaryIO, original_filename: str, max_size: int = MAX_UPLOAD_SIZE) -> str:
+    """
+    Сохранение загруженного фото и возврат его URL.
+
+    Файл копируется блоками во временный файл с одновременным подсчётом
+    SHA-256 и затем атомарно переименовывается в uploads/ab/cd/<sha256><расширение>.
+    Повторно загруженное то же фото не сохраняется второй раз — возвращается
+    URL уже существующего файла. Блокирующая функция — вызывается из пула потоков.
+    """
+    extension = os.path.splitext(original_filename)[1].lower()
+    if not _EXTENSION_RE.fullmatch(extension):
+        extension = ""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".upload-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            written = 0
+            while True:
+                chunk = source.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_size:
+                    raise UploadTooLarge(f"Файл больше {max_size} байт")
+                digest.update(chunk)
+                tmp_file.write(chunk)
+
+        name = digest.hexdigest()
+        relative_path = f"{name[:2]}/{name[2:4]}/{name}{extension}"
+        final_path = os.path.join(UPLOAD_DIR, relative_path)
+        if os.path.exists(final_path):
+            # Такое фото уже есть — дубликат не храним
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return f"/{UPLOAD_DIR}/{relative_path}"
+
+def make_thumbnail(photo_url: str, size: int = THUMBNAIL_SIZE) -> Optional[str]:
+    """
+    Создание уменьшенной JPEG-копии фото рядом с оригиналом.
+    Возвращает URL миниатюры или None, если Pillow не установлен.
+    """
+    if Image is None:
+        return None
+    thumb_url = thumbnail_url_for(photo_url)
+    thumb_path = _url_to_path(thumb_url)
+    if os.path.exists(thumb_path):
+        return thumb_url
+
+    with Image.open(_url_to_path(photo_url)) as image:
+        # Для JPEG декодируем сразу в уменьшенном масштабе
+        image.draft("RGB", (size, size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(thumb_path), prefix=".thumb-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                image.save(tmp_file, "JPEG", quality=80, optimize=True)
+            os.replace(tmp_path, thumb_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+    return thumb_url
+
+class ThumbnailWorker:
+    """
+    Фоновое создание миниатюр загруженных фото.
+
+    Один рабочий поток: миниатюры создаются по очереди и не занимают
+    пул потоков обработчиков запросов. Готовая миниатюра записывается
+    во все дефекты с этим фото, и открытые страницы получают событие
+    об изменении.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None
+
+    def submit(self, photo_url: str) -> None:
+        if not self.enabled:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumbnails")
+        self._executor.submit(self._run, photo_url)
+
+    def _run(self, photo_url: str) -> None:
+        try:
+            thumb_url = make_thumbnail(photo_url)
+            if thumb_url is None:
+                return
+            for defect in set_photo_thumbnail(photo_url, thumb_url):
+                event_hub.publish("updated", defect)
+        except Exception as e:
+            logger.error(f"[Thumbnails] Не удалось создать миниатюру для {photo_url}: {e}")
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+thumbnail_worker = ThumbnailWorker()
+
+class UploadSizeLimitMiddleware:
+    """
+    Ранний отказ (413) для запросов с телом больше допустимого по
+    заголовку Content-Length — до того, как тело будет прочитано.
+    Запросы без Content-Length ограничиваются при копировании в save_upload.
+    path_limits задаёт другой предел для отдельных путей (например, импорта).
+    """
+
+    def __init__(self, app, max_body_size: int, path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] in ("POST", "PUT", "PATCH"):
+            max_body_size = self.path_limits.get(scope["path"], self.max_body_size)
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    if value.isdigit() and int(value) > max_body_size:
+                        await self._reject(send)
+                        return
+                    break
+        await self.app(scope, receive, send)
+
+    async def _reject(self, send) -> None:
+        body = '{"detail":"Слишком большой файл"}'.encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,173 +1,473 @@
 # app/telegram_notifier.py
 import asyncio
-from telegram import Bot
-import io
+import html
 import os
-from typing import Dict, Optional, Any
-import threading
+import json
+import random
+import time
+from typing import Dict, List, Optional, Any, TYPE_CHECKING
 import logging
 from contextlib import asynccontextmanager
 
 # Используем относительные импорты для модулей внутри пакета `app`
-from .core.config import TELEGRAM_BOT_TOKEN
-from .database import get_user_by_name
+from .core import init_db
+from .core.config import (
+    TELEGRAM_BOT_TOKEN, TELEGRAM_GLOBAL_RATE, TELEGRAM_PER_CHAT_RATE, OUTBOX_BATCH_SIZE,
+    OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_BASE_SECONDS, OUTBOX_RETRY_MAX_SECONDS, OUTBOX_POLL_SECONDS
+)
+from .database import (
+    DIGEST_ROLE, get_user_by_name, pool, fetch_due_notifications, get_next_notification_time,
+    complete_notification_in_tx, retry_notification_in_tx, get_telegram_file_id, save_telegram_file_id_in_tx
+)
+from .db_async import db_executor
+from .defects_archive import defect_archiver
+from .event_hub import event_hub
+from .leader import leader_election
+from .metrics import (
+    NOTIFICATIONS, TELEGRAM_SEND_SECONDS, TELEGRAM_ERRORS, NOTIFICATION_THROTTLE_SECONDS,
+    NOTIFICATION_DELIVERY_SECONDS
+)
+from .photo_storage import thumbnail_worker
+
+# python-telegram-bot импортируется лениво (get_bot): без токена он не нужен,
+# а его импорт занимает заметную часть времени запуска
+if TYPE_CHECKING:
+    from telegram import Bot
+    from telegram.error import RetryAfter
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Длина описания дефекта в сводке уведомлений
+DIGEST_DESCRIPTION_CHARS = 80
+
 # Глобальные переменные для бота
-bot_instance: Optional[Bot] = None
+bot_instance: Optional["Bot"] = None
+
+def notifications_enabled() -> bool:
+    """Уведомления включены, если указан токен бота."""
+    return bool(TELEGRAM_BOT_TOKEN)
+
+def get_bot() -> "Bot":
+    """Клиент Telegram; библиотека импортируется при первом обращении."""
+    global bot_instance
+    if bot_instance is None:
+        started = time.perf_counter()
+        from telegram import Bot
+        bot_instance = Bot(token=TELEGRAM_BOT_TOKEN)
+        logger.info(f"[Telegram Notifier] Telegram бот инициализирован за "
+                    f"{(time.perf_counter() - started) * 1000:.0f} мс.")
+    return bot_instance
+
+# --- ФУНКЦИИ ОТПРАВКИ УВЕДОМЛЕНИЙ ---
+
+def format_notification_text(defect_data: Dict[str, Any], role: str) -> str:
+    """Текст уведомления о дефекте для ответственного или исполнителя."""
+    message_text = (
+        f"🔔 <b>Уведомление о дефекте</b>\n"
+        f"<b>ID:</b> {defect_data.get('id', 'N/A')}\n"
+        f"<b>Оборудование:</b> {defect_data.get('equipment', 'N/A')}\n"
+        f"<b>Участок:</b> {defect_data.get('section', 'N/A')}\n"
+        f"<b>Описание:</b> {defect_data.get('description', 'N/A')}\n"
+        f"<b>Уровень опасности:</b> {defect_data.get('danger_level', 'N/A')}\n"
+    )
+    if role == "executor":
+        return f"{message_text}<i>Вы назначены исполнителем.</i>"
+    return f"{message_text}<i>Вы назначены ответственным.</i>"
+
+def format_digest_text(items: List[Dict[str, Any]]) -> str:
+    """
+    Сводка о нескольких дефектах одному получателю (пакетное изменение).
+    Описания укорачиваются до DIGEST_DESCRIPTION_CHARS, чтобы сообщение
+    уложилось в предел длины Telegram.
+    """
+    lines = [f"🔔 <b>Назначены дефекты: {len(items)}</b>"]
+    for item in items:
+        defect = item['defect']
+        role = "исполнитель" if item['role'] == "executor" else "ответственный"
+        description = str(defect.get('description') or '')
+        if len(description) > DIGEST_DESCRIPTION_CHARS:
+            description = description[:DIGEST_DESCRIPTION_CHARS - 1] + "…"
+        lines.append(
+            f"• <b>ID {defect.get('id', 'N/A')}</b> — {html.escape(str(defect.get('equipment', 'N/A')))}, "
+            f"{html.escape(str(defect.get('section', 'N/A')))}, опасность: {defect.get('danger_level', 'N/A')} "
+            f"<i>({role})</i>\n  {html.escape(description)}"
+        )
+    return "\n".join(lines)
+
+class PhotoFileIdCache:
+    """
+    file_id фотографий, уже загруженных в Telegram.
+
+    Фото загружается один раз, дальше отправляется по file_id из памяти или
+    таблицы telegram_files. Одновременные отправки ещё не загруженного фото
+    ждут первую загрузку, а не загружают файл каждая сама.
+    """
 
-# --- ФУНКЦИЯ ОТПРАВКИ УВЕДОМЛЕНИЙ ---
+    def __init__(self):
+        self._file_ids: Dict[str, str] = {}
+        self._uploads: Dict[str, "asyncio.Future[Optional[str]]"] = {}
+
+    async def get(self, photo_url: str) -> Optional[str]:
+        file_id = self._file_ids.get(photo_url)
+        if file_id is None:
+            file_id = await db_executor.read(get_telegram_file_id, photo_url)
+            if file_id is not None:
+                self._file_ids[photo_url] = file_id
+        return file_id
+
+    async def forget(self, photo_url: str) -> None:
+        self._file_ids.pop(photo_url, None)
+        await db_executor.write(save_telegram_file_id_in_tx, photo_url, None)
+
+    async def upload_once(self, photo_url: str, upload) -> Optional[str]:
+        """
+        Загрузка фото через upload() (корутина, возвращающая file_id), если
+        её ещё не выполняет другая отправка. Возвращает None, если загрузку
+        выполнил этот вызов (фото уже отправлено), иначе file_id для повторной отправки.
+        """
+        pending = self._uploads.get(photo_url)
+        if pending is not None:
+            file_id = await asyncio.shield(pending)
+            if file_id is not None:
+                return file_id
+            # Первая загрузка не удалась — пробуем загрузить сами
+
+        future = asyncio.get_running_loop().create_future()
+        self._uploads[photo_url] = future
+        try:
+            file_id = await upload()
+            if file_id:
+                self._file_ids[photo_url] = file_id
+                await db_executor.write(save_telegram_file_id_in_tx, photo_url, file_id)
+            future.set_result(file_id)
+            return None
+        except BaseException:
+            future.set_result(None)
+            raise
+        finally:
+            if self._uploads.get(photo_url) is future:
+                del self._uploads[photo_url]
+
+photo_file_ids = PhotoFileIdCache()
 
 async def send_photo_with_caption(bot, chat_id, photo_url_internal, caption):
     """
     Отправляет фото с подписью указанному пользователю.
+    Уже загруженное фото отправляется по file_id, без повторной загрузки.
+    Если файла нет, отправляется только текст. Ошибки Telegram пробрасываются
+    вызывающему, чтобы диспетчер мог повторить попытку.
     """
-    if not photo_url_internal:
-        logger.error(f"[Telegram Bot ERROR] photo_url_internal is None or empty for chat_id {chat_id}")
-        return
-    photo_path = None
-    try:
-        photo_filename = photo_url_internal.lstrip('/')
-        photo_path = os.path.abspath(photo_filename)
-        logger.debug(f"[Telegram Bot DEBUG] Полный путь к фото: {photo_path}")
-        if not os.path.exists(photo_path):
-            logger.error(f"[Telegram Bot ERROR] Файл изображения не найден: {photo_path}")
+    from telegram.error import BadRequest
+    file_id = await photo_file_ids.get(photo_url_internal)
+    if file_id is not None:
+        try:
+            await bot.send_photo(chat_id=chat_id, photo=file_id, caption=caption, parse_mode='HTML')
+            logger.debug(f"[Telegram Bot DEBUG] Фото отправлено пользователю {chat_id} по file_id")
             return
+        except BadRequest as e:
+            # file_id больше не действителен — загружаем файл заново
+            logger.warning(f"[Telegram Bot] file_id для {photo_url_internal} отклонён ({e}), загружаем фото заново")
+            await photo_file_ids.forget(photo_url_internal)
+
+    photo_filename = photo_url_internal.lstrip('/')
+    photo_path = os.path.abspath(photo_filename)
+    logger.debug(f"[Telegram Bot DEBUG] Полный путь к фото: {photo_path}")
+    if not os.path.exists(photo_path):
+        logger.error(f"[Telegram Bot ERROR] Файл изображения не найден: {photo_path}, отправляем только текст")
+        await bot.send_message(chat_id=chat_id, text=caption, parse_mode='HTML')
+        return
+
+    async def upload() -> Optional[str]:
         with open(photo_path, 'rb') as photo_file:
-            photo_bytes = photo_file.read()
-            input_file = io.BytesIO(photo_bytes)
-            input_file.name = os.path.basename(photo_path)
-            await bot.send_photo(chat_id=chat_id, photo=input_file, caption=caption, parse_mode='HTML')
-        logger.debug(f"[Telegram Bot DEBUG] Фото успешно отправлено пользователю {chat_id}")
-    except FileNotFoundError:
-        error_path = photo_path if photo_path is not None else "unknown"
-        logger.error(f"[Telegram Bot ERROR] Файл изображения не найден при попытке открытия: {error_path}")
-    except Exception as e:
-        error_path = photo_path if photo_path is not None else "unknown"
-        logger.error(f"[Telegram Bot ERROR] Ошибка при отправке фото пользователю {chat_id} (path: {error_path}): {e}")
-
-def send_telegram_notification_async(defect_data: Dict[Any, Any], responsible_person: Optional[str], executor_person: Optional[str]):
+            message = await bot.send_photo(chat_id=chat_id, photo=photo_file, caption=caption, parse_mode='HTML')
+        logger.debug(f"[Telegram Bot DEBUG] Фото загружено и отправлено пользователю {chat_id}")
+        # Последний элемент — фото в наибольшем размере
+        return message.photo[-1].file_id if message and message.photo else None
+
+    file_id = await photo_file_ids.upload_once(photo_url_internal, upload)
+    if file_id is not None:
+        # Фото загрузила параллельная отправка — отправляем по её file_id
+        await bot.send_photo(chat_id=chat_id, photo=file_id, caption=caption, parse_mode='HTML')
+        logger.debug(f"[Telegram Bot DEBUG] Фото отправлено пользователю {chat_id} по file_id")
+
+# --- ДИСПЕТЧЕР OUTBOX ---
+
+class TokenBucket:
+    """Ограничение частоты отправки по алгоритму «ведро токенов»."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    @property
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+    async def acquire(self) -> None:
+        """Ожидание свободного токена."""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def _retry_after_seconds(error: "RetryAfter") -> float:
+    retry_after = error.retry_after
+    if hasattr(retry_after, "total_seconds"):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+class OutboxDispatcher:
     """
-    Асинхронно отправляет уведомления в Telegram.
+    Единственный долгоживущий отправитель уведомлений из таблицы outbox.
+
+    Забирает из outbox пачки уведомлений, которым пора уйти, соблюдая общий
+    лимит Telegram и лимит на один чат. Неудачные отправки повторяются с
+    экспоненциальной задержкой; после OUTBOX_MAX_ATTEMPTS попыток (или при
+    ошибке, которую повторять бессмысленно) уведомление получает статус dead.
     """
-    logger.debug(f"[Telegram Notifier] send_telegram_notification_async вызвана с: defect_data={defect_data}, "
-          f"responsible_person={responsible_person}, executor_person={executor_person}")
 
-    if not TELEGRAM_BOT_TOKEN:
-        logger.info("[Telegram Notifier] Уведомления отключены: не указан токен.")
-        return
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake_event: Optional[asyncio.Event] = None
+        self._global_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_RATE)
+        self._chat_buckets: Dict[str, TokenBucket] = {}
+
+        # Статистика отправки
+        self.sent = 0
+        self.skipped = 0
+        self.retried = 0
+        self.dead = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._delivery_delay_total = 0.0
+
+    def wake(self) -> None:
+        """Сигнал о новых записях в outbox. Можно вызывать из любого потока."""
+        loop, event = self._loop, self._wake_event
+        if loop is None or event is None:
+            return
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            # Event loop уже остановлен
+            pass
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 1000:
+                # Забываем чаты, лимит которых давно восстановился
+                self._chat_buckets = {k: b for k, b in self._chat_buckets.items() if not b.is_full}
+            bucket = TokenBucket(TELEGRAM_PER_CHAT_RATE, 1)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def run(self, bot: Optional["Bot"] = None) -> None:
+        """
+        Основной цикл диспетчера (запускается из lifespan). Без bot клиент
+        Telegram создаётся, когда в outbox появится первое уведомление.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wake_event = asyncio.Event()
+        logger.info("[Telegram Notifier] Диспетчер уведомлений запущен.")
+        try:
+            while True:
+                self._wake_event.clear()
+                try:
+                    batch = await db_executor.read(fetch_due_notifications, OUTBOX_BATCH_SIZE)
+                    if batch:
+                        if bot is None:
+                            # Импорт библиотеки — в потоке, чтобы не задерживать event loop
+                            bot = await asyncio.to_thread(get_bot)
+                        await asyncio.gather(*(self._process(bot, item) for item in batch))
+                        continue
+                    next_at = await db_executor.read(get_next_notification_time)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"[Telegram Notifier] Ошибка чтения outbox: {e}")
+                    next_at = None
 
-    # Создаем асинхронную задачу для отправки
-    async def _send_notification():
-        """Внутренняя асинхронная функция для выполнения отправки."""
-        global bot_instance
-        if not bot_instance:
-             logger.error("[Telegram Notifier] Бот не инициализирован. Невозможно отправить уведомление.")
-             return
+                # Уведомления, добавленные другими процессами, находятся при очередной проверке
+                timeout = OUTBOX_POLL_SECONDS
+                if next_at is not None:
+                    timeout = max(0.0, min(OUTBOX_POLL_SECONDS, next_at - time.time()))
+                try:
+                    await asyncio.wait_for(self._wake_event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Диспетчер остановлен (завершение приложения)
+            self._loop = None
+            self._wake_event = None
 
+    async def _process(self, bot: "Bot", item: Dict[str, Any]) -> None:
+        """Отправка одного уведомления и запись результата в outbox."""
+        from telegram.error import BadRequest, RetryAfter
+        notification_id = item['id']
         try:
-            defect_id = defect_data.get('id', 'N/A')
-            equipment = defect_data.get('equipment', 'N/A')
-            section = defect_data.get('section', 'N/A')
-            description = defect_data.get('description', 'N/A')
-            danger_level = defect_data.get('danger_level', 'N/A')
-            photo_url_internal = defect_data.get('photo_url', None)
-
-            # Формируем текст сообщения
-            message_text = (
-                f"🔔 <b>Уведомление о дефекте</b>\n"
-                f"<b>ID:</b> {defect_id}\n"
-                f"<b>Оборудование:</b> {equipment}\n"
-                f"<b>Участок:</b> {section}\n"
-                f"<b>Описание:</b> {description}\n"
-                f"<b>Уровень опасности:</b> {danger_level}\n"
-            )
-
-            tasks = []
-            notified_users = []
-
-            # Уведомление ответственного
-            if responsible_person:
-                user = get_user_by_name(responsible_person)
-                if user:
-                    user_id = user['telegram_id']
-                    msg_text_resp = f"{message_text}<i>Вы назначены ответственным.</i>"
-                    logger.debug(f"[Telegram Notifier] Добавляем задачу уведомления для ответственного: {responsible_person} (ID: {user_id})")
-                    if photo_url_internal:
-                        task = send_photo_with_caption(bot_instance, user_id, photo_url_internal, msg_text_resp)
-                        tasks.append(task)
-                    else:
-                        task = bot_instance.send_message(chat_id=user_id, text=msg_text_resp, parse_mode='HTML')
-                        tasks.append(task)
-                    notified_users.append(responsible_person)
-
-            # Уведомление исполнителя
-            if executor_person and executor_person != responsible_person:
-                user = get_user_by_name(executor_person)
-                if user:
-                    user_id = user['telegram_id']
-                    msg_text_exec = f"{message_text}<i>Вы назначены исполнителем.</i>"
-                    logger.debug(f"[Telegram Notifier] Добавляем задачу уведомления для исполнителя: {executor_person} (ID: {user_id})")
-                    if photo_url_internal:
-                        task = send_photo_with_caption(bot_instance, user_id, photo_url_internal, msg_text_exec)
-                        tasks.append(task)
-                    else:
-                        task = bot_instance.send_message(chat_id=user_id, text=msg_text_exec, parse_mode='HTML')
-                        tasks.append(task)
-                    notified_users.append(executor_person)
-
-            # Отправляем все сообщения параллельно
-            if tasks:
-                logger.debug(f"[Telegram Notifier] Отправка {len(tasks)} уведомлений...")
-                # Создаем задачи для каждой корутины
-                task_objects = [asyncio.create_task(t) for t in tasks]
-                results = await asyncio.gather(*task_objects, return_exceptions=True)
-                logger.info(f"[Telegram Notifier] Уведомления отправлены для дефекта ID {defect_id} пользователям: {notified_users}")
-                # Проверка результатов на ошибки
-                for i, result in enumerate(results):
-                    if isinstance(result, Exception):
-                        logger.error(f"[Telegram Notifier ERROR] Ошибка при отправке уведомления пользователю {notified_users[i]}: {result}")
+            payload = json.loads(item['payload'])
+            user = await db_executor.read(get_user_by_name, item['recipient'])
+            if not user:
+                logger.info(f"[Telegram Notifier] {item['recipient']} не подписан на уведомления, пропускаем.")
+                await db_executor.write(complete_notification_in_tx, notification_id, 'skipped', 'Нет подписки')
+                self.skipped += 1
+                NOTIFICATIONS.inc(1, 'skipped')
+                return
+
+            chat_id = user['telegram_id']
+            if item['role'] == DIGEST_ROLE:
+                # Сводка по нескольким дефектам — одно текстовое сообщение
+                text = format_digest_text(payload['items'])
+                photo_url_internal = None
+                subject = "дефектам ID " + ", ".join(str(entry['defect'].get('id')) for entry in payload['items'])
             else:
-                logger.debug("[Telegram Notifier] Нет задач для отправки уведомлений.")
+                text = format_notification_text(payload, item['role'])
+                photo_url_internal = payload.get('photo_url')
+                subject = f"дефекту ID {payload.get('id', 'N/A')}"
+            throttle_started = time.perf_counter()
+            await self._chat_bucket(chat_id).acquire()
+            await self._global_bucket.acquire()
+            NOTIFICATION_THROTTLE_SECONDS.observe(time.perf_counter() - throttle_started)
 
+            started = time.perf_counter()
+            method = 'photo' if photo_url_internal else 'message'
+            try:
+                if photo_url_internal:
+                    await send_photo_with_caption(bot, chat_id, photo_url_internal, text)
+                else:
+                    await bot.send_message(chat_id=chat_id, text=text, parse_mode='HTML')
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                TELEGRAM_ERRORS.inc(1, type(e).__name__)
+                raise
+            finally:
+                latency = time.perf_counter() - started
+                TELEGRAM_SEND_SECONDS.observe(latency, method)
+
+            await db_executor.write(complete_notification_in_tx, notification_id, 'sent')
+            delivery_delay = max(0, time.time() - item['created_at'])
+            self.sent += 1
+            self._latency_total += latency
+            self._latency_max = max(self._latency_max, latency)
+            self._delivery_delay_total += delivery_delay
+            NOTIFICATIONS.inc(1, 'sent')
+            NOTIFICATION_DELIVERY_SECONDS.observe(delivery_delay)
+            logger.info(f"[Telegram Notifier] Уведомление по {subject} отправлено пользователю {item['recipient']}")
+        except asyncio.CancelledError:
+            raise
+        except RetryAfter as e:
+            # Telegram сам сообщает, через сколько можно повторить
+            delay = _retry_after_seconds(e)
+            logger.warning(f"[Telegram Notifier] Превышен лимит Telegram, повтор через {delay:.0f} с")
+            await self._retry(notification_id, time.time() + delay, str(e))
+        except BadRequest as e:
+            # Повторять запрос с теми же данными бессмысленно
+            logger.error(f"[Telegram Notifier ERROR] Уведомление {notification_id} отклонено: {e}")
+            await self._dead(notification_id, str(e))
         except Exception as e:
-            logger.error(f"[Telegram Notifier] Критическая ошибка в _send_notification для дефекта ID {defect_data.get('id', 'N/A')}: {e}")
-
-    # Планируем выполнение задачи в активном event loop
-    try:
-        loop = asyncio.get_running_loop()
-        loop.create_task(_send_notification())
-        logger.debug("[Telegram Notifier] Асинхронная задача уведомления создана и запланирована.")
-    except RuntimeError:
-        # Если event loop не запущен, запускаем в новом loop
-        logger.warning("[Telegram Notifier] RuntimeError: no running event loop. Попытка запуска в новом loop...")
+            attempts = item['attempts'] + 1
+            if attempts >= OUTBOX_MAX_ATTEMPTS:
+                logger.error(f"[Telegram Notifier ERROR] Уведомление {notification_id} не отправлено "
+                             f"после {attempts} попыток: {e}")
+                await self._dead(notification_id, str(e))
+                return
+            delay = min(OUTBOX_RETRY_MAX_SECONDS, OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+            delay *= random.uniform(0.8, 1.2)
+            logger.warning(f"[Telegram Notifier] Ошибка отправки уведомления {notification_id} "
+                           f"(попытка {attempts}), повтор через {delay:.0f} с: {e}")
+            await self._retry(notification_id, time.time() + delay, str(e))
+
+    async def _retry(self, notification_id: int, next_attempt_at: float, error: str) -> None:
+        try:
+            await db_executor.write(retry_notification_in_tx, notification_id, int(next_attempt_at), error)
+            self.retried += 1
+            NOTIFICATIONS.inc(1, 'retried')
+        except Exception as e:
+            logger.error(f"[Telegram Notifier] Не удалось перенести уведомление {notification_id}: {e}")
+
+    async def _dead(self, notification_id: int, error: str) -> None:
         try:
-            new_loop = asyncio.new_event_loop()
-            def run_loop():
-                asyncio.set_event_loop(new_loop)
-                new_loop.run_until_complete(_send_notification())
-                new_loop.close()
-            thread = threading.Thread(target=run_loop, daemon=True)
-            thread.start()
-            logger.debug("[Telegram Notifier] Асинхронная задача уведомления запущена в новом потоке.")
-        except Exception as e2:
-            logger.error(f"[Telegram Notifier] Не удалось запустить задачу уведомления даже в новом loop/thread: {e2}")
+            await db_executor.write(complete_notification_in_tx, notification_id, 'dead', error)
+            self.dead += 1
+            NOTIFICATIONS.inc(1, 'dead')
+        except Exception as e:
+            logger.error(f"[Telegram Notifier] Не удалось пометить уведомление {notification_id}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики отправки и задержки (в миллисекундах)."""
+        return {
+            "running": self._loop is not None,
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "retried": self.retried,
+            "dead": self.dead,
+            "send_latency_avg_ms": (self._latency_total / self.sent * 1000) if self.sent else 0.0,
+            "send_latency_max_ms": self._latency_max * 1000,
+            "delivery_delay_avg_ms": (self._delivery_delay_total / self.sent * 1000) if self.sent else 0.0,
+        }
+
+# Диспетчер процесса
+outbox_dispatcher = OutboxDispatcher()
 
 # --- ЖИЗНЕННЫЙ ЦИКЛ ПРИЛОЖЕНИЯ ---
 
 @asynccontextmanager
 async def lifespan(app):
-    """Lifespan handler для инициализации бота."""
+    """Lifespan handler: схема БД, выбор ведущего процесса для уведомлений и архивирования, события."""
     logger.info("[App Lifespan] Запуск приложения...")
-    global bot_instance
+    started = time.perf_counter()
+    await asyncio.to_thread(init_db.init_db)
+    db_init_seconds = time.perf_counter() - started
+
+    # Уведомления и архивирование выполняет только ведущий процесс
+    # (при запуске с --workers N остальные воркеры их не запускают)
+    leader_jobs = []
     if TELEGRAM_BOT_TOKEN:
-        bot_instance = Bot(token=TELEGRAM_BOT_TOKEN)
-        logger.info("[App Lifespan] Telegram бот инициализирован.")
+        # Клиент Telegram создаётся при первой отправке (get_bot)
+        leader_jobs.append(outbox_dispatcher.run)
     else:
         logger.info("[App Lifespan] Токен Telegram бота не указан.")
+    if defect_archiver.enabled:
+        leader_jobs.append(defect_archiver.run)
+    leader_task = asyncio.create_task(leader_election.run(leader_jobs)) if leader_jobs else None
+    if not thumbnail_worker.enabled:
+        logger.warning("[App Lifespan] Pillow не установлен: миниатюры фото не создаются, "
+                       "в таблице показываются оригиналы (pip install -r requirements.txt).")
+    # События об изменениях, сделанных другими процессами
+    poller_task = asyncio.create_task(event_hub.run_poller())
+
+    import_seconds = getattr(app.state, "import_seconds", None)
+    import_report = f"импорт {import_seconds * 1000:.0f} мс, " if import_seconds is not None else ""
+    logger.info(f"[App Lifespan] Запуск: {import_report}схема БД {db_init_seconds * 1000:.0f} мс, "
+                f"бот — {'при первой отправке' if TELEGRAM_BOT_TOKEN else 'отключён'}.")
     yield
     logger.info("[App Lifespan] Остановка приложения...")
-    # Очистка ресурсов, если необходимо
\ No newline at end of file
+    for task in (leader_task, poller_task):
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    if bot_instance is not None:
+        # Закрываем HTTP-клиент бота
+        await bot_instance.shutdown()
+    thumbnail_worker.shutdown()
+    db_executor.shutdown()
+    logger.info(f"[App Lifespan] Групповая запись в БД: {db_executor.stats()}")
+    logger.info(f"[App Lifespan] Статистика пула соединений БД: {pool.stats()}")
+    pool.close_all()
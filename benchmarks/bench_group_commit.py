@@ -0,0 +1,79 @@
+# benchmarks/bench_group_commit.py
+"""
+Одновременное создание дефектов: отдельная транзакция на каждый дефект в
+общем пуле потоков (как было) против потока-писателя с групповой записью
+(db_executor.write). Измеряются общее время и задержка одного создания.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_group_commit --writes 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.common import latency_summary, prepare_app_environment
+
+def _defect(i):
+    return {
+        "equipment": f"Насос {i % 50}",
+        "description": f"Течь уплотнения {i}",
+        "section": f"Цех {i % 10}",
+        "time_found": int(time.time()),
+        "danger_level": "средний",
+        "responsible": None,
+        "photo_url": None,
+    }
+
+async def _run_mode(name, write, writes, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            await write(_defect(i))
+            samples.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(writes)))
+    seconds = time.perf_counter() - started
+    print(f"{name}: {writes} дефектов за {seconds:.2f} с ({writes / seconds:.0f}/с), задержка {latency_summary(samples)}")
+
+async def _run(writes, concurrency):
+    from starlette.concurrency import run_in_threadpool
+    from app import database
+    from app.db_async import db_executor
+
+    await _run_mode(
+        "Транзакция на дефект",
+        lambda data: run_in_threadpool(database.create_defect, data),
+        writes, concurrency
+    )
+    await _run_mode(
+        "Групповая запись    ",
+        lambda data: db_executor.write(database.create_defect_in_tx, data),
+        writes, concurrency
+    )
+    print(f"Пачки записи: {db_executor.stats()}")
+    db_executor.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        prepare_app_environment(workdir)
+        try:
+            from app.core.init_db import init_db
+            init_db()
+            asyncio.run(_run(args.writes, args.concurrency))
+        finally:
+            os.chdir(cwd)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# benchmarks/bench_import_export.py
+"""
+Импорт и выгрузка дефектов на большом файле (по умолчанию 100 000 строк).
+
+Импорт (проверка файла и executemany в одной транзакции) сравнивается с
+добавлением тех же строк по одной через create_defect — как при ручном
+вводе через форму (время для всех строк оценивается по выборке).
+Для выгрузки CSV и XLSX измеряются время и пик памяти Python (tracemalloc):
+он не должен расти вместе с числом строк.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_import_export --rows 100000
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.common import prepare_app_environment
+
+def _write_csv(path, rows, seed):
+    rnd = random.Random(seed)
+    base = int(time.time()) - 400 * 86400
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(["Оборудование", "Описание", "Участок", "Время обнаружения", "Опасность",
+                         "Статус", "Исполнитель", "Ответственный"])
+        for i in range(rows):
+            found = base + i * 300
+            writer.writerow([
+                f"Насос {rnd.randint(1, 300)}",
+                f"Течь уплотнения, вибрация подшипника, замечание {i}",
+                f"Цех {rnd.randint(1, 20)}",
+                time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(found)),
+                rnd.choice(["низкий", "средний", "высокий"]),
+                rnd.choice(["новый", "в работе", "завершён"]),
+                f"Исполнитель {rnd.randint(1, 50)}",
+                f"Ответственный {rnd.randint(1, 30)}",
+            ])
+
+def _measure_export(iter_rows, consume):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = 0
+    for chunk in iter_rows():
+        size += len(consume(chunk))
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, size, peak
+
+def run(rows, baseline_rows, seed):
+    from app.core.init_db import init_db
+    from app import database
+    from app.defects_io import iter_csv, iter_xlsx, iter_import_rows, validate_import
+
+    init_db()
+    path = os.path.join(os.path.dirname(os.environ["DATABASE_PATH"]), "import.csv")
+    _write_csv(path, rows, seed)
+    print(f"Файл импорта: {rows} строк, {os.path.getsize(path) / 1024 / 1024:.1f} МБ")
+
+    # Импорт: два прохода по файлу, вставка одной транзакцией
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        report = validate_import(f, "csv")
+    validated = time.perf_counter()
+    assert report["error_count"] == 0, report["errors"][:5]
+    with open(path, "rb") as f:
+        inserted = database.insert_defects_bulk(
+            report["references"], (row for _, row, _ in iter_import_rows(f, "csv"))
+        )
+    finished = time.perf_counter()
+    total = finished - started
+    print(f"Импорт: {inserted} строк за {total:.2f} с "
+          f"(проверка {validated - started:.2f} с, вставка {finished - validated:.2f} с), "
+          f"{inserted / total:.0f} строк/с")
+
+    # По одной строке через create_defect (транзакция на каждую строку)
+    with open(path, "rb") as f:
+        sample = [row for _, row, _ in iter_import_rows(f, "csv")][:baseline_rows]
+    started = time.perf_counter()
+    for row in sample:
+        database.create_defect({**row, "photo_url": None})
+    per_row = (time.perf_counter() - started) / len(sample)
+    print(f"По одной строке: {per_row * 1000:.2f} мс/строка, "
+          f"оценка для {rows} строк {per_row * rows:.1f} с ({per_row * rows / total:.1f}x медленнее)")
+
+    exported = rows + len(sample)
+    seconds, size, peak = _measure_export(lambda: iter_csv(database.iter_defects()), lambda s: s.encode("utf-8"))
+    print(f"Выгрузка CSV:  {exported} строк за {seconds:.2f} с, {size / 1024 / 1024:.1f} МБ, "
+          f"пик памяти {peak / 1024 / 1024:.1f} МБ")
+    seconds, size, peak = _measure_export(lambda: iter_xlsx(database.iter_defects()), lambda b: b)
+    print(f"Выгрузка XLSX: {exported} строк за {seconds:.2f} с, {size / 1024 / 1024:.1f} МБ, "
+          f"пик памяти {peak / 1024 / 1024:.1f} МБ")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--baseline-rows", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        prepare_app_environment(workdir)
+        try:
+            run(args.rows, args.baseline_rows, args.seed)
+        finally:
+            os.chdir(cwd)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# benchmarks/bench_list_format.py
+"""
+Размер ответа и время кодирования списка дефектов (по умолчанию 10 000
+строк) в разных форматах:
+
+    * objects, как было — json.dumps для каждой строки отдельно (прежняя
+      реализация GET /defects/);
+    * objects — текущий формат, строки кодируются пачками;
+    * columnar — компактный формат (format=columnar): столбцы и словари;
+
+каждый — стандартным json и orjson (если установлен), без сжатия и с gzip.
+Строки читаются из БД заранее: измеряется только кодирование и сжатие.
+Проверяется, что все варианты декодируются в одни и те же дефекты.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_list_format --rows 10000
+"""
+import argparse
+import gzip
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.common import prepare_app_environment
+from benchmarks.generate_dataset import generate
+
+def _old_stream(defects):
+    """Копия прежнего _stream_defects_json (без limit): json.dumps на каждую строку."""
+    chunk = ["["]
+    count = 0
+    for defect in defects:
+        chunk.append(("," if count else "") + json.dumps(defect, ensure_ascii=False, separators=(",", ":")))
+        count += 1
+        if len(chunk) >= 500:
+            yield "".join(chunk).encode("utf-8")
+            chunk = []
+    chunk.append("]")
+    yield "".join(chunk).encode("utf-8")
+
+def _decode_columnar(data):
+    dictionaries = data["dictionaries"]
+    defects = []
+    for row in data["rows"]:
+        defect = dict(zip(data["columns"], row))
+        for field, name in data["encoded"].items():
+            if defect[field] is not None:
+                defect[field] = dictionaries[name][defect[field]]
+        defects.append(defect)
+    return defects
+
+def _measure(make_chunks, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = b"".join(make_chunks())
+        seconds = time.perf_counter() - started
+        best = seconds if best is None else min(best, seconds)
+    return best, body
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5, help="повторов каждого замера (берётся лучший)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        database_path = os.path.join(workdir, "bench.db")
+        generate(database_path, args.rows, seed=42, days=730, end=int(time.time()))
+        prepare_app_environment(workdir, database_path)
+
+        from app.api import defects as api
+        from app.database import iter_defects, iter_defect_rows
+        from app.http_cache import gzip_chunks
+
+        defects = list(iter_defects())
+        rows = list(iter_defect_rows())
+        encoders = [("json", None)] + ([("orjson", api.orjson)] if api.orjson is not None else [])
+        if api.orjson is None:
+            print("orjson не установлен — замеры только со стандартным json")
+
+        variants = [("objects, как было", "json", lambda: _old_stream(defects))]
+        for encoder_name, module in encoders:
+            variants.append(("objects", encoder_name, module, lambda: api._stream_defects_json(iter(defects), len(defects))))
+            variants.append(("columnar", encoder_name, module, lambda: api._stream_defects_columnar(iter(rows), len(rows))))
+
+        print(f"{'формат':<20}{'кодировщик':<12}{'сжатие':<8}{'размер, КБ':>12}{'кодирование, мс':>18}")
+        baseline = None
+        saved_orjson = api.orjson
+        try:
+            for variant in variants:
+                if len(variant) == 3:
+                    fmt, encoder_name, make_chunks = variant
+                else:
+                    fmt, encoder_name, module, make_chunks = variant
+                    api.orjson = module
+                for compression in ("нет", "gzip"):
+                    make = make_chunks if compression == "нет" else (lambda make_chunks=make_chunks: gzip_chunks(make_chunks()))
+                    seconds, body = _measure(make, args.repeat)
+                    data = json.loads(gzip.decompress(body) if compression == "gzip" else body)
+                    if fmt == "columnar":
+                        decoded = _decode_columnar(data)
+                    else:
+                        # Прежний формат — массив, страница — {"items": [...]}
+                        decoded = data["items"] if isinstance(data, dict) else data
+                    if decoded != defects:
+                        raise SystemExit(f"{fmt}/{encoder_name}/{compression}: результат не совпадает со списком дефектов")
+                    if baseline is None:
+                        baseline = (len(body), seconds)
+                    print(
+                        f"{fmt:<20}{encoder_name:<12}{compression:<8}{len(body) / 1024:>12.1f}{seconds * 1000:>18.1f}"
+                        f"   ({len(body) / baseline[0]:.2f}x размера, {seconds / baseline[1]:.2f}x времени)"
+                    )
+        finally:
+            api.orjson = saved_orjson
+
+if __name__ == "__main__":
+    main()
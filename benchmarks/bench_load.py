@@ -0,0 +1,314 @@
+# benchmarks/bench_load.py
+"""
+Нагрузочный тест API: смесь запросов списка дефектов с фильтрами,
+создания дефектов с фото, изменения статуса и чтения списков выбора.
+
+По умолчанию приложение запускается в этом же процессе (httpx +
+ASGI-транспорт) на копии БД из --dataset (см. generate_dataset), так что
+исходный файл не меняется. С --url нагрузка подаётся на запущенный сервер.
+Запросы выбираются детерминированно по --seed. Результат — JSON с
+пропускной способностью и p50/p95/p99 по каждому сценарию; с --baseline
+результат сравнивается с сохранённым, и при регрессии код выхода 1.
+
+Запуск из корня проекта:
+    python -m benchmarks.generate_dataset --rows 100000 --output benchmarks/data/defects-100k.db
+    python -m benchmarks.bench_load --dataset benchmarks/data/defects-100k.db --duration 30 \\
+        --output benchmarks/results/latest.json --baseline benchmarks/baseline.json
+    # новый эталон после подтверждённого улучшения:
+    python -m benchmarks.bench_load --dataset benchmarks/data/defects-100k.db --save-baseline benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.common import latency_summary, prepare_app_environment
+
+# Доли сценариев в смеси запросов
+DEFAULT_MIX = "list=60,update=20,dropdowns=12,create=8"
+SCENARIOS = ("list", "create", "update", "dropdowns")
+# Доля созданий с фотографией и размер фото
+PHOTO_SHARE = 0.3
+PHOTO_SIZE = 256 * 1024
+# Метрики, по которым ищется регрессия (больше — хуже), и пропускная способность (меньше — хуже)
+LATENCY_METRICS = ("p50_ms", "p95_ms", "p99_ms")
+
+def _parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Неизвестный сценарий: {name}")
+        mix[name] = float(weight)
+    return mix
+
+def _photo_base():
+    """Небольшой JPEG (если есть Pillow) или случайные байты нужного размера."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return random.Random(0).randbytes(PHOTO_SIZE)
+    image = Image.effect_noise((1024, 768), 64).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+class LoadDriver:
+    """Исполнитель сценариев: каждый виртуальный пользователь выбирает запросы по весам."""
+
+    def __init__(self, client, mix, seed, lists, max_id):
+        self.client = client
+        self.mix = list(mix.items())
+        self.seed = seed
+        self.lists = lists
+        self.max_id = max_id
+        self.photo = _photo_base()
+        self.samples = {name: [] for name in SCENARIOS}
+        self.errors = {name: 0 for name in SCENARIOS}
+
+    def _choose(self, rnd):
+        point = rnd.uniform(0, sum(weight for _, weight in self.mix))
+        for name, weight in self.mix:
+            point -= weight
+            if point <= 0:
+                return name
+        return self.mix[-1][0]
+
+    async def _list(self, rnd, state):
+        params = {"limit": rnd.choice((50, 50, 200)), "order": "desc"}
+        filters = rnd.choice((
+            (), ("section",), ("status",), ("section", "status"),
+            ("assigned_to", "status"), ("danger_level",), ("recent",),
+        ))
+        if "section" in filters:
+            params["section"] = rnd.choice(self.lists["sections"])
+        if "status" in filters:
+            params["status"] = rnd.choice(("новый", "в работе", "завершён"))
+        if "assigned_to" in filters:
+            params["assigned_to"] = rnd.choice(self.lists["executors"])
+        if "danger_level" in filters:
+            params["danger_level"] = rnd.choice(("низкий", "средний", "высокий"))
+        if "recent" in filters:
+            params["time_found_from"] = int(time.time()) - 7 * 86400
+        response = await self.client.get("/defects/", params=params)
+        body = await response.aread()
+        # Иногда пользователь листает на следующую страницу
+        if response.status_code == 200 and rnd.random() < 0.2:
+            next_after = json.loads(body).get("next_after")
+            if next_after:
+                response = await self.client.get("/defects/", params={**params, "after": next_after})
+                await response.aread()
+        return response
+
+    async def _create(self, rnd, state):
+        data = {
+            "equipment": rnd.choice(self.lists["equipment"]),
+            "description": f"Нагрузочный тест: течь уплотнения {rnd.randrange(10 ** 6)}",
+            "section": rnd.choice(self.lists["sections"]),
+            "danger_level": rnd.choice(("низкий", "средний", "высокий")),
+            "responsible": rnd.choice(self.lists["responsibles"]) if rnd.random() < 0.5 else "",
+        }
+        files = None
+        if rnd.random() < PHOTO_SHARE:
+            # Хвост после конца JPEG делает каждое фото уникальным (без дедупликации)
+            payload = self.photo + rnd.randbytes(16)
+            files = {"photo": ("photo.jpg", payload, "image/jpeg")}
+        return await self.client.post("/defects/", data=data, files=files)
+
+    async def _update(self, rnd, state):
+        defect_id = rnd.randint(1, self.max_id)
+        status = rnd.choice(("в работе", "завершён"))
+        update = {"status": status}
+        if status == "в работе":
+            update["assigned_to"] = rnd.choice(self.lists["executors"])
+        return await self.client.put(f"/defects/{defect_id}", json=update)
+
+    async def _dropdowns(self, rnd, state):
+        # Браузер перепроверяет списки по ETag
+        headers = {"If-None-Match": state["dropdowns_etag"]} if state.get("dropdowns_etag") else {}
+        response = await self.client.get("/dropdown-lists/", headers=headers)
+        await response.aread()
+        if response.status_code == 200:
+            state["dropdowns_etag"] = response.headers.get("etag")
+        return response
+
+    async def _user(self, number, deadline):
+        rnd = random.Random(self.seed * 1000 + number)
+        state = {}
+        while time.perf_counter() < deadline:
+            scenario = self._choose(rnd)
+            started = time.perf_counter()
+            try:
+                response = await getattr(self, f"_{scenario}")(rnd, state)
+                failed = response.status_code >= 400
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"{scenario}: {e}")
+                failed = True
+            self.samples[scenario].append((time.perf_counter() - started) * 1000)
+            if failed:
+                self.errors[scenario] += 1
+
+    async def run(self, concurrency, duration):
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(*(self._user(number, deadline) for number in range(concurrency)))
+        return time.perf_counter() - started
+
+    def report(self, elapsed):
+        scenarios = {}
+        for name in SCENARIOS:
+            samples = self.samples[name]
+            if not samples:
+                continue
+            scenarios[name] = {
+                "requests": len(samples),
+                "errors": self.errors[name],
+                "throughput_rps": round(len(samples) / elapsed, 2),
+                **latency_summary(samples),
+            }
+        everything = [sample for samples in self.samples.values() for sample in samples]
+        total = {
+            "requests": len(everything),
+            "errors": sum(self.errors.values()),
+            "throughput_rps": round(len(everything) / elapsed, 2),
+            **latency_summary(everything),
+        }
+        return {"scenarios": scenarios, "total": total}
+
+async def _discover(client):
+    """Имена из списков выбора и наибольший id дефекта — для параметров запросов."""
+    response = await client.get("/dropdown-lists/")
+    response.raise_for_status()
+    lists = response.json()
+    for name in ("equipment", "sections", "executors", "responsibles"):
+        if not lists.get(name):
+            raise RuntimeError(f"Список {name} пуст: сначала заполните БД (generate_dataset)")
+    response = await client.get("/defects/", params={"limit": 1, "order": "desc"})
+    response.raise_for_status()
+    items = response.json()["items"]
+    return lists, (items[0]["id"] if items else 1)
+
+async def _run(args, mix, base_url, app):
+    import httpx
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    transport = httpx.ASGITransport(app=app) if app is not None else None
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=60, limits=limits) as client:
+        lists, max_id = await _discover(client)
+        driver = LoadDriver(client, mix, args.seed, lists, max_id)
+        if args.warmup > 0:
+            await driver.run(args.concurrency, args.warmup)
+            driver = LoadDriver(client, mix, args.seed, lists, max_id)
+        elapsed = await driver.run(args.concurrency, args.duration)
+    return driver.report(elapsed), max_id
+
+def compare(result, baseline, tolerance):
+    """Сравнение с эталоном: список найденных регрессий (пустой — всё в норме)."""
+    regressions = []
+    for name, base in baseline.get("scenarios", {}).items():
+        current = result["scenarios"].get(name)
+        if current is None:
+            regressions.append(f"{name}: сценарий не выполнялся")
+            continue
+        for metric in LATENCY_METRICS:
+            if base.get(metric) and current[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}.{metric}: {current[metric]} > {base[metric]} (+{tolerance:.0%})")
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name}.throughput_rps: {current['throughput_rps']} < {base['throughput_rps']} (-{tolerance:.0%})"
+            )
+        if current["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}.errors: {current['errors']} > {base.get('errors', 0)}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dataset", help="БД, созданная generate_dataset (копируется во временный каталог)")
+    parser.add_argument("--url", help="адрес запущенного сервера вместо запуска приложения в процессе")
+    parser.add_argument("--duration", type=float, default=30.0, help="длительность замера, с")
+    parser.add_argument("--warmup", type=float, default=3.0, help="прогрев перед замером, с")
+    parser.add_argument("--concurrency", type=int, default=16, help="число виртуальных пользователей")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"доли сценариев (по умолчанию {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="файл для JSON-результата (по умолчанию только вывод)")
+    parser.add_argument("--baseline", help="эталонный результат для сравнения")
+    parser.add_argument("--save-baseline", metavar="PATH", help="сохранить результат как эталон")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимое ухудшение (доля)")
+    args = parser.parse_args()
+    if not args.dataset and not args.url:
+        parser.error("нужен --dataset (запуск в процессе) или --url")
+    mix = _parse_mix(args.mix)
+
+    # Пути к файлам результата — относительно каталога запуска
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    save_baseline = os.path.abspath(args.save_baseline) if args.save_baseline else None
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        app = None
+        base_url = args.url
+        if not args.url:
+            database_path = os.path.join(workdir, "load.db")
+            shutil.copyfile(args.dataset, database_path)
+            prepare_app_environment(workdir, database_path)
+            logging.disable(logging.WARNING)
+            from app.core.init_db import init_db
+            from app.main import app
+            # Lifespan (а с ним и проверка схемы) в ASGI-транспорте не запускается
+            init_db()
+            base_url = "http://load-test"
+        try:
+            report, max_id = asyncio.run(_run(args, mix, base_url, app))
+        finally:
+            if app is not None:
+                from app.db_async import db_executor
+                from app.photo_storage import thumbnail_worker
+                thumbnail_worker.shutdown()
+                db_executor.shutdown()
+            os.chdir(cwd)
+
+    result = {
+        "meta": {
+            "target": args.url or "in-process",
+            "dataset": os.path.basename(args.dataset) if args.dataset else None,
+            "defects": max_id,
+            "duration_s": args.duration,
+            "concurrency": args.concurrency,
+            "mix": mix,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        **report,
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    print(text)
+    for path in (output, save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print("Регрессии относительно эталона:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            sys.exit(1)
+        print("Регрессий относительно эталона нет.", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
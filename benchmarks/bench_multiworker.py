@@ -0,0 +1,212 @@
+# benchmarks/bench_multiworker.py
+"""
+Проверка запуска с несколькими воркерами (uvicorn --workers N) на одной БД.
+
+Сервер запускается во временном каталоге с новой БД, так что все воркеры
+одновременно выполняют init_db. Затем несколько потоков параллельно
+создают и меняют дефекты, а клиент SSE, подключённый к одному из
+воркеров, собирает события. Проверяется:
+
+    * миграции применены один раз, схема актуальна;
+    * ни одна запись не завершилась ошибкой ("database is locked");
+    * в БД ровно созданные дефекты;
+    * SSE получил события обо всех дефектах, в том числе созданных
+      другими воркерами;
+    * фоновые задачи (архивирование) выполняет ровно один воркер, а после
+      его аварийного завершения их берёт на себя другой.
+
+Код выхода 1, если хотя бы одна проверка не прошла.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_multiworker --workers 4 --threads 8 --defects 400
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+from benchmarks.common import PROJECT_ROOT
+
+LEADER_RE = re.compile(r"\[Leader\] Процесс (\d+) стал ведущим")
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_ready(base_url, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/defects/?limit=1", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit("Сервер не запустился (см. server.log)")
+
+def _leaders(log_path):
+    with open(log_path, encoding="utf-8", errors="replace") as f:
+        return [int(pid) for pid in LEADER_RE.findall(f.read())]
+
+def _collect_events(base_url, seen, stop):
+    """Клиент SSE: собирает id дефектов из событий, пока не выставлен stop."""
+    try:
+        with httpx.Client(timeout=httpx.Timeout(5.0, read=None)) as client:
+            with client.stream("GET", f"{base_url}/events/defects") as response:
+                for line in response.iter_lines():
+                    if line.startswith("data: "):
+                        seen.add(json.loads(line[6:])["defect"]["id"])
+                    if stop.is_set():
+                        return
+    except httpx.HTTPError:
+        # Воркер остановлен (проверка смены ведущего)
+        pass
+
+def _writer(base_url, count, prefix, created, errors):
+    # Без keep-alive: каждый запрос принимает любой из воркеров
+    with httpx.Client(timeout=30, limits=httpx.Limits(max_keepalive_connections=0)) as client:
+        for i in range(count):
+            try:
+                response = client.post(f"{base_url}/defects/", data={
+                    "equipment": f"Насос {i % 7}",
+                    "description": f"{prefix}-{i}",
+                    "section": f"Цех {i % 3}",
+                    "danger_level": "средний",
+                })
+                if response.status_code != 200:
+                    errors.append(f"POST {response.status_code}: {response.text[:200]}")
+                    continue
+                defect_id = response.json()["id"]
+                created.append(defect_id)
+                response = client.put(f"{base_url}/defects/{defect_id}", json={"status": "в работе"})
+                if response.status_code != 200:
+                    errors.append(f"PUT {response.status_code}: {response.text[:200]}")
+            except httpx.HTTPError as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8, help="параллельных клиентов записи")
+    parser.add_argument("--defects", type=int, default=400, help="всего создаваемых дефектов")
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as workdir:
+        os.symlink(os.path.join(PROJECT_ROOT, "app"), os.path.join(workdir, "app"))
+        shutil.copytree(os.path.join(PROJECT_ROOT, "frontend"), os.path.join(workdir, "frontend"))
+        os.makedirs(os.path.join(workdir, "frontend", "static"), exist_ok=True)
+        database_path = os.path.join(workdir, "multi.db")
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        env = dict(
+            os.environ,
+            DATABASE_PATH=database_path,
+            TELEGRAM_BOT_TOKEN="",
+            # Архивирование — фоновая задача ведущего воркера
+            ARCHIVE_AFTER_DAYS="30",
+            LEADER_RETRY_SECONDS="0.5",
+            PYTHONPATH=workdir,
+        )
+        log_path = os.path.join(workdir, "server.log")
+        with open(log_path, "w", encoding="utf-8") as log:
+            server = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+                 "--workers", str(args.workers)],
+                cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+            )
+        try:
+            _wait_ready(base_url)
+            time.sleep(1.0)
+
+            # Миграции: каждая применена один раз
+            with open(log_path, encoding="utf-8", errors="replace") as f:
+                applied = f.read().count("Применение миграции 1:")
+            if applied != 1:
+                failures.append(f"миграция 1 применена {applied} раз")
+
+            leaders = _leaders(log_path)
+            if len(leaders) != 1:
+                failures.append(f"ведущих воркеров {len(leaders)} вместо 1: {leaders}")
+
+            # SSE-клиенты (попадают на разные воркеры): каждый должен получить
+            # события и о дефектах, созданных другими воркерами
+            seen_sets = [set() for _ in range(args.workers)]
+            stop = threading.Event()
+            listeners = [threading.Thread(target=_collect_events, args=(base_url, seen, stop), daemon=True)
+                         for seen in seen_sets]
+            for listener in listeners:
+                listener.start()
+            time.sleep(2.0)
+
+            created, errors = [], []
+            per_thread = args.defects // args.threads
+            started = time.perf_counter()
+            writers = [threading.Thread(target=_writer, args=(base_url, per_thread, f"t{n}", created, errors))
+                       for n in range(args.threads)]
+            for writer in writers:
+                writer.start()
+            for writer in writers:
+                writer.join()
+            seconds = time.perf_counter() - started
+            print(f"Создано {len(created)} дефектов (и столько же изменений) за {seconds:.1f} с, "
+                  f"ошибок записи: {len(errors)}")
+            failures.extend(f"ошибка записи: {error}" for error in errors[:10])
+
+            conn = sqlite3.connect(database_path)
+            stored = conn.execute("SELECT COUNT(*) FROM defects").fetchone()[0]
+            in_work = conn.execute("SELECT COUNT(*) FROM defects WHERE status = 'в работе'").fetchone()[0]
+            conn.close()
+            if stored != len(created) or in_work != len(created):
+                failures.append(f"в БД {stored} дефектов ({in_work} в работе), создано {len(created)}")
+
+            deadline = time.time() + 10
+            while time.time() < deadline and not all(set(created) <= seen for seen in seen_sets):
+                time.sleep(0.2)
+            stop.set()
+            received = [len(seen & set(created)) for seen in seen_sets]
+            print(f"SSE: клиенты получили события о {received} из {len(created)} дефектов")
+            if min(received) != len(created):
+                failures.append(f"SSE-клиенты получили не все события: {received} из {len(created)}")
+
+            # Аварийное завершение ведущего: задачи переходят к другому воркеру
+            if leaders:
+                os.kill(leaders[0], signal.SIGKILL)
+                deadline = time.time() + 10
+                while time.time() < deadline and len(_leaders(log_path)) < 2:
+                    time.sleep(0.2)
+                new_leaders = _leaders(log_path)[1:]
+                print(f"Ведущий {leaders[0]} остановлен, новый ведущий: {new_leaders}")
+                if len(new_leaders) != 1:
+                    failures.append(f"после остановки ведущего новых ведущих {len(new_leaders)}")
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                server.kill()
+            if failures:
+                with open(log_path, encoding="utf-8", errors="replace") as f:
+                    print(f.read()[-4000:])
+
+    if failures:
+        print("Проверки не пройдены:")
+        for failure in failures:
+            print(f"  * {failure}")
+        sys.exit(1)
+    print("Все проверки пройдены.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# benchmarks/bench_row_materialization.py
+"""
+Сравнение материализации строк списка дефектов: старый формат (текстовое
+время и расчёт resolution_time в Python для каждой строки) против нового
+(время в секундах Unix, длительность считается в SELECT).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_row_materialization --rows 100000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+def _old_materialize(db_path):
+    """Копия прежней реализации get_all_defects (до перехода на целые секунды)."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    c = conn.cursor()
+    c.execute("SELECT * FROM defects WHERE 1=1")
+    rows = c.fetchall()
+    conn.close()
+
+    defects = []
+    for row in rows:
+        resolution_time = ""
+        if row['time_started'] and row['time_completed']:
+            try:
+                from datetime import datetime
+                start_time = datetime.strptime(row['time_started'], "%Y-%m-%d %H:%M:%S")
+                end_time = datetime.strptime(row['time_completed'], "%Y-%m-%d %H:%M:%S")
+                diff = end_time - start_time
+                hours = diff.total_seconds() / 3600
+                resolution_time = f"{hours:.1f} ч"
+            except Exception:
+                resolution_time = "Ошибка"
+        elif row['time_started']:
+            try:
+                from datetime import datetime
+                start_time = datetime.strptime(row['time_started'], "%Y-%m-%d %H:%M:%S")
+                now = datetime.now()
+                diff = now - start_time
+                hours = diff.total_seconds() / 3600
+                resolution_time = f"{hours:.1f} ч (в работе)"
+            except Exception:
+                resolution_time = "Ошибка"
+        defects.append({
+            "id": row['id'],
+            "equipment": row['equipment'],
+            "description": row['description'],
+            "section": row['section'],
+            "time_found": row['time_found'],
+            "danger_level": row['danger_level'],
+            "status": row['status'],
+            "assigned_to": row['assigned_to'],
+            "responsible": row['responsible'],
+            "time_started": row['time_started'],
+            "time_completed": row['time_completed'],
+            "resolution_time": resolution_time,
+            "photo_url": row['photo_url']
+        })
+    return defects
+
+def _generate_rows(count, seed):
+    """Строки дефектов: (время обнаружения, начала, завершения) в секундах Unix."""
+    rnd = random.Random(seed)
+    now = int(time.time())
+    rows = []
+    for i in range(count):
+        found = now - rnd.randint(0, 3 * 365 * 86400)
+        status = rnd.choice(["новый", "в работе", "завершён", "завершён", "завершён"])
+        started = found + rnd.randint(60, 86400) if status != "новый" else None
+        completed = started + rnd.randint(600, 5 * 86400) if status == "завершён" else None
+        rows.append((f"Линия {i % 7}", f"Дефект {i}", "Фасовка", found, "средний", status,
+                     "Шуев" if started else None, "Овчинников", started, completed))
+    return rows
+
+def _as_text(ts):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)) if ts is not None else None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="defects-bench-")
+    old_db = os.path.join(workdir, "old.db")
+    new_db = os.path.join(workdir, "new.db")
+    rows = _generate_rows(args.rows, args.seed)
+
+    # Старый формат: текстовое время
+    conn = sqlite3.connect(old_db)
+    conn.execute("""
+        CREATE TABLE defects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, equipment TEXT, description TEXT, section TEXT,
+            time_found TEXT, danger_level TEXT, status TEXT, assigned_to TEXT, responsible TEXT,
+            time_started TEXT, time_completed TEXT, photo_url TEXT
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO defects (equipment, description, section, time_found, danger_level, status, "
+        "assigned_to, responsible, time_started, time_completed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [r[:3] + (_as_text(r[3]),) + r[4:8] + (_as_text(r[8]), _as_text(r[9])) for r in rows]
+    )
+    conn.commit()
+    conn.close()
+
+    # Новый формат: схема приложения со всеми миграциями
+    os.environ["DATABASE_PATH"] = new_db
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app.core.init_db import init_db
+    init_db()
+    from app.database import iter_defects, pool
+    with pool.connection() as conn:
+        # Оборудование, участки и люди — в справочниках, в defects только их id
+        for table, names in (("equipment", {r[0] for r in rows}), ("sections", {r[2] for r in rows}),
+                             ("people", {r[6] for r in rows if r[6]} | {r[7] for r in rows})):
+            conn.executemany(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", [(name,) for name in names])
+        conn.executemany(
+            "INSERT INTO defects (equipment_id, description, section_id, time_found, danger_level, status, "
+            "assigned_to_id, responsible_id, time_started, time_completed) VALUES ("
+            "(SELECT id FROM equipment WHERE name = ?), ?, (SELECT id FROM sections WHERE name = ?), ?, ?, ?, "
+            "(SELECT id FROM people WHERE name = ?), (SELECT id FROM people WHERE name = ?), ?, ?)",
+            rows
+        )
+        conn.commit()
+
+    def best_of(fn):
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = fn()
+            timings.append(time.perf_counter() - started)
+            assert len(result) == args.rows
+        return min(timings)
+
+    old_time = best_of(lambda: _old_materialize(old_db))
+    new_time = best_of(lambda: list(iter_defects()))
+    print(f"Строк: {args.rows}")
+    print(f"Старый формат (strptime в Python): {old_time * 1000:.0f} мс")
+    print(f"Новый формат (секунды в SELECT):   {new_time * 1000:.0f} мс")
+    print(f"Ускорение: {old_time / new_time:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/bench_startup.py
+"""
+Время запуска приложения: импорт app.main и старт lifespan (проверка схемы
+БД, диспетчер уведомлений) в новом процессе — как при холодном старте и при
+каждом перезапуске uvicorn --reload.
+
+Каждый запуск — отдельный интерпретатор. Первый запуск создаёт схему,
+остальные идут по актуальной схеме (обычный случай). С --token
+указывается (фиктивный) токен бота: проверяется, что библиотека Telegram
+не импортируется до первой отправки.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_startup --runs 10
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.common import PROJECT_ROOT
+
+# Выполняется в дочернем процессе (в рабочем каталоге приложения)
+CHILD = r'''
+import asyncio, json, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+
+async def start():
+    async with app.main.lifespan(app.main.app):
+        return time.perf_counter()
+
+ready = asyncio.run(start())
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "lifespan_ms": (ready - imported) * 1000,
+    "total_ms": (ready - started) * 1000,
+    "telegram_imported": "telegram" in sys.modules,
+}))
+'''
+
+def _run_once(workdir, env):
+    result = subprocess.run([sys.executable, "-c", CHILD], cwd=workdir, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(f"Запуск завершился с ошибкой:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--token", action="store_true", help="запуск с токеном бота")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.symlink(os.path.join(PROJECT_ROOT, "app"), os.path.join(workdir, "app"))
+        shutil.copytree(os.path.join(PROJECT_ROOT, "frontend"), os.path.join(workdir, "frontend"))
+        os.makedirs(os.path.join(workdir, "frontend", "static"), exist_ok=True)
+        env = dict(
+            os.environ,
+            DATABASE_PATH=os.path.join(workdir, "bench.db"),
+            TELEGRAM_BOT_TOKEN="123456:bench" if args.token else "",
+            PYTHONPATH=workdir,
+        )
+        first = _run_once(workdir, env)
+        print(f"Первый запуск (создание схемы): {first}")
+        runs = [_run_once(workdir, env) for _ in range(args.runs)]
+
+    for key in ("import_ms", "lifespan_ms", "total_ms"):
+        values = [run[key] for run in runs]
+        print(f"{key}: медиана {statistics.median(values):.1f}, мин {min(values):.1f}, макс {max(values):.1f}")
+    print(f"Библиотека Telegram импортирована при запуске: {any(run['telegram_imported'] for run in runs)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# benchmarks/bench_upload_latency.py
+"""
+Задержка GET /defects/ во время параллельной загрузки крупных фото.
+
+Приложение запускается в этом же процессе (httpx + ASGI-транспорт), поэтому
+любая блокирующая работа в обработчике загрузки сразу видна как рост
+задержки списка дефектов. Сравниваются задержки без загрузок и во время них.
+
+Запуск из корня проекта (нужен httpx):
+    python -m benchmarks.bench_upload_latency --uploads 64 --concurrency 8 --size-mb 8
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.common import latency_summary, prepare_app_environment
+
+async def _measure_list_latency(client, stop, samples):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/defects/", params={"limit": 50})
+        await response.aread()
+        samples.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.01)
+
+async def _upload(client, payload, semaphore):
+    async with semaphore:
+        response = await client.post(
+            "/defects/",
+            data={"equipment": "Насос", "description": "bench", "section": "Цех 1", "danger_level": "Низкий"},
+            files={"photo": ("photo.jpg", payload, "image/jpeg")}
+        )
+        response.raise_for_status()
+
+async def _run(uploads, concurrency, size_mb, baseline_seconds):
+    import httpx
+    from app.core.init_db import init_db
+    from app.main import app
+    # Lifespan в ASGI-транспорте не запускается: схема создаётся явно
+    init_db()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    payload = os.urandom(size_mb * 1024 * 1024)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        # Без загрузок
+        stop = asyncio.Event()
+        baseline = []
+        ticker = asyncio.create_task(_measure_list_latency(client, stop, baseline))
+        await asyncio.sleep(baseline_seconds)
+        stop.set()
+        await ticker
+
+        # Во время параллельных загрузок
+        stop = asyncio.Event()
+        loaded = []
+        ticker = asyncio.create_task(_measure_list_latency(client, stop, loaded))
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(concurrency)
+        await asyncio.gather(*(_upload(client, payload, semaphore) for _ in range(uploads)))
+        upload_seconds = time.perf_counter() - started
+        stop.set()
+        await ticker
+
+    print(f"Загрузок: {uploads} x {size_mb} МБ (по {concurrency} одновременно) за {upload_seconds:.2f} с")
+    print(f"GET /defects/ без загрузок:  {len(baseline)} запросов, {latency_summary(baseline)}")
+    print(f"GET /defects/ во время них: {len(loaded)} запросов, {latency_summary(loaded)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--uploads", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--size-mb", type=int, default=8)
+    parser.add_argument("--baseline-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        prepare_app_environment(workdir)
+        try:
+            asyncio.run(_run(args.uploads, args.concurrency, args.size_mb, args.baseline_seconds))
+        finally:
+            os.chdir(cwd)
+
+if __name__ == "__main__":
+    main()
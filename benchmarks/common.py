@@ -0,0 +1,38 @@
+# benchmarks/common.py
+"""Общие функции бенчмарков: рабочий каталог приложения и перцентили."""
+import math
+import os
+import shutil
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def prepare_app_environment(workdir, database_path=None):
+    """
+    Временный рабочий каталог для запуска приложения в процессе бенчмарка:
+    своя БД и uploads/, копия страниц фронтенда. Рабочие данные не трогаются.
+    Вызывать до импорта модулей app.
+    """
+    os.environ["DATABASE_PATH"] = database_path or os.path.join(workdir, "bench.db")
+    os.environ["TELEGRAM_BOT_TOKEN"] = ""
+    shutil.copytree(os.path.join(PROJECT_ROOT, "frontend"), os.path.join(workdir, "frontend"), dirs_exist_ok=True)
+    os.makedirs(os.path.join(workdir, "frontend", "static"), exist_ok=True)
+    os.chdir(workdir)
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+
+def percentile(ordered, fraction):
+    """Перцентиль по рангу (nearest-rank) для отсортированного списка."""
+    return ordered[max(0, math.ceil(len(ordered) * fraction) - 1)]
+
+def latency_summary(samples_ms):
+    """p50/p95/p99 и максимум задержек в миллисекундах."""
+    if not samples_ms:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    ordered = sorted(samples_ms)
+    return {
+        "p50_ms": round(percentile(ordered, 0.50), 2),
+        "p95_ms": round(percentile(ordered, 0.95), 2),
+        "p99_ms": round(percentile(ordered, 0.99), 2),
+        "max_ms": round(ordered[-1], 2),
+    }
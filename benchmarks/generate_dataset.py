@@ -0,0 +1,168 @@
+# benchmarks/generate_dataset.py
+"""
+Генератор синтетической БД дефектов для бенчмарков и нагрузочных тестов.
+
+Схема создаётся init_db (все миграции), дефекты распределяются по
+участкам, оборудованию и людям из стандартных списков init_db. Данные
+детерминированы: одинаковые --seed и --end дают одинаковую БД. Дефекты
+проходят через те же триггеры, что и в приложении (версии строк,
+полнотекстовый поиск, статистика).
+
+Распределения:
+    * время обнаружения — равномерно за --days дней до --end;
+    * опасность — низкий 50 %, средний 35 %, высокий 15 %;
+    * статус зависит от возраста дефекта: свежие чаще новые и в работе,
+      старые в основном завершены;
+    * начало работ — через экспоненциальную задержку (в среднем 4 ч),
+      длительность устранения — логнормальная (медиана около 10 ч).
+
+Запуск из корня проекта:
+    python -m benchmarks.generate_dataset --rows 100000 --output benchmarks/data/defects-100k.db
+"""
+import argparse
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks.common import PROJECT_ROOT
+
+DANGER_WEIGHTS = (("низкий", 50), ("средний", 35), ("высокий", 15))
+DEFECT_KINDS = (
+    "Течь", "Вибрация", "Повышенный шум", "Перегрев", "Износ", "Трещина",
+    "Коррозия", "Засор", "Падение давления", "Неисправность",
+)
+DEFECT_PARTS = (
+    "уплотнения вала", "подшипника", "фланцевого соединения", "датчика температуры",
+    "привода", "задвижки", "трубопровода", "ленты конвейера", "электродвигателя",
+    "манометра", "насоса дозатора", "теплообменника",
+)
+DEFECT_DETAILS = (
+    "", "требуется замена", "обнаружено при обходе", "повторно", "со слов оператора",
+    "ограничена производительность", "остановка линии", "временно устранено",
+)
+INSERT_BATCH_ROWS = 10000
+
+def _weighted(rnd, weights):
+    total = sum(weight for _, weight in weights)
+    point = rnd.uniform(0, total)
+    for value, weight in weights:
+        point -= weight
+        if point <= 0:
+            return value
+    return weights[-1][0]
+
+def _status(rnd, age_days):
+    if age_days < 2:
+        weights = (("новый", 55), ("в работе", 35), ("завершён", 10))
+    elif age_days < 14:
+        weights = (("новый", 15), ("в работе", 30), ("завершён", 55))
+    else:
+        weights = (("новый", 3), ("в работе", 7), ("завершён", 90))
+    return _weighted(rnd, weights)
+
+def _description(rnd, number):
+    detail = rnd.choice(DEFECT_DETAILS)
+    text = f"{rnd.choice(DEFECT_KINDS)} {rnd.choice(DEFECT_PARTS)}"
+    return f"{text}, {detail} (обход № {number})" if detail else f"{text} (обход № {number})"
+
+def _reference_ids(conn, table, flag):
+    return [row[0] for row in conn.execute(f"SELECT id FROM {table} WHERE {flag} = 1 ORDER BY id")]
+
+def generate_rows(rnd, rows, end, days, equipment, sections, executors, responsibles):
+    """Строки defects (кортежи для INSERT) в порядке времени обнаружения."""
+    span = days * 86400
+    start = end - span
+    for i in range(rows):
+        time_found = start + int((i + rnd.random()) * span / rows)
+        age_days = (end - time_found) / 86400
+        status = _status(rnd, age_days)
+        time_started = time_completed = None
+        assigned_to = rnd.choice(executors) if rnd.random() < 0.2 else None
+        if status != "новый":
+            assigned_to = rnd.choice(executors)
+            time_started = min(end, time_found + int(rnd.expovariate(1 / (4 * 3600))))
+            if status == "завершён":
+                duration = int(math.exp(rnd.gauss(math.log(10 * 3600), 1.0)))
+                time_completed = min(end, time_started + duration)
+        responsible = rnd.choice(responsibles) if rnd.random() < 0.7 else None
+        yield (
+            rnd.choice(equipment), _description(rnd, i + 1), rnd.choice(sections), time_found,
+            _weighted(rnd, DANGER_WEIGHTS), status, assigned_to, responsible, time_started, time_completed
+        )
+
+def generate(output, rows, seed, days, end):
+    os.environ["DATABASE_PATH"] = output
+    if PROJECT_ROOT not in sys.path:
+        sys.path.insert(0, PROJECT_ROOT)
+    from app.core.init_db import init_db
+    init_db()
+
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(output)
+    # Генерация: надёжность записи не нужна, нужна скорость
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -262144")
+    equipment = _reference_ids(conn, "equipment", "active")
+    sections = _reference_ids(conn, "sections", "active")
+    executors = _reference_ids(conn, "people", "is_executor")
+    responsibles = _reference_ids(conn, "people", "is_responsible")
+
+    # Все люди из списков подписаны на уведомления
+    conn.executemany(
+        "INSERT OR IGNORE INTO users (name, telegram_id) SELECT name, ? FROM people WHERE id = ?",
+        [(str(100000000 + person_id), person_id) for person_id in sorted(set(executors + responsibles))]
+    )
+    conn.commit()
+
+    started = time.perf_counter()
+    source = generate_rows(rnd, rows, end, days, equipment, sections, executors, responsibles)
+    inserted = 0
+    while inserted < rows:
+        batch = [row for _, row in zip(range(INSERT_BATCH_ROWS), source)]
+        conn.executemany('''
+            INSERT INTO defects (equipment_id, description, section_id, time_found, danger_level,
+                                 status, assigned_to_id, responsible_id, time_started, time_completed)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', batch)
+        conn.commit()
+        inserted += len(batch)
+        elapsed = time.perf_counter() - started
+        print(f"\r{inserted}/{rows} строк, {inserted / elapsed:.0f} строк/с", end="", flush=True)
+    print()
+    conn.execute("PRAGMA optimize")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000, help="число дефектов (например 10000, 100000, 1000000)")
+    parser.add_argument("--output", required=True, help="путь к создаваемой БД")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--days", type=int, default=730, help="за сколько дней распределены дефекты")
+    parser.add_argument("--end", default=None,
+                        help="дата ГГГГ-ММ-ДД (UTC), до полуночи которой идут дефекты; по умолчанию сегодня")
+    parser.add_argument("--force", action="store_true", help="перезаписать существующий файл")
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        if not args.force:
+            parser.error(f"{args.output} уже существует (используйте --force)")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.output + suffix):
+                os.remove(args.output + suffix)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+
+    end_date = (datetime.strptime(args.end, "%Y-%m-%d") if args.end
+                else datetime.now(timezone.utc).replace(tzinfo=None))
+    end = int(end_date.replace(hour=0, minute=0, second=0, microsecond=0,
+                               tzinfo=timezone.utc).timestamp())
+    # Последний дефект — перед полуночью UTC даты --end
+    generate(args.output, args.rows, args.seed, args.days, end)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# tests/conftest.py
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Настройки читаются при импорте app.core.config, поэтому временная БД
+# задаётся до импорта приложения: тесты не трогают рабочую defects.db.
+# Рабочий каталог тоже временный: свои uploads/ и копия страниц фронтенда
+_workdir = tempfile.mkdtemp(prefix="defects-tests-")
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ["DATABASE_PATH"] = os.path.join(_workdir, "test.db")
+os.environ["TELEGRAM_BOT_TOKEN"] = ""
+shutil.copytree(os.path.join(PROJECT_ROOT, "frontend"), os.path.join(_workdir, "frontend"))
+os.makedirs(os.path.join(_workdir, "frontend", "static"), exist_ok=True)
+os.chdir(_workdir)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+@pytest.fixture
+def client():
+    """Клиент приложения; lifespan (схема БД, фоновые задачи) выполняется на время теста."""
+    from fastapi.testclient import TestClient
+    from app.main import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def new_defect(client):
+    """Создание дефекта через API; возвращает его id."""
+    def create(**fields) -> int:
+        data = {
+            "equipment": "Насос 1",
+            "description": "Течь сальника",
+            "section": "Цех 1",
+            "danger_level": "средний",
+        }
+        data.update(fields)
+        response = client.post("/defects/", data=data)
+        assert response.status_code == 200, response.text
+        return response.json()["id"]
+    return create
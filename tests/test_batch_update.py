@@ -0,0 +1,81 @@
+# tests/test_batch_update.py
+import json
+
+from app.api import defects as defects_api
+from app.database import DIGEST_ROLE, db_connection, get_defect_item
+
+def _max_outbox_id():
+    with db_connection() as conn:
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM outbox").fetchone()[0]
+
+def _outbox_since(outbox_id):
+    """Уведомления outbox после outbox_id: {получатель: (роль, payload)}."""
+    with db_connection() as conn:
+        rows = conn.execute("SELECT recipient, role, payload FROM outbox WHERE id > ?", (outbox_id,)).fetchall()
+    return {row['recipient']: (row['role'], json.loads(row['payload'])) for row in rows}
+
+def test_batch_reports_each_item(client, new_defect):
+    updated_id, stale_id, other_id = new_defect(), new_defect(), new_defect()
+    client.put(f"/defects/{stale_id}", json={"status": "в работе"})
+
+    response = client.patch("/defects/batch", json={"items": [
+        {"id": updated_id, "status": "в работе"},
+        {"id": stale_id, "status": "завершён", "assigned_to": "Пакетов", "version": 1},
+        {"id": 999999, "status": "в работе"},
+        {"id": other_id, "description": "нельзя"},
+        {"status": "в работе"},
+        {"id": other_id, "status": "в работе", "version": "1"},
+        {"id": other_id},
+    ]})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["updated"] == 1
+    assert [(result["id"], result["result"]) for result in body["results"]] == [
+        (updated_id, "updated"),
+        (stale_id, "conflict"),
+        (999999, "not_found"),
+        (other_id, "invalid"),
+        (None, "invalid"),
+        (other_id, "invalid"),
+        (other_id, "invalid"),
+    ]
+    assert body["results"][0]["version"] == 2
+    assert body["results"][1]["version"] == 2
+
+    updated = get_defect_item(updated_id)
+    assert updated["status"] == "в работе" and updated["time_started"] is not None
+    # Элемент с конфликтом не применён, имя из него не осталось в справочнике
+    assert get_defect_item(stale_id)["status"] == "в работе"
+    assert get_defect_item(other_id)["version"] == 1
+    with db_connection() as conn:
+        assert conn.execute("SELECT id FROM people WHERE name = 'Пакетов'").fetchone() is None
+
+def test_batch_sends_one_digest_per_recipient(client, new_defect, monkeypatch):
+    monkeypatch.setattr(defects_api, "notifications_enabled", lambda: True)
+    first, second, third = new_defect(), new_defect(), new_defect()
+    stale = new_defect()
+    client.put(f"/defects/{stale}", json={"status": "в работе"})
+    outbox_id = _max_outbox_id()
+
+    response = client.patch("/defects/batch", json={"items": [
+        {"id": first, "assigned_to": "Сводкин"},
+        {"id": second, "assigned_to": "Сводкин", "responsible": "Одиночкин"},
+        {"id": third, "responsible": "Сводкин"},
+        {"id": stale, "assigned_to": "Сводкин", "version": 1},
+    ]})
+    assert response.json()["updated"] == 3
+
+    sent = _outbox_since(outbox_id)
+    assert set(sent) == {"Сводкин", "Одиночкин"}
+    role, payload = sent["Сводкин"]
+    assert role == DIGEST_ROLE
+    assert [(item["defect"]["id"], item["role"]) for item in payload["items"]] == [
+        (first, "executor"), (second, "executor"), (third, "responsible")
+    ]
+    role, payload = sent["Одиночкин"]
+    assert role == "responsible" and payload["id"] == second
+
+def test_batch_rejects_empty_and_oversized_requests(client):
+    assert client.patch("/defects/batch", json={"items": []}).status_code == 422
+    items = [{"id": 1, "status": "в работе"}] * (defects_api.MAX_BATCH_ITEMS + 1)
+    assert client.patch("/defects/batch", json={"items": items}).status_code == 422
@@ -0,0 +1,57 @@
+# tests/test_db_pool.py
+import time
+
+import pytest
+
+from app.core.db_pool import ConnectionPool, PoolTimeout
+from app.database import FETCH_BATCH_SIZE, create_defect_in_tx, iter_defect_rows, pool
+from app.db_async import db_executor
+
+def test_acquire_times_out_when_pool_is_busy(tmp_path):
+    """Занятый пул не ждёт бесконечно: через acquire_timeout — PoolTimeout."""
+    small_pool = ConnectionPool(
+        str(tmp_path / "pool.db"), max_size=1, busy_timeout_ms=100, mmap_size=0, cached_statements=16,
+        acquire_timeout=0.1
+    )
+    with small_pool.connection():
+        started = time.perf_counter()
+        with pytest.raises(PoolTimeout):
+            small_pool.acquire()
+        assert time.perf_counter() - started < 1
+    assert small_pool.stats()["timeouts"] == 1
+    small_pool.close_all()
+
+def test_pool_timeout_returns_503(client, monkeypatch):
+    """Нет свободного соединения — ответ 503 с Retry-After, а не зависший запрос."""
+    def busy():
+        raise PoolTimeout("занято")
+    monkeypatch.setattr(pool, "acquire", busy)
+    response = client.get("/defects/")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+def _create_defects(c, count):
+    for number in range(count):
+        create_defect_in_tx(c, {
+            "equipment": "Насос 1", "description": f"Дефект {number}", "section": "Цех 1",
+            "time_found": int(time.time()), "danger_level": "средний", "responsible": None, "photo_url": None
+        })
+
+def test_streamed_list_does_not_hold_connection(client):
+    """Между страницами потокового чтения соединение возвращено в пул."""
+    db_executor.submit_write(_create_defects, FETCH_BATCH_SIZE + 1).result(timeout=10)
+    rows = iter_defect_rows()
+    next(rows)
+    stats = pool.stats()
+    assert stats["idle"] == stats["size"]
+    assert len(list(rows)) >= FETCH_BATCH_SIZE
+
+def test_writer_does_not_wait_for_pool(client):
+    """Поток-писатель пишет через своё соединение, даже когда пул исчерпан."""
+    held = [pool.acquire() for _ in range(pool.max_size)]
+    try:
+        future = db_executor.submit_write(lambda c: c.execute("SELECT 1").fetchone()[0])
+        assert future.result(timeout=5) == 1
+    finally:
+        for conn in held:
+            pool.release(conn)
@@ -0,0 +1,75 @@
+# tests/test_defect_stats.py
+import sqlite3
+
+import pytest
+
+from app.core import init_db as schema
+
+def _resolved_defect(client, new_defect, equipment, seconds):
+    defect_id = new_defect(equipment=equipment)
+    response = client.put(
+        f"/defects/{defect_id}", json={"time_started": 1_700_000_000, "time_completed": 1_700_000_000 + seconds}
+    )
+    assert response.status_code == 200
+
+def _equipment_stats(client, equipment):
+    groups = client.get("/defects/stats", params={"group_by": "equipment"}).json()["groups"]["equipment"]
+    return next(group for group in groups if group["name"] == equipment)
+
+def test_p90_of_instant_resolution_is_zero(client, new_defect):
+    _resolved_defect(client, new_defect, "Стенд мгновенный", 0)
+    stats = _equipment_stats(client, "Стенд мгновенный")
+    assert stats["mttr_seconds"] == 0
+    assert stats["p90_seconds"] == 0
+
+@pytest.mark.parametrize("durations, expected_p90", [
+    ((60, 120, 4000), 4000),
+    ((7200,), 7200),
+    # Последняя корзина не ограничена сверху
+    ((9_000_000, 9_000_000), 9_000_000),
+])
+def test_p90_stays_within_observed_values(client, new_defect, durations, expected_p90):
+    equipment = f"Стенд {'-'.join(map(str, durations))}"
+    for seconds in durations:
+        _resolved_defect(client, new_defect, equipment, seconds)
+    stats = _equipment_stats(client, equipment)
+    assert stats["mttr_seconds"] == pytest.approx(sum(durations) / len(durations))
+    assert stats["p90_seconds"] == pytest.approx(expected_p90)
+    assert min(durations) <= stats["p90_seconds"] <= max(durations)
+
+def test_p90_follows_changed_resolution(client, new_defect):
+    defect_id = new_defect(equipment="Стенд исправленный")
+    client.put(f"/defects/{defect_id}", json={"time_started": 1_700_000_000, "time_completed": 1_700_000_100})
+    client.put(f"/defects/{defect_id}", json={"time_completed": 1_700_000_200})
+    stats = _equipment_stats(client, "Стенд исправленный")
+    assert stats["resolved"] == 1
+    assert stats["p90_seconds"] == 200
+
+def test_resolution_range_is_backfilled(tmp_path, monkeypatch):
+    """Миграция 14 заполняет диапазон корзин по уже завершённым дефектам, в том числе архивным."""
+    path = str(tmp_path / "stats.db")
+    monkeypatch.setattr(schema, "DATABASE_PATH", path)
+    monkeypatch.setattr(schema, "MIGRATION_LOCK_PATH", path + ".migrate.lock")
+    migrations = schema.MIGRATIONS
+    monkeypatch.setattr(schema, "MIGRATIONS", migrations[:13])
+    schema.init_db()
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO defects (time_found, status, time_started, time_completed) VALUES (0, 'завершён', 0, ?)",
+        [(100,), (250,)]
+    )
+    conn.execute('''
+        INSERT INTO defects_archive (id, time_found, status, time_started, time_completed, archived_at)
+        VALUES (100, 0, 'завершён', 0, 40, 0)
+    ''')
+    conn.commit()
+
+    monkeypatch.setattr(schema, "MIGRATIONS", migrations)
+    schema.init_db()
+    range_sql = "SELECT min_seconds, max_seconds FROM defect_resolution_stats WHERE dimension = 'all' AND bucket = 0"
+    assert conn.execute(range_sql).fetchone() == (40, 250)
+    # Новые значения поддерживают пересозданные триггеры
+    conn.execute("INSERT INTO defects (time_found, status, time_started, time_completed) VALUES (0, 'завершён', 0, 270)")
+    conn.commit()
+    assert conn.execute(range_sql).fetchone() == (40, 270)
+    conn.close()
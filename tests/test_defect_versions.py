@@ -0,0 +1,59 @@
+# tests/test_defect_versions.py
+import json
+
+import pytest
+
+from app.api import defects as defects_api
+from app.database import db_connection, get_defect_item
+
+def _outbox(defect_id):
+    """Уведомления outbox о дефекте: (получатель, роль) в порядке записи."""
+    with db_connection() as conn:
+        rows = conn.execute("SELECT recipient, role, payload FROM outbox ORDER BY id").fetchall()
+    return [(row['recipient'], row['role']) for row in rows if json.loads(row['payload']).get('id') == defect_id]
+
+def test_stale_if_match_returns_409_with_current_etag(client, new_defect):
+    defect_id = new_defect()
+    response = client.put(f"/defects/{defect_id}", json={"status": "в работе"}, headers={"If-Match": '"1"'})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"2"'
+
+    response = client.put(f"/defects/{defect_id}", json={"status": "завершён"}, headers={"If-Match": '"1"'})
+    assert response.status_code == 409
+    assert response.headers["ETag"] == '"2"'
+    defect = get_defect_item(defect_id)
+    assert defect['status'] == "в работе"
+    assert defect['version'] == 2
+
+def test_missing_if_match_is_last_writer_wins(client, new_defect):
+    defect_id = new_defect()
+    assert client.put(f"/defects/{defect_id}", json={"status": "в работе"}).status_code == 200
+    response = client.put(f"/defects/{defect_id}", json={"status": "завершён"})
+    assert response.status_code == 200
+    assert response.json()["version"] == 3
+    assert get_defect_item(defect_id)['status'] == "завершён"
+
+def test_notifications_only_for_changed_assignees(client, new_defect, monkeypatch):
+    monkeypatch.setattr(defects_api, "notifications_enabled", lambda: True)
+    defect_id = new_defect()
+
+    client.put(f"/defects/{defect_id}", json={"assigned_to": "Иванов", "responsible": "Петров"})
+    assert _outbox(defect_id) == [("Иванов", "executor"), ("Петров", "responsible")]
+
+    # Исполнитель тот же — сообщаем только новому ответственному
+    client.put(f"/defects/{defect_id}", json={"assigned_to": "Иванов", "responsible": "Сидоров"})
+    assert _outbox(defect_id)[2:] == [("Сидоров", "responsible")]
+
+    # Назначения не менялись
+    client.put(f"/defects/{defect_id}", json={"status": "в работе", "assigned_to": "Иванов"})
+    assert len(_outbox(defect_id)) == 3
+
+@pytest.mark.parametrize("body", [{}, {"unknown": 1}])
+def test_update_without_fields_is_rejected(client, new_defect, body):
+    defect_id = new_defect()
+    response = client.put(f"/defects/{defect_id}", json=body)
+    assert response.status_code == 422
+    assert get_defect_item(defect_id)['version'] == 1
+
+def test_update_missing_defect_returns_404(client):
+    assert client.put("/defects/999999", json={"status": "в работе"}).status_code == 404
@@ -0,0 +1,159 @@
+# tests/test_migrations.py
+import sqlite3
+import time
+
+import pytest
+
+from app.core import init_db as schema
+from app.database import get_defect_changes, get_defect_item, get_user_by_name, subscribe_user
+
+ADMIN_HEADERS = {"Authorization": "Bearer admin_secret_key"}
+
+# Схема БД до версионных миграций (как её создавал прежний init_db)
+BASELINE_SCHEMA = '''
+    CREATE TABLE defects (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        equipment TEXT,
+        description TEXT,
+        section TEXT,
+        time_found TEXT,
+        danger_level TEXT,
+        status TEXT DEFAULT 'новый',
+        assigned_to TEXT,
+        responsible TEXT,
+        time_started TEXT,
+        time_completed TEXT,
+        photo_url TEXT
+    );
+    CREATE TABLE dropdown_lists (
+        id INTEGER PRIMARY KEY,
+        list_name TEXT UNIQUE,
+        items TEXT
+    );
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        telegram_id TEXT NOT NULL UNIQUE
+    );
+'''
+BASELINE_DEFECTS = [
+    # оборудование, описание, участок, обнаружен, опасность, статус, исполнитель, ответственный, начат, завершён
+    ("Линия 1", "Течь масла", "Башня", "2024-03-01 08:30:00", "высокий", "новый", None, "Овчинников", None, None),
+    ("Старый насос", "Шум подшипника", "Фасовка", "2024-03-02 09:00:00", "средний", "в работе",
+     "Петров", "Сулейманов", "2024-03-02 10:00:00", None),
+    ("Линия 2", "Нет заземления", "Башня", "2024-03-03 11:15:00", "высокий", "завершён",
+     "Шуев", "Овчинников", "2024-03-03 12:00:00", "2024-03-04 16:45:00"),
+]
+BASELINE_LISTS = {
+    "executors": "Шуев\nМалоев\n\nШуев",
+    "responsibles": "Овчинников\nСулейманов",
+    "sections": "Фасовка\nБашня",
+    "equipment": "Линия 2\nЛиния 1",
+}
+
+def _epoch(local_time):
+    """Секунды Unix для времени, записанного в локальном часовом поясе сервера."""
+    return None if local_time is None else int(time.mktime(time.strptime(local_time, "%Y-%m-%d %H:%M:%S")))
+
+@pytest.fixture
+def baseline_db(tmp_path, monkeypatch):
+    """БД в исходной схеме (user_version = 0) с данными; init_db работает с ней."""
+    path = str(tmp_path / "baseline.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany('''
+        INSERT INTO defects (equipment, description, section, time_found, danger_level, status,
+                             assigned_to, responsible, time_started, time_completed)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', BASELINE_DEFECTS)
+    conn.executemany("INSERT INTO dropdown_lists (list_name, items) VALUES (?, ?)", BASELINE_LISTS.items())
+    conn.execute("INSERT INTO users (name, telegram_id) VALUES ('Шуев', '1001')")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(schema, "DATABASE_PATH", path)
+    monkeypatch.setattr(schema, "MIGRATION_LOCK_PATH", path + ".migrate.lock")
+    return path
+
+def test_baseline_database_migrates_with_data(baseline_db):
+    schema.init_db()
+    conn = sqlite3.connect(baseline_db)
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(schema.MIGRATIONS)
+        assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'dropdown_lists'").fetchone() is None
+
+        rows = conn.execute('''
+            SELECT e.name, d.description, s.name, d.time_found, d.danger_level, d.status,
+                   pa.name, pr.name, d.time_started, d.time_completed
+            FROM defects d
+            LEFT JOIN equipment e ON e.id = d.equipment_id
+            LEFT JOIN sections s ON s.id = d.section_id
+            LEFT JOIN people pa ON pa.id = d.assigned_to_id
+            LEFT JOIN people pr ON pr.id = d.responsible_id
+            ORDER BY d.id
+        ''').fetchall()
+        expected = [
+            (equipment, description, section, _epoch(found), danger, status, assigned, responsible,
+             _epoch(started), _epoch(completed))
+            for equipment, description, section, found, danger, status, assigned, responsible, started, completed
+            in BASELINE_DEFECTS
+        ]
+        assert rows == expected
+
+        # Списки выбора — в прежнем порядке, без пустых строк и повторов
+        assert conn.execute("SELECT name FROM equipment WHERE active = 1 ORDER BY position").fetchall() == [
+            ("Линия 2",), ("Линия 1",)
+        ]
+        assert conn.execute(
+            "SELECT name FROM people WHERE is_executor = 1 ORDER BY executor_position"
+        ).fetchall() == [("Шуев",), ("Малоев",)]
+        # Значения только из истории дефектов остаются скрытыми записями
+        assert conn.execute("SELECT active FROM equipment WHERE name = 'Старый насос'").fetchone() == (0,)
+        assert conn.execute("SELECT is_executor, is_responsible FROM people WHERE name = 'Петров'").fetchone() == (0, 0)
+
+        assert conn.execute("SELECT name, telegram_id FROM users").fetchall() == [("Шуев", "1001")]
+        # Сводная статистика построена по перенесённым дефектам
+        assert conn.execute(
+            "SELECT SUM(defect_count) FROM defect_stats WHERE dimension = 'all'"
+        ).fetchone() == (len(BASELINE_DEFECTS),)
+    finally:
+        conn.close()
+
+def test_init_db_is_idempotent(baseline_db):
+    schema.init_db()
+    conn = sqlite3.connect(baseline_db)
+    before = conn.execute("SELECT COUNT(*), MAX(row_version) FROM defects").fetchone()
+    conn.close()
+
+    schema.init_db()
+    conn = sqlite3.connect(baseline_db)
+    assert conn.execute("SELECT COUNT(*), MAX(row_version) FROM defects").fetchone() == before
+    conn.close()
+
+def test_rename_keeps_history_and_bumps_only_affected_defects(client, new_defect):
+    renamed_id = new_defect(responsible="Кузнецов")
+    other_id = new_defect(responsible="Смирнов")
+    subscribe_user("Кузнецов", "2001")
+    since = get_defect_item(other_id)["row_version"]
+
+    response = client.post("/admin/rename-list-item", headers=ADMIN_HEADERS, json={
+        "list": "responsibles", "old_name": "Кузнецов", "new_name": "Кузнецов А."
+    })
+    assert response.status_code == 200
+
+    assert get_defect_item(renamed_id)['responsible'] == "Кузнецов А."
+    assert get_defect_item(other_id)['responsible'] == "Смирнов"
+    # Клиенты дельта-синхронизации получают только дефекты с новым именем
+    changed = [item['id'] for item in get_defect_changes(since, 100)["items"]]
+    assert changed == [renamed_id]
+    # Подписка на уведомления следует за именем
+    assert get_user_by_name("Кузнецов А.")['telegram_id'] == "2001"
+
+def test_rename_errors(client, new_defect):
+    new_defect(responsible="Орлов")
+    new_defect(responsible="Соколов")
+    rename = {"list": "responsibles", "old_name": "Орлов", "new_name": "Соколов"}
+    assert client.post("/admin/rename-list-item", json=rename).status_code == 401
+    assert client.post("/admin/rename-list-item", headers=ADMIN_HEADERS, json=rename).status_code == 409
+    rename["old_name"] = "Нет такого"
+    rename["new_name"] = "Новое имя"
+    assert client.post("/admin/rename-list-item", headers=ADMIN_HEADERS, json=rename).status_code == 404
@@ -0,0 +1,135 @@
+# tests/test_multiworker.py
+import os
+import re
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+import pytest
+
+from app.core.init_db import MIGRATIONS
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKERS = 3
+WRITER_THREADS = 6
+DEFECTS_PER_THREAD = 15
+LEADER_RE = re.compile(r"\[Leader\] Процесс (\d+) стал ведущим")
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_ready(base_url, server, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline and server.poll() is None:
+        try:
+            if httpx.get(f"{base_url}/defects/?limit=1", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Сервер не запустился")
+
+class Server:
+    """uvicorn --workers N во временном каталоге с новой БД."""
+
+    def __init__(self, workdir):
+        self.database_path = os.path.join(workdir, "multi.db")
+        self.log_path = os.path.join(workdir, "server.log")
+        self.base_url = f"http://127.0.0.1:{_free_port()}"
+
+    def log(self) -> str:
+        with open(self.log_path, encoding="utf-8", errors="replace") as f:
+            return f.read()
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    workdir = str(tmp_path_factory.mktemp("multiworker"))
+    shutil.copytree(os.path.join(PROJECT_ROOT, "frontend"), os.path.join(workdir, "frontend"))
+    os.makedirs(os.path.join(workdir, "frontend", "static"), exist_ok=True)
+    instance = Server(workdir)
+    env = dict(
+        os.environ,
+        DATABASE_PATH=instance.database_path,
+        TELEGRAM_BOT_TOKEN="",
+        # Архивирование — фоновая задача ведущего воркера
+        ARCHIVE_AFTER_DAYS="30",
+        PYTHONPATH=PROJECT_ROOT,
+        # Журнал читается, пока сервер работает
+        PYTHONUNBUFFERED="1",
+    )
+    port = instance.base_url.rsplit(":", 1)[1]
+    with open(instance.log_path, "w", encoding="utf-8") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", port,
+             "--workers", str(WORKERS)],
+            cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+    try:
+        _wait_ready(instance.base_url, process)
+        # Остальные воркеры дожидаются миграций и пытаются стать ведущим
+        time.sleep(1.0)
+        yield instance
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def test_migrations_applied_once(server):
+    """Все воркеры стартуют на пустой БД одновременно, но миграции применяет один."""
+    log = server.log()
+    assert log.count("Применение миграции 1:") == 1
+    assert log.count(f"Применение миграции {len(MIGRATIONS)}:") == 1
+    conn = sqlite3.connect(server.database_path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    conn.close()
+
+def test_single_leader(server):
+    """Блокировку ведущего (фоновые задачи) держит ровно один воркер."""
+    assert len(LEADER_RE.findall(server.log())) == 1
+
+def _write(base_url, prefix, created, errors):
+    # Без keep-alive: каждый запрос принимает любой из воркеров
+    with httpx.Client(timeout=30, limits=httpx.Limits(max_keepalive_connections=0)) as client:
+        for number in range(DEFECTS_PER_THREAD):
+            response = client.post(f"{base_url}/defects/", data={
+                "equipment": f"Насос {number % 7}",
+                "description": f"{prefix}-{number}",
+                "section": f"Цех {number % 3}",
+                "danger_level": "средний",
+            })
+            if response.status_code != 200:
+                errors.append(f"POST {response.status_code}: {response.text[:200]}")
+                continue
+            defect_id = response.json()["id"]
+            created.append(defect_id)
+            response = client.put(f"{base_url}/defects/{defect_id}", json={"status": "в работе"})
+            if response.status_code != 200:
+                errors.append(f"PUT {response.status_code}: {response.text[:200]}")
+
+def test_concurrent_writes_across_workers(server):
+    """Параллельные записи через разные воркеры проходят без "database is locked"."""
+    created, errors = [], []
+    writers = [
+        threading.Thread(target=_write, args=(server.base_url, f"t{n}", created, errors))
+        for n in range(WRITER_THREADS)
+    ]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    assert errors == []
+    assert len(created) == WRITER_THREADS * DEFECTS_PER_THREAD
+    assert "database is locked" not in server.log()
+    conn = sqlite3.connect(server.database_path)
+    assert conn.execute("SELECT COUNT(*) FROM defects WHERE status = 'в работе'").fetchone()[0] == len(created)
+    conn.close()
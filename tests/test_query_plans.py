@@ -0,0 +1,8 @@
+# tests/test_query_plans.py
+from app.core.init_db import init_db
+from app.database import find_unindexed_filter_plans
+
+def test_defect_filters_use_indexes():
+    """Ни одна комбинация фильтров списка не читает defects полным сканированием."""
+    init_db()
+    assert find_unindexed_filter_plans() == []
@@ -0,0 +1,104 @@
+# tests/test_uploads.py
+import asyncio
+import os
+import time
+
+import httpx
+
+from app.core.config import MAX_UPLOAD_SIZE
+from app.database import get_defect_item
+from app.main import app
+from app.photo_storage import UPLOAD_DIR
+
+FORM = {"equipment": "Насос 1", "description": "Фото", "section": "Цех 1", "danger_level": "средний"}
+
+# Загрузки параллельно с чтением списка: сколько, по сколько одновременно и какого размера
+UPLOADS = 16
+UPLOAD_CONCURRENCY = 4
+UPLOAD_SIZE = 8 * 1024 * 1024
+# Допустимая задержка GET /defects/ во время загрузок (с запасом на медленные машины)
+LIST_P95_LIMIT_SECONDS = 1.0
+LIST_MAX_LIMIT_SECONDS = 2.0
+
+def _leftover_temp_files():
+    return [name for name in os.listdir(UPLOAD_DIR) if name.startswith(".upload-")]
+
+async def _list_latencies(http, stop, samples):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await http.get("/defects/", params={"limit": 50})
+        await response.aread()
+        assert response.status_code == 200
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+
+async def _upload(http, semaphore):
+    async with semaphore:
+        # Разное содержимое: одинаковые фото сохраняются один раз
+        files = {"photo": ("photo.jpg", os.urandom(UPLOAD_SIZE), "image/jpeg")}
+        return await http.post("/defects/", data=FORM, files=files)
+
+async def _uploads_with_list_reads():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as http:
+        stop = asyncio.Event()
+        samples = []
+        ticker = asyncio.create_task(_list_latencies(http, stop, samples))
+        semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+        try:
+            responses = await asyncio.gather(*(_upload(http, semaphore) for _ in range(UPLOADS)))
+        finally:
+            stop.set()
+            await ticker
+    return responses, samples
+
+def test_concurrent_uploads_do_not_block_list(client):
+    """Крупные загрузки идут в пуле потоков: список дефектов отвечает и во время них."""
+    responses, samples = asyncio.run(_uploads_with_list_reads())
+    assert [response.status_code for response in responses] == [200] * UPLOADS
+    assert len({get_defect_item(response.json()["id"])["photo_url"] for response in responses}) == UPLOADS
+
+    samples.sort()
+    assert len(samples) >= 5
+    assert samples[int(len(samples) * 0.95) - 1] < LIST_P95_LIMIT_SECONDS
+    assert samples[-1] < LIST_MAX_LIMIT_SECONDS
+
+def test_oversized_upload_is_rejected_before_reading_body():
+    """По Content-Length больше предела — 413 без чтения тела запроса."""
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "POST", "scheme": "http", "path": "/defects/",
+        "raw_path": b"/defects/", "root_path": "", "query_string": b"", "server": ("test", 80), "client": None,
+        "headers": [
+            (b"content-type", b"multipart/form-data; boundary=x"),
+            (b"content-length", str(MAX_UPLOAD_SIZE + 65 * 1024).encode()),
+        ],
+    }
+    messages = []
+
+    async def receive():
+        raise AssertionError("тело запроса не должно читаться")
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    assert messages[0]["status"] == 413
+
+def test_oversized_upload_without_content_length(client):
+    """Без Content-Length предел проверяется при копировании: 413, временный файл удалён."""
+    def chunked_body():
+        yield b"--x\r\nContent-Disposition: form-data; name=\"photo\"; filename=\"big.jpg\"\r\n"
+        yield b"Content-Type: image/jpeg\r\n\r\n"
+        chunk = b"\0" * (1024 * 1024)
+        for _ in range(MAX_UPLOAD_SIZE // len(chunk) + 2):
+            yield chunk
+        yield b"\r\n"
+        for name, value in FORM.items():
+            yield f"--x\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n".encode()
+        yield b"--x--\r\n"
+
+    response = client.post(
+        "/defects/", content=chunked_body(), headers={"Content-Type": "multipart/form-data; boundary=x"}
+    )
+    assert response.status_code == 413
+    assert _leftover_temp_files() == []